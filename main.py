@@ -24,6 +24,10 @@ if __name__ == "__main__":
     # Save window position on exit
     def on_closing():
         window_manager.save_window_position()
+        if hasattr(app, 'parking_manager'):
+            app.parking_manager.cleanup()
+        if hasattr(app, 'detection_tab'):
+            app.detection_tab.stop_stream_server()
         root.destroy()
 
 
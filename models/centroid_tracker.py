@@ -0,0 +1,129 @@
+import numpy as np
+
+
+class CentroidTracker:
+    """
+    Lightweight centroid tracker for line counting without DeepSORT
+
+    Detections are associated with existing tracks by mutual nearest neighbour on a
+    (tracks x detections) distance matrix, unmatched detections start new tracks and
+    tracks not seen for `max_age` updates are dropped. Each track is counted at most once,
+    when its centroid enters the counting band or jumps across the line. The number of
+    tracks is capped, so memory and per-frame cost stay constant on long runs.
+    """
+
+    def __init__(self, max_distance=80, max_age=10, max_tracks=256):
+        """
+        Args:
+            max_distance: Largest centroid movement (pixels) between updates of one track
+            max_age: Updates a track survives without a matching detection
+            max_tracks: Upper bound on the number of live tracks
+        """
+        self.max_distance = max_distance
+        self.max_age = max_age
+        self.max_tracks = max_tracks
+        self.reset()
+
+    def reset(self):
+        """Drop all tracks"""
+        self.positions = np.zeros((0, 2), dtype=np.float64)
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.ages = np.zeros(0, dtype=np.int64)  # Updates since the track was last seen
+        self.counted = np.zeros(0, dtype=bool)
+        self.labels = np.zeros(0, dtype=object)  # Class of the latest detection per track
+        self.next_id = 0
+
+        # Movement of the matched tracks in the last update: (ids, previous, current, labels)
+        self.last_moves = (self.ids, self.positions, self.positions, self.labels)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def update(self, centroids, line_y=None, offset=0, labels=None):
+        """
+        Associate one frame of detections with the tracks and count line crossings
+
+        Args:
+            centroids: (N, 2) array-like of detection centroids (x, y)
+            line_y: Y coordinate of the counting line, None to only track
+            offset: Half height of the counting band around the line
+            labels: Optional class of each detection
+
+        Returns:
+            Number of tracks counted for the first time in this update
+        """
+        centroids = np.asarray(centroids, dtype=np.float64).reshape(-1, 2)
+        num_tracks, num_detections = len(self.ids), len(centroids)
+        detection_labels = np.empty(num_detections, dtype=object)
+        detection_labels[:] = list(labels) if labels is not None else None
+
+        track_idx = np.zeros(0, dtype=np.int64)
+        det_idx = np.zeros(0, dtype=np.int64)
+        if num_tracks and num_detections:
+            diff = self.positions[:, None, :] - centroids[None, :, :]
+            dist = np.einsum('tdk,tdk->td', diff, diff)
+
+            # Pairs that are each other's nearest neighbour and close enough
+            nearest_det = dist.argmin(axis=1)
+            nearest_track = dist.argmin(axis=0)
+            tracks = np.arange(num_tracks)
+            mutual = (nearest_track[nearest_det] == tracks) & \
+                     (dist[tracks, nearest_det] <= self.max_distance ** 2)
+            track_idx = tracks[mutual]
+            det_idx = nearest_det[mutual]
+
+        previous = self.positions[track_idx].copy()
+        previous_y = previous[:, 1]
+
+        # Move matched tracks, age the others
+        self.ages += 1
+        self.positions[track_idx] = centroids[det_idx]
+        self.ages[track_idx] = 0
+        self.labels[track_idx] = detection_labels[det_idx]
+        self.last_moves = (self.ids[track_idx], previous, centroids[det_idx], self.labels[track_idx])
+
+        # Unmatched detections start new tracks
+        unmatched = np.ones(num_detections, dtype=bool)
+        unmatched[det_idx] = False
+        new_positions = centroids[unmatched]
+        first_new = len(self.ids)
+        self.positions = np.concatenate([self.positions, new_positions])
+        self.ids = np.concatenate([self.ids, np.arange(self.next_id, self.next_id + len(new_positions))])
+        self.ages = np.concatenate([self.ages, np.zeros(len(new_positions), dtype=np.int64)])
+        self.counted = np.concatenate([self.counted, np.zeros(len(new_positions), dtype=bool)])
+        self.labels = np.concatenate([self.labels, detection_labels[unmatched]])
+        self.next_id += len(new_positions)
+
+        crossed = 0
+        if line_y is not None:
+            # Tracks seen this update, with the y they came from (new tracks: their own y)
+            seen = np.concatenate([track_idx, np.arange(first_new, len(self.ids))])
+            from_y = np.concatenate([previous_y, new_positions[:, 1]])
+            y = self.positions[seen, 1]
+
+            in_band = (y > line_y - offset) & (y < line_y + offset)
+            jumped = (from_y - line_y) * (y - line_y) < 0
+            newly = seen[~self.counted[seen] & (in_band | jumped)]
+            self.counted[newly] = True
+            crossed = len(newly)
+
+        self._prune()
+        return crossed
+
+    def _prune(self):
+        """Drop stale tracks and keep at most max_tracks of the most recently seen ones"""
+        keep = np.flatnonzero(self.ages <= self.max_age)
+        if len(keep) > self.max_tracks:
+            keep = keep[np.argsort(self.ages[keep], kind='stable')[:self.max_tracks]]
+            keep.sort()
+        if len(keep) != len(self.ids):
+            self.positions = self.positions[keep]
+            self.ids = self.ids[keep]
+            self.ages = self.ages[keep]
+            self.counted = self.counted[keep]
+            self.labels = self.labels[keep]
+
+    def active_tracks(self):
+        """(ids, positions) of the tracks seen in the last update"""
+        current = self.ages == 0
+        return self.ids[current], self.positions[current]
\ No newline at end of file
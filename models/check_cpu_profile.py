@@ -0,0 +1,80 @@
+"""
+Measure the CPU inference profile against the float model on footage from the target cameras,
+run from the project root: python -m models.check_cpu_profile --source parking.mp4 --quantize
+"""
+import argparse
+
+import cv2
+import numpy as np
+
+
+def read_sample_frames(source, count=20):
+    """
+    Frames spread evenly over a video, or a single image
+
+    Returns:
+        List of BGR frames, empty when the source cannot be read
+    """
+    image = cv2.imread(source) if not source.lower().endswith((".mp4", ".avi", ".mov", ".mkv")) else None
+    if image is not None:
+        return [image]
+
+    capture = cv2.VideoCapture(source)
+    total = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    positions = np.linspace(0, max(total - 1, 0), count).astype(int) if total > 0 else range(count)
+    frames = []
+    for position in positions:
+        if total > 0:
+            capture.set(cv2.CAP_PROP_POS_FRAMES, int(position))
+        ret, frame = capture.read()
+        if ret:
+            frames.append(frame)
+    capture.release()
+    return frames
+
+
+def check_cpu_profile(source, frame_count=20, num_threads=None, quantize=False, confidence_threshold=0.5,
+                      iou_threshold=0.5):
+    """
+    Compare a CPU-optimized VehicleDetector with the float model on sample frames
+
+    Needs torch and torchvision; both models are loaded, so expect a few seconds of setup.
+
+    Args:
+        source: Video or image from the cameras the detector will be used on
+        frame_count: Number of frames sampled from a video
+        num_threads: Torch intra-op threads of the CPU profile (default: all cores but one)
+        quantize: Also apply INT8 dynamic quantization
+        confidence_threshold: Minimum detection score of both models
+        iou_threshold: Minimum IoU for a detection to count as the same
+
+    Returns:
+        Dict from VehicleDetector.self_check, None on error
+    """
+    frames = read_sample_frames(source, frame_count)
+    if not frames:
+        print(f"Could not read frames from {source}")
+        return None
+
+    from models.vehicle_detector import VehicleDetector
+
+    detector = VehicleDetector(confidence_threshold, profile="cpu_optimized", num_threads=num_threads,
+                               quantize=quantize)
+    if detector.optimizations:
+        print(f"CPU profile: {', '.join(detector.optimizations)}")
+    report = detector.self_check(frames, iou_threshold)
+    if report is None:
+        print(f"No self-check for the {detector.model_type} backend")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the CPU inference profile with the float model")
+    parser.add_argument("--source", required=True, help="Video or image from the target cameras")
+    parser.add_argument("--frames", type=int, default=20)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--quantize", action="store_true", help="Also apply INT8 dynamic quantization")
+    parser.add_argument("--confidence", type=float, default=0.5)
+    parser.add_argument("--iou", type=float, default=0.5)
+    args = parser.parse_args()
+    check_cpu_profile(args.source, args.frames, args.threads, args.quantize, args.confidence, args.iou)
\ No newline at end of file
@@ -0,0 +1,240 @@
+import json
+import os
+
+import cv2
+import numpy as np
+
+
+class CountingZones:
+    """
+    Counting lines and zones of one camera
+
+    Lines are arbitrary segments. A crossing is "forward" when a track moves from the left
+    to the right of the segment as seen walking from its start to its end point in image
+    coordinates (top to bottom for a line drawn left to right), "backward" otherwise.
+    Zones are polygons with entry and exit counters. All counters are kept per class.
+
+    update() tests every track movement against every line and zone at once, using
+    segment intersection and point-in-polygon tests on (tracks x lines) and
+    (tracks x polygon edges) arrays, so the cost grows with array sizes rather than
+    Python loops over tracks.
+    """
+
+    DIRECTIONS = ("both", "forward", "backward")
+
+    def __init__(self):
+        self.lines = []  # Dicts with name, start, end, direction
+        self.zones = []  # Dicts with name, polygon
+        self.reset_counts()
+        self._build()
+
+    def __bool__(self):
+        return bool(self.lines or self.zones)
+
+    def add_line(self, name, start, end, direction="both"):
+        """
+        Add a counting line
+
+        Args:
+            name: Label shown on the frame and used in the counters
+            start, end: (x, y) end points
+            direction: Crossings added to the vehicle total: "both", "forward" or "backward"
+        """
+        self.lines.append({
+            'name': name,
+            'start': tuple(int(v) for v in start),
+            'end': tuple(int(v) for v in end),
+            'direction': direction if direction in self.DIRECTIONS else "both"
+        })
+        self.line_counts.append({'forward': {}, 'backward': {}})
+        self._build()
+
+    def add_zone(self, name, polygon):
+        """
+        Add a counting zone
+
+        Args:
+            name: Label shown on the frame and used in the counters
+            polygon: List of (x, y) points
+        """
+        self.zones.append({'name': name, 'polygon': [tuple(int(v) for v in p) for p in polygon]})
+        self.zone_counts.append({'entries': {}, 'exits': {}})
+        self._build()
+
+    def reset_counts(self):
+        """Clear all counters"""
+        self.line_counts = [{'forward': {}, 'backward': {}} for _ in self.lines]
+        self.zone_counts = [{'entries': {}, 'exits': {}} for _ in self.zones]
+
+    def _build(self):
+        """Pack the geometry into arrays for the vectorized tests"""
+        self._line_start = np.array([line['start'] for line in self.lines], dtype=np.float64).reshape(-1, 2)
+        self._line_end = np.array([line['end'] for line in self.lines], dtype=np.float64).reshape(-1, 2)
+        self._line_counts_forward = np.array([line['direction'] != "backward" for line in self.lines], dtype=bool)
+        self._line_counts_backward = np.array([line['direction'] != "forward" for line in self.lines], dtype=bool)
+
+        # All polygon edges in one array, with a (edges x zones) membership matrix
+        starts, ends, owners = [], [], []
+        for i, zone in enumerate(self.zones):
+            polygon = np.array(zone['polygon'], dtype=np.float64).reshape(-1, 2)
+            starts.append(polygon)
+            ends.append(np.roll(polygon, -1, axis=0))
+            owners.append(np.full(len(polygon), i))
+        self._edge_start = np.concatenate(starts) if starts else np.zeros((0, 2))
+        self._edge_end = np.concatenate(ends) if ends else np.zeros((0, 2))
+        owners = np.concatenate(owners) if owners else np.zeros(0, dtype=np.int64)
+        self._edge_owner = np.zeros((len(owners), len(self.zones)), dtype=np.int64)
+        self._edge_owner[np.arange(len(owners)), owners] = 1
+
+    def inside(self, points):
+        """
+        Zone membership of points (even-odd rule)
+
+        Args:
+            points: (N, 2) array of (x, y) points
+
+        Returns:
+            (N, zones) bool array
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if not self.zones:
+            return np.zeros((len(points), 0), dtype=bool)
+
+        px, py = points[:, 0:1], points[:, 1:2]
+        ax, ay = self._edge_start[:, 0], self._edge_start[:, 1]
+        bx, by = self._edge_end[:, 0], self._edge_end[:, 1]
+
+        # Edges a horizontal ray to the right of the point crosses
+        spans = (ay > py) != (by > py)
+        dy = np.where(by == ay, 1.0, by - ay)
+        crosses = spans & (px < ax + (bx - ax) * (py - ay) / dy)
+        return (crosses.astype(np.int64) @ self._edge_owner) % 2 == 1
+
+    def update(self, previous, current, classes=None):
+        """
+        Count the line crossings and zone entries/exits of one step of every track
+
+        Args:
+            previous: (N, 2) array of track centroids in the previous frame
+            current: (N, 2) array of the same tracks' centroids now
+            classes: Optional sequence of N class names (defaults to "vehicle")
+
+        Returns:
+            Number of line crossings that count towards the vehicle total
+        """
+        previous = np.asarray(previous, dtype=np.float64).reshape(-1, 2)
+        current = np.asarray(current, dtype=np.float64).reshape(-1, 2)
+        if not len(previous) or not self:
+            return 0
+        if classes is None:
+            classes = ["vehicle"] * len(previous)
+        classes = ["vehicle" if c is None else c for c in classes]
+
+        total = 0
+        if self.lines:
+            a, b = self._line_start[None, :, :], self._line_end[None, :, :]
+            p, q = previous[:, None, :], current[:, None, :]
+
+            # Sides of the line before and after the step, and whether the step spans the segment
+            ab = b - a
+            side_before = ab[..., 0] * (p[..., 1] - a[..., 1]) - ab[..., 1] * (p[..., 0] - a[..., 0])
+            side_after = ab[..., 0] * (q[..., 1] - a[..., 1]) - ab[..., 1] * (q[..., 0] - a[..., 0])
+            pq = q - p
+            end_a = pq[..., 0] * (a[..., 1] - p[..., 1]) - pq[..., 1] * (a[..., 0] - p[..., 0])
+            end_b = pq[..., 0] * (b[..., 1] - p[..., 1]) - pq[..., 1] * (b[..., 0] - p[..., 0])
+            spans = end_a * end_b <= 0
+
+            # Leaving a side strictly, so a centroid resting on the line is not counted twice
+            forward = spans & (side_before < 0) & (side_after >= 0)
+            backward = spans & (side_before > 0) & (side_after <= 0)
+            total += int((forward & self._line_counts_forward).sum() + (backward & self._line_counts_backward).sum())
+
+            for direction, hits in (('forward', forward), ('backward', backward)):
+                for track, line in zip(*np.nonzero(hits)):
+                    counts = self.line_counts[line][direction]
+                    counts[classes[track]] = counts.get(classes[track], 0) + 1
+
+        if self.zones:
+            was_inside = self.inside(previous)
+            is_inside = self.inside(current)
+            for key, hits in (('entries', is_inside & ~was_inside), ('exits', was_inside & ~is_inside)):
+                for track, zone in zip(*np.nonzero(hits)):
+                    counts = self.zone_counts[zone][key]
+                    counts[classes[track]] = counts.get(classes[track], 0) + 1
+
+        return total
+
+    def line_total(self, index, direction):
+        """Crossings of a line in one direction, all classes"""
+        return sum(self.line_counts[index][direction].values())
+
+    def zone_total(self, index, key):
+        """Entries or exits of a zone, all classes"""
+        return sum(self.zone_counts[index][key].values())
+
+    def draw(self, frame):
+        """Draw the lines and zones with their counters"""
+        for i, zone in enumerate(self.zones):
+            polygon = np.array(zone['polygon'], dtype=np.int32)
+            cv2.polylines(frame, [polygon], True, (255, 200, 0), 2)
+            x, y = polygon.min(axis=0)
+            cv2.putText(frame, f"{zone['name']}: in {self.zone_total(i, 'entries')} out {self.zone_total(i, 'exits')}",
+                        (int(x), max(int(y) - 5, 12)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 200, 0), 2)
+
+        for i, line in enumerate(self.lines):
+            cv2.line(frame, line['start'], line['end'], (0, 255, 0), 2)
+
+            # Arrow from the midpoint towards the forward side
+            start, end = np.array(line['start'], dtype=np.float64), np.array(line['end'], dtype=np.float64)
+            middle = (start + end) / 2
+            normal = np.array([-(end - start)[1], (end - start)[0]])
+            length = np.hypot(*normal)
+            if length > 0:
+                tip = middle + normal / length * 20
+                cv2.arrowedLine(frame, tuple(int(v) for v in middle), tuple(int(v) for v in tip), (0, 255, 0), 2)
+
+            cv2.putText(frame, f"{line['name']}: {self.line_total(i, 'forward')}/{self.line_total(i, 'backward')}",
+                        (line['start'][0], max(line['start'][1] - 8, 12)),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+
+    def to_dict(self):
+        """Geometry and counters as a JSON-serializable dict"""
+        return {'lines': self.lines, 'zones': self.zones,
+                'line_counts': self.line_counts, 'zone_counts': self.zone_counts}
+
+    @classmethod
+    def from_dict(cls, data):
+        """Create from a dict written by to_dict (counters are optional)"""
+        zones = cls()
+        for line in data.get('lines', []):
+            zones.add_line(line['name'], line['start'], line['end'], line.get('direction', "both"))
+        for zone in data.get('zones', []):
+            zones.add_zone(zone['name'], zone['polygon'])
+        if len(data.get('line_counts', [])) == len(zones.lines):
+            zones.line_counts = data['line_counts']
+        if len(data.get('zone_counts', [])) == len(zones.zones):
+            zones.zone_counts = data['zone_counts']
+        return zones
+
+    def save(self, path):
+        """Write lines, zones and counters to a JSON file"""
+        try:
+            directory = os.path.dirname(path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            with open(path, 'w') as f:
+                json.dump(self.to_dict(), f, indent=2)
+            return True
+        except Exception as e:
+            print(f"Error saving counting zones: {str(e)}")
+            return False
+
+    @classmethod
+    def load(cls, path):
+        """Read lines and zones from a JSON file, None on error"""
+        try:
+            with open(path, 'r') as f:
+                return cls.from_dict(json.load(f))
+        except Exception as e:
+            print(f"Error loading counting zones: {str(e)}")
+            return None
\ No newline at end of file
@@ -0,0 +1,117 @@
+import cv2
+import numpy as np
+
+
+# One detection: corner box in frame pixels, score and the backend's class id
+DETECTION_DTYPE = np.dtype([('box', np.float32, (4,)), ('score', np.float32), ('class_id', np.int32)])
+
+# Class names of the label spaces the backends use, indexed by class id
+COCO_CLASSES = ['person', 'bicycle', 'car', 'motorcycle', 'airplane', 'bus', 'train', 'truck', 'boat']  # YOLO
+TORCHVISION_CLASSES = ['background'] + COCO_CLASSES  # torchvision detection models, 1-based
+VOC_CLASSES = ['background', 'aeroplane', 'bicycle', 'bird', 'boat', 'bottle', 'bus', 'car', 'cat', 'chair',
+               'cow', 'diningtable', 'dog', 'horse', 'motorbike', 'person', 'pottedplant', 'sheep', 'sofa',
+               'train', 'tvmonitor']  # MobileNet-SSD
+
+# Road vehicles counted by every backend, whatever its label space
+VEHICLE_CLASS_NAMES = ('car', 'motorcycle', 'motorbike', 'bus', 'truck')
+
+
+def vehicle_class_ids(classes):
+    """Ids of the vehicle classes in a list of class names (or a YOLO id -> name dict)"""
+    if isinstance(classes, dict):
+        return np.array(sorted(i for i, name in classes.items() if name in VEHICLE_CLASS_NAMES), dtype=np.int32)
+    return np.array([i for i, name in enumerate(classes) if name in VEHICLE_CLASS_NAMES], dtype=np.int32)
+
+
+def empty_detections():
+    return np.empty(0, dtype=DETECTION_DTYPE)
+
+
+def make_detections(boxes, scores, class_ids):
+    """
+    Structured detection array from parallel arrays
+
+    Args:
+        boxes: (N, 4) array of (x1, y1, x2, y2)
+        scores: (N,) array
+        class_ids: (N,) array
+    """
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    detections = np.empty(len(boxes), dtype=DETECTION_DTYPE)
+    detections['box'] = boxes
+    detections['score'] = np.asarray(scores, dtype=np.float32).reshape(-1)
+    detections['class_id'] = np.asarray(class_ids).reshape(-1)
+    return detections
+
+
+def filter_detections(detections, confidence_threshold, class_ids=None):
+    """Detections scoring at least the threshold, of the given classes if any"""
+    detections = detections[detections['score'] >= confidence_threshold]
+    if class_ids is not None and len(detections):
+        # A handful of vehicle classes: one broadcast comparison beats np.isin
+        detections = detections[(detections['class_id'][:, None] == np.asarray(class_ids)).any(axis=1)]
+    return detections
+
+
+def scale_detections(detections, scale_x=1.0, scale_y=1.0, offset=(0, 0)):
+    """Copy of the detections with boxes scaled, then shifted by an (x, y) offset"""
+    scaled = detections.copy()
+    scaled['box'] *= np.array([scale_x, scale_y, scale_x, scale_y], dtype=np.float32)
+    scaled['box'] += np.array([offset[0], offset[1], offset[0], offset[1]], dtype=np.float32)
+    return scaled
+
+
+def clip_detections(detections, frame_shape):
+    """Clip the boxes to the frame in place"""
+    height, width = frame_shape[:2]
+    np.clip(detections['box'], 0, [width - 1, height - 1, width - 1, height - 1], out=detections['box'])
+    return detections
+
+
+def nms(detections, iou_threshold=0.45):
+    """
+    Per-class non-maximum suppression
+
+    Boxes are shifted by a class-dependent offset so boxes of different classes never
+    overlap, and one cv2.dnn.NMSBoxes call suppresses all classes at once.
+
+    Returns:
+        The kept detections, by descending score
+    """
+    if len(detections) < 2:
+        return detections
+
+    boxes = detections['box']
+    shift = (detections['class_id'] * (float(boxes.max()) + 1)).astype(np.float32)[:, None]
+    rects = np.concatenate([boxes[:, :2] + shift, boxes[:, 2:] - boxes[:, :2]], axis=1)
+    # Lists convert to the C++ vectors faster than arrays do
+    indices = cv2.dnn.NMSBoxes(rects.tolist(), detections['score'].tolist(), 0.0, iou_threshold)
+    return detections[np.array(indices, dtype=np.int64).reshape(-1)]
+
+
+def to_detection_list(detections):
+    """Detections as [[x1, y1, x2, y2], score, class_id] entries with Python numbers"""
+    boxes = detections['box'].astype(np.int64).tolist()
+    return [[box, score, class_id]
+            for box, score, class_id in zip(boxes, detections['score'].tolist(), detections['class_id'].tolist())]
+
+
+def from_detection_list(detections):
+    """Structured array from [[x1, y1, x2, y2], score, class_id] entries"""
+    if isinstance(detections, np.ndarray) and detections.dtype == DETECTION_DTYPE:
+        return detections
+    detections = [d for d in detections or [] if len(d) >= 3 and len(d[0]) >= 4]
+    if not detections:
+        return empty_detections()
+    return make_detections([d[0][:4] for d in detections], [d[1] for d in detections], [d[2] for d in detections])
+
+
+def detect_arrays_batch(detector, frames):
+    """Structured detection arrays of frames from any detector, native if it has detect_arrays_batch"""
+    if hasattr(detector, 'detect_arrays_batch'):
+        return detector.detect_arrays_batch(frames)
+    if hasattr(detector, 'detect_vehicles_batch'):
+        batch_detections = detector.detect_vehicles_batch(frames)
+    else:
+        batch_detections = [detector.detect_vehicles(frame) for frame in frames]
+    return [from_detection_list(detections) for detections in batch_detections]
\ No newline at end of file
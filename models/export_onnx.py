@@ -0,0 +1,54 @@
+"""
+Export YOLO weights to ONNX, run from the project root: python -m models.export_onnx --weights yolov8n.pt
+"""
+import argparse
+import os
+import shutil
+
+from models.onnx_detector import DEFAULT_ONNX_PATH
+
+
+def export_onnx(weights="yolov8n.pt", output_path=DEFAULT_ONNX_PATH, imgsz=640, opset=12, dynamic=False):
+    """
+    Export YOLO weights to an ONNX model for the torch-free OpenCV DNN backend
+
+    Needs ultralytics (and torch) once, on the machine doing the export; the resulting file
+    runs anywhere OpenCV does.
+
+    Args:
+        weights: YOLOv8 (or YOLOv5u) .pt weights, downloaded by ultralytics if needed
+        output_path: Where to write the .onnx file
+        imgsz: Square input size, pass the same value as ONNXDetector input_size
+        opset: ONNX opset; 12 is read by every OpenCV version with ONNX support
+        dynamic: Export a dynamic batch dimension for detect_vehicles_batch
+
+    Returns:
+        Path of the exported model, None on error
+    """
+    try:
+        from ultralytics import YOLO
+
+        exported = YOLO(weights).export(format="onnx", imgsz=imgsz, opset=opset, dynamic=dynamic, simplify=True)
+
+        directory = os.path.dirname(output_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        if os.path.abspath(exported) != os.path.abspath(output_path):
+            shutil.move(exported, output_path)
+
+        print(f"Exported {weights} to {output_path}")
+        return output_path
+    except Exception as e:
+        print(f"Error exporting ONNX model: {str(e)}")
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export YOLO weights to ONNX for OpenCV DNN")
+    parser.add_argument("--weights", default="yolov8n.pt")
+    parser.add_argument("--output", default=DEFAULT_ONNX_PATH)
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--opset", type=int, default=12)
+    parser.add_argument("--dynamic", action="store_true", help="Dynamic batch size")
+    args = parser.parse_args()
+    export_onnx(args.weights, args.output, args.imgsz, args.opset, args.dynamic)
\ No newline at end of file
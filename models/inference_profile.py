@@ -0,0 +1,155 @@
+import contextlib
+import os
+import time
+
+import numpy as np
+
+try:
+    import torch
+except ImportError:
+    torch = None
+
+
+PROFILES = ("default", "cpu_optimized")
+
+
+def default_thread_count(reserved=1):
+    """Intra-op threads for torch, leaving `reserved` cores for OpenCV and the UI"""
+    return max(1, (os.cpu_count() or 1) - reserved)
+
+
+@contextlib.contextmanager
+def thread_count(num_threads):
+    """
+    Run a block with a number of torch intra-op threads, restoring the previous count after
+
+    The setting is process-wide, so it is scoped to each inference call rather than set
+    once: other detectors (such as a default-profile one) keep their own count.
+    """
+    if torch is None or not num_threads:
+        yield
+        return
+    previous = torch.get_num_threads()
+    torch.set_num_threads(num_threads)
+    try:
+        yield
+    finally:
+        torch.set_num_threads(previous)
+
+
+def optimize_for_cpu(model, quantize=True):
+    """
+    Prepare an eager torch model for CPU inference
+
+    Linear layers are dynamically quantized to INT8 (weights stored as INT8, activations
+    quantized on the fly), which is supported for fully connected layers only; models
+    without them, such as YOLO, keep float weights. Check the accuracy with
+    VehicleDetector.self_check (python -m models.check_cpu_profile) before relying on it.
+
+    Args:
+        model: torch.nn.Module in eval mode (not TorchScript)
+        quantize: Apply dynamic INT8 quantization where supported
+
+    Returns:
+        (model, applied): the optimized model and a list of the applied optimizations
+    """
+    applied = []
+    if quantize and any(isinstance(m, torch.nn.Linear) for m in model.modules()):
+        try:
+            quantization = getattr(torch, 'ao', torch).quantization
+            model = quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            applied.append("int8-dynamic")
+        except Exception as e:
+            print(f"Could not quantize model: {e}")
+
+    return model, applied
+
+
+def inference_context(profile, num_threads=None):
+    """
+    Context of one inference call
+
+    The CPU profile runs under inference_mode with its own intra-op thread count, the
+    default profile under no_grad with the process's count.
+    """
+    if torch is None:
+        return contextlib.nullcontext()
+    if profile != "cpu_optimized":
+        return torch.no_grad()
+
+    stack = contextlib.ExitStack()
+    stack.enter_context(thread_count(num_threads))
+    stack.enter_context(torch.inference_mode() if hasattr(torch, 'inference_mode') else torch.no_grad())
+    return stack
+
+
+def _iou(box, boxes):
+    """IoU of one (x1, y1, x2, y2) box with an (N, 4) array of boxes"""
+    x1 = np.maximum(box[0], boxes[:, 0])
+    y1 = np.maximum(box[1], boxes[:, 1])
+    x2 = np.minimum(box[2], boxes[:, 2])
+    y2 = np.minimum(box[3], boxes[:, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return inter / np.maximum(area + areas - inter, 1e-9)
+
+
+def compare_detectors(reference, candidate, frames, iou_threshold=0.5):
+    """
+    Accuracy and latency of a candidate detector against a reference on sample frames
+
+    Detections are matched greedily by class and IoU. Recall is the share of reference
+    detections the candidate found, precision the share of candidate detections found by
+    the reference.
+
+    Args:
+        reference, candidate: Objects with detect_vehicles(frame)
+        frames: Sample BGR frames
+        iou_threshold: Minimum IoU of a match
+
+    Returns:
+        Dict with recall, precision, mean_iou and the mean latency of both (ms per frame)
+    """
+    timings = {'reference': [], 'candidate': []}
+    matched = total_reference = total_candidate = 0
+    ious = []
+
+    # One untimed call each, so lazy initialisation does not count
+    if frames:
+        reference.detect_vehicles(frames[0])
+        candidate.detect_vehicles(frames[0])
+
+    for frame in frames:
+        results = {}
+        for name, detector in (('reference', reference), ('candidate', candidate)):
+            start = time.perf_counter()
+            results[name] = detector.detect_vehicles(frame) or []
+            timings[name].append(time.perf_counter() - start)
+
+        expected, found = results['reference'], results['candidate']
+        total_reference += len(expected)
+        total_candidate += len(found)
+        if not expected or not found:
+            continue
+
+        boxes = np.array([d[0] for d in found], dtype=np.float64)
+        classes = np.array([d[2] for d in found])
+        free = np.ones(len(found), dtype=bool)
+        for box, _, label in expected:
+            overlap = _iou(np.asarray(box, dtype=np.float64), boxes)
+            overlap[~free | (classes != label)] = 0
+            best = int(overlap.argmax())
+            if overlap[best] >= iou_threshold:
+                free[best] = False
+                matched += 1
+                ious.append(overlap[best])
+
+    return {
+        'frames': len(frames),
+        'recall': matched / total_reference if total_reference else 1.0,
+        'precision': matched / total_candidate if total_candidate else 1.0,
+        'mean_iou': float(np.mean(ious)) if ious else 0.0,
+        'reference_ms': float(np.mean(timings['reference'])) * 1000 if frames else 0.0,
+        'candidate_ms': float(np.mean(timings['candidate'])) * 1000 if frames else 0.0
+    }
\ No newline at end of file
@@ -0,0 +1,135 @@
+import threading
+import time
+
+
+class InferenceWorker:
+    """
+    Runs a vehicle detector in the background on the most recent frame of each camera
+
+    submit() only replaces the camera's pending frame and returns immediately, so the render
+    loop never waits for inference. When the worker is free it takes the frames submitted
+    last; frames submitted in the meantime are skipped instead of queued, so results are
+    never more than one inference behind. Each result carries the index of the frame it
+    came from, so callers can tell how old it is.
+
+    The Detection tab feeds it one camera (the default camera 0), so each call gets one
+    frame. Frames submitted under other camera ids are collected for up to `batch_window`
+    seconds and go through detect_vehicles_batch in one call; no part of the application
+    submits more than one camera yet.
+    """
+
+    def __init__(self, detector, detect_batch=None, max_batch=8, batch_window=0.01):
+        """
+        Args:
+            detector: VehicleDetector, YOLODetector or any object with detect_vehicles(frame)
+            detect_batch: Optional function(frames) -> list of detections, used instead of
+                          detector.detect_vehicles_batch
+            max_batch: Largest number of frames passed to one call
+            batch_window: Seconds to wait for the other cameras once one frame is pending
+        """
+        self.detector = detector
+        if detect_batch is None:
+            if hasattr(detector, 'detect_vehicles_batch'):
+                detect_batch = detector.detect_vehicles_batch
+            else:
+                detect_batch = lambda frames: [detector.detect_vehicles(frame) for frame in frames]
+        self.detect_batch = detect_batch
+        self.max_batch = max(1, max_batch)
+        self.batch_window = batch_window
+
+        self._condition = threading.Condition()
+        self._pending = {}  # camera -> (frame, frame_index) waiting for the worker
+        self._results = {}  # camera -> (detections, frame_index) of the last finished inference
+        self._cameras = set()  # Cameras seen so far, a batch waits for all of them
+        self._running = True
+
+        self.inference_time = 0.0  # Seconds taken by the last call
+        self.last_batch_size = 0
+        self.completed = 0  # Frames processed
+        self.skipped = 0  # Submitted frames replaced before the worker got to them
+
+        self._thread = threading.Thread(target=self._run, name="inference", daemon=True)
+        self._thread.start()
+
+    def submit(self, frame, frame_index, camera=0):
+        """Offer a camera's frame for inference, replacing its frame still waiting"""
+        with self._condition:
+            if camera in self._pending:
+                self.skipped += 1
+            self._pending[camera] = (frame, frame_index)
+            self._cameras.add(camera)
+            self._condition.notify()
+
+    def latest(self, camera=0):
+        """
+        Last published result of a camera
+
+        Returns:
+            (detections, frame_index); frame_index is None before the first result
+        """
+        with self._condition:
+            return self._results.get(camera, ([], None))
+
+    def age(self, frame_index, camera=0):
+        """Frames between frame_index and the frame of the camera's last result, None without one"""
+        result_index = self.latest(camera)[1]
+        return frame_index - result_index if result_index is not None else None
+
+    def remove_camera(self, camera):
+        """Forget a camera, so batches no longer wait for it"""
+        with self._condition:
+            self._cameras.discard(camera)
+            self._pending.pop(camera, None)
+            self._results.pop(camera, None)
+
+    def stop(self, timeout=2.0):
+        """Stop the worker; a running inference is allowed to finish"""
+        with self._condition:
+            self._running = False
+            self._pending.clear()
+            self._condition.notify()
+        if self._thread is not threading.current_thread():
+            self._thread.join(timeout=timeout)
+
+    def _collect(self):
+        """Wait for pending frames and take a batch of them, None when stopped"""
+        with self._condition:
+            while self._running and not self._pending:
+                self._condition.wait()
+
+            # Give the other cameras a short window to join the batch
+            wanted = min(len(self._cameras), self.max_batch)
+            deadline = time.perf_counter() + self.batch_window
+            while self._running and len(self._pending) < wanted:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+
+            if not self._running:
+                return None
+            cameras = list(self._pending)[:self.max_batch]
+            return [(camera, self._pending.pop(camera)) for camera in cameras]
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+
+            frames = [frame for _, (frame, _) in batch]
+            start = time.perf_counter()
+            try:
+                batch_detections = self.detect_batch(frames)
+            except Exception as e:
+                print(f"Error in inference worker: {str(e)}")
+                batch_detections = None
+            if batch_detections is None or len(batch_detections) != len(batch):
+                batch_detections = [[] for _ in batch]
+
+            with self._condition:
+                self.inference_time = time.perf_counter() - start
+                self.last_batch_size = len(batch)
+                self.completed += len(batch)
+                for (camera, (_, frame_index)), detections in zip(batch, batch_detections):
+                    self._results[camera] = (detections if detections is not None else [], frame_index)
\ No newline at end of file
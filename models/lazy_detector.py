@@ -0,0 +1,147 @@
+import threading
+
+import numpy as np
+
+from models.detections import empty_detections, detect_arrays_batch
+
+
+class LazyDetector:
+    """
+    Lightweight handle for a detector that is loaded in the background
+
+    Creating the handle costs nothing. The detector (model weights, TorchScript, DNN
+    network) is built by `factory` on a background thread, either when start_loading() is
+    called (e.g. at application launch) or on first use, and then runs one warm-up
+    inference on a blank frame so the first real frame does not pay for lazy
+    initialisation. Until the detector is ready, detections are empty and callers can
+    check `ready` to use another method meanwhile. Once ready, attributes are forwarded
+    to the detector, so the handle can be used in its place.
+    """
+
+    IDLE, LOADING, READY, FAILED = "idle", "loading", "ready", "failed"
+
+    def __init__(self, factory, name="detector", warmup_shape=(360, 640, 3)):
+        """
+        Args:
+            factory: Function without arguments that builds the detector
+            name: Name used in status messages
+            warmup_shape: Shape of the blank frame used for the warm-up inference
+        """
+        self.factory = factory
+        self.name = name
+        self.warmup_shape = warmup_shape
+
+        self.state = self.IDLE
+        self.error = None
+        self.detector = None
+        self.confidence_threshold = None  # Applied to the detector once it is loaded
+        self._lock = threading.Lock()
+        self._loaded = threading.Event()
+
+    @property
+    def ready(self):
+        return self.state == self.READY
+
+    def status_text(self):
+        """Short state description for the UI"""
+        if self.state == self.FAILED:
+            return f"failed ({self.error})"
+        return self.state
+
+    def start_loading(self):
+        """Start loading on a background thread, if not already loading or loaded"""
+        with self._lock:
+            if self.state in (self.LOADING, self.READY):
+                return
+            self.state = self.LOADING
+            self.error = None
+            self._loaded.clear()
+        threading.Thread(target=self._load, name=f"load-{self.name}", daemon=True).start()
+
+    def wait(self, timeout=None):
+        """Block until loading finished; returns True if the detector is ready"""
+        self._loaded.wait(timeout)
+        return self.ready
+
+    def _load(self):
+        try:
+            detector = self.factory()
+            if detector is None or getattr(detector, 'model', True) is None:
+                raise RuntimeError("no detection model could be loaded")
+
+            if self.confidence_threshold is not None and hasattr(detector, 'set_confidence_threshold'):
+                detector.set_confidence_threshold(self.confidence_threshold)
+
+            # Warm-up inference, so allocations and lazy initialisation happen now
+            blank = np.zeros(self.warmup_shape, dtype=np.uint8)
+            if hasattr(detector, 'detect_vehicles'):
+                detector.detect_vehicles(blank)
+            elif callable(detector):
+                detector(blank)  # Trackers: an empty frame adds no tracks
+
+            self.detector = detector
+            self.state = self.READY
+            print(f"{self.name} ready")
+        except Exception as e:
+            print(f"Error loading {self.name}: {str(e)}")
+            self.error = str(e)
+            self.state = self.FAILED
+        finally:
+            self._loaded.set()
+
+    def set_confidence_threshold(self, threshold):
+        """Update the confidence threshold now or once the detector is loaded"""
+        self.confidence_threshold = threshold
+        if self.detector is not None and hasattr(self.detector, 'set_confidence_threshold'):
+            self.detector.set_confidence_threshold(threshold)
+
+    def detect_vehicles(self, frame):
+        """Detections of the loaded detector, empty while it is still loading"""
+        if not self.ready:
+            if self.state == self.IDLE:
+                self.start_loading()
+            return []
+        return self.detector.detect_vehicles(frame)
+
+    def detect_vehicles_batch(self, frames):
+        """Batch detections of the loaded detector, empty while it is still loading"""
+        if not self.ready:
+            if self.state == self.IDLE:
+                self.start_loading()
+            return [[] for _ in frames]
+        if hasattr(self.detector, 'detect_vehicles_batch'):
+            return self.detector.detect_vehicles_batch(frames)
+        return [self.detector.detect_vehicles(frame) for frame in frames]
+
+    def detect_arrays_batch(self, frames):
+        """Structured detection arrays of the loaded detector, empty while it is still loading"""
+        if not self.ready:
+            if self.state == self.IDLE:
+                self.start_loading()
+            return [empty_detections() for _ in frames]
+        return detect_arrays_batch(self.detector, frames)
+
+    def __call__(self, frame):
+        """
+        Call a tracker-style detector (such as YOLO + DeepSORT) on a frame
+
+        Special methods are looked up on the class, not through __getattr__, so calls are
+        forwarded here. While loading, returns empty (tracks, boxes, scores, class_ids).
+        """
+        if not self.ready:
+            if self.state == self.IDLE:
+                self.start_loading()
+            return [], [], [], []
+        return self.detector(frame)
+
+    def reset_count(self):
+        """Reset the counter of a loaded tracker, nothing to reset while loading"""
+        if self.detector is not None and hasattr(self.detector, 'reset_count'):
+            self.detector.reset_count()
+
+    def __getattr__(self, name):
+        # Only called for attributes the handle does not have itself
+        detector = self.__dict__.get('detector')
+        if detector is None:
+            raise AttributeError(f"{name} is not available until the {self.__dict__.get('name')} is loaded")
+        return getattr(detector, name)
\ No newline at end of file
@@ -0,0 +1,368 @@
+import cv2
+import numpy as np
+from datetime import datetime
+
+
+def lot_space_id(idx, pos, image_width=1000, image_height=1000):
+    """Build the allocation space ID for a position in posList"""
+    x, y = pos[0], pos[1]
+    section = "A" if x < image_width / 2 else "B"
+    section += "1" if y < image_height / 2 else "2"
+    return f"S{idx + 1}-{section}"
+
+
+def compute_lot_layout(parking_data, pos_list, image_width=1000, image_height=1000, space_ids=None):
+    """
+    Compute where every space and group of the schematic lot map is drawn
+
+    Coordinates are in plot units with the origin at the bottom left. The result only
+    depends on the parking layout (positions, groups and group membership), never on
+    occupancy, so comparing two layouts tells whether a renderer has to rebuild.
+
+    Args:
+        parking_data: Dictionary of space/group ID -> space data
+        pos_list: List of (x, y, w, h) parking positions
+        image_width: Width of the reference image the positions belong to
+        image_height: Height of the reference image the positions belong to
+        space_ids: Optional precomputed lot_space_id for every position in pos_list
+
+    Returns:
+        Dictionary with the plot size, cell sizes, headers, spaces and groups
+    """
+    if space_ids is None:
+        space_ids = [lot_space_id(idx, pos, image_width, image_height) for idx, pos in enumerate(pos_list)]
+
+    individual_spaces = {id: data for id, data in parking_data.items()
+                         if not data.get('is_group', False)}
+    group_spaces = {id: data for id, data in parking_data.items()
+                    if data.get('is_group', False)}
+    total = len(individual_spaces)
+
+    # Set up grid layout
+    space_w = 80
+    space_h = 50
+    margin = 20
+    cols = max(3, min(8, int(np.sqrt(total * 2))))  # More reasonable column count
+
+    # Calculate rows needed for individual spaces and groups
+    individual_rows = (len(individual_spaces) + cols - 1) // cols
+    group_rows = (len(group_spaces) + (cols // 2) - 1) // (cols // 2) if group_spaces else 0
+
+    # Set plot area - make sure it's large enough, group rows are taller than space rows
+    plot_width = cols * space_w + 2 * margin
+    plot_height = (individual_rows + 3) * space_h + 3 * margin
+    if group_spaces:
+        plot_height += space_h + group_rows * space_h * 1.5
+
+    current_y = plot_height - margin
+    headers = [(margin, current_y, "INDIVIDUAL SPACES")]
+    current_y -= space_h
+
+    # Individual spaces, skipping those that are part of a group
+    spaces = []
+    for idx, pos in enumerate(pos_list):
+        if not isinstance(pos, tuple) or len(pos) != 4:
+            continue
+
+        space_id = space_ids[idx]
+        if space_id in individual_spaces and individual_spaces[space_id].get('in_group', False):
+            continue
+
+        row, col = divmod(len(spaces), cols)
+        spaces.append((space_id, margin + col * space_w, current_y - (row + 1) * space_h))
+
+    current_y -= (individual_rows + 1) * space_h
+
+    # Groups - with larger boxes and a mini box per member space
+    separator_y = None
+    groups = []
+    if group_spaces:
+        separator_y = current_y + space_h / 2
+        current_y -= space_h
+        headers.append((margin, current_y, "GROUP SPACES"))
+        current_y -= space_h
+
+        group_cols = cols // 2  # Fewer columns for groups
+        group_w = space_w * 1.8
+        group_h = space_h * 1.5
+
+        for group_i, (group_id, group_data) in enumerate(group_spaces.items()):
+            row, col = divmod(group_i, group_cols)
+            x_pos = margin + col * group_w * 1.1  # Add extra spacing between groups
+            y_pos = current_y - (row + 1) * group_h
+
+            member_spaces = group_data.get('member_spaces', [])
+            mini_w = (group_w - 30) / min(4, max(1, len(member_spaces)))
+            mini_h = mini_w * 0.6
+
+            minis = []
+            for idx, member_idx in enumerate(member_spaces):
+                if member_idx < len(pos_list):
+                    mini_row, mini_col = divmod(idx, 4)
+                    minis.append((space_ids[member_idx], member_idx,
+                                  x_pos + 5 + mini_col * mini_w + 2, y_pos + 5 + mini_row * mini_h + 2))
+
+            groups.append((group_id, x_pos, y_pos, len(member_spaces), mini_w, mini_h, tuple(minis)))
+
+    return {
+        'size': (plot_width, plot_height),
+        'cell': (space_w, space_h, margin),
+        'group_cell': (space_w * 1.8, space_h * 1.5),
+        'headers': tuple(headers),
+        'separator_y': separator_y,
+        'spaces': tuple(spaces),
+        'groups': tuple(groups),
+    }
+
+
+def _blend_on_white(rgb, alpha):
+    """BGR color of an RGB color drawn with the given alpha on a white background"""
+    return tuple(int(round(alpha * c + (1 - alpha) * 255)) for c in reversed(rgb))
+
+
+class LotMapRenderer:
+    """
+    OpenCV raster renderer for the schematic parking lot map
+
+    Draws the same schematic as the allocation tab's matplotlib view (individual spaces,
+    groups, vehicle IDs and free counts) into a reusable BGR buffer, without importing
+    matplotlib. Everything that only depends on the layout is pre-rendered once per
+    layout into a "free" and an "occupied" layer; a render then only copies the cells
+    whose state changed from the matching layer and draws the dynamic text.
+    """
+
+    FONT = cv2.FONT_HERSHEY_SIMPLEX
+    HEADER_HEIGHT = 30  # Strip above the map for the status title
+    FOOTER_HEIGHT = 24  # Strip below the map for the timestamp and legend
+
+    # Colors match the matplotlib view (face colors are blended on white like its alpha)
+    BACKGROUND = (255, 255, 255)
+    FREE_COLOR = _blend_on_white((0, 128, 0), 0.6)
+    OCCUPIED_COLOR = _blend_on_white((255, 0, 0), 0.6)
+    GROUP_COLORS = {
+        'green': _blend_on_white((0, 128, 0), 0.5),
+        'orange': _blend_on_white((255, 165, 0), 0.5),
+        'red': _blend_on_white((255, 0, 0), 0.5),
+    }
+    MINI_FREE_COLOR = _blend_on_white((0, 128, 0), 0.8)
+    MINI_OCCUPIED_COLOR = _blend_on_white((255, 0, 0), 0.8)
+    GROUP_EDGE_COLOR = (255, 0, 0)  # Blue
+    TEXT_COLOR = (0, 0, 0)
+    LABEL_COLOR = (255, 255, 255)
+
+    def __init__(self, scale=1.0):
+        """
+        Args:
+            scale: Pixels per plot unit (a space cell is 70x45 units)
+        """
+        self.scale = scale
+        self.buffer = None
+        self._layout = None
+        self._free_layer = None
+        self._occupied_layer = None
+        self._cells = {}  # space_id -> (slice rows, slice cols, vehicle text org, last state)
+        self._groups = {}  # group_id -> group drawing info and last state
+        self._space_ids_key = None
+        self._space_ids = None
+
+    def _px(self, x, y):
+        """Convert plot coordinates (origin bottom left) to pixel coordinates"""
+        plot_height = self._layout['size'][1]
+        return (int(round(x * self.scale)),
+                self.HEADER_HEIGHT + int(round((plot_height - y) * self.scale)))
+
+    def _rect_px(self, x, y, w, h):
+        """Convert a plot rectangle to pixel corners (top left, bottom right)"""
+        x0, y1 = self._px(x, y)
+        x1, y0 = self._px(x + w, y + h)
+        return x0, y0, x1, y1
+
+    def _build_layers(self, layout):
+        """Pre-render everything that only depends on the layout"""
+        self._layout = layout
+        plot_width, plot_height = layout['size']
+        space_w, space_h, margin = layout['cell']
+        width = int(round(plot_width * self.scale))
+        height = self.HEADER_HEIGHT + int(round(plot_height * self.scale)) + self.FOOTER_HEIGHT
+        font_scale = 0.35 * self.scale
+
+        base = np.empty((height, width, 3), dtype=np.uint8)
+        base[:] = self.BACKGROUND
+
+        # Section headers and separator
+        for x, y, text in layout['headers']:
+            cv2.putText(base, text, self._px(x, y), self.FONT, 0.55 * self.scale, self.TEXT_COLOR, 2)
+        if layout['separator_y'] is not None:
+            _, sep_y = self._px(0, layout['separator_y'])
+            cv2.line(base, (0, sep_y), (width - 1, sep_y), (128, 128, 128), 1)
+
+        # Legend in the footer
+        legend_x = max(width - 330, 0)
+        legend_y = height - self.FOOTER_HEIGHT // 2
+        for color, label in [(self.FREE_COLOR, "Free"), (self.OCCUPIED_COLOR, "Occupied"),
+                             (self.GROUP_COLORS['orange'], "Partially Occupied")]:
+            cv2.rectangle(base, (legend_x, legend_y - 5), (legend_x + 16, legend_y + 5), color, -1)
+            cv2.putText(base, label, (legend_x + 20, legend_y + 4), self.FONT, 0.4, self.TEXT_COLOR, 1)
+            legend_x += 30 + cv2.getTextSize(label, self.FONT, 0.4, 1)[0][0]
+
+        # Group outlines and titles; faces and member boxes are drawn per render
+        self._groups = {}
+        for group_id, x_pos, y_pos, member_count, mini_w, mini_h, minis in layout['groups']:
+            group_w, group_h = layout['group_cell']
+            x0, y0, x1, y1 = self._rect_px(x_pos, y_pos, group_w - 10, group_h - 5)
+            self._groups[group_id] = {
+                'group_id': group_id,
+                'rect': (x0, y0, x1, y1),
+                'title_org': self._px(x_pos + 5, y_pos + group_h - 20),
+                'count_org': self._px(x_pos + 5, y_pos + group_h - 40),
+                'member_count': member_count,
+                'minis': [(member_id, member_idx, self._rect_px(mini_x, mini_y, mini_w - 4, mini_h - 4))
+                          for member_id, member_idx, mini_x, mini_y in minis],
+                'state': None,
+            }
+            cv2.rectangle(base, (x0, y0), (x1, y1), self.GROUP_EDGE_COLOR, 3)
+
+        # Individual spaces: identical in both layers except for the face color
+        self._free_layer = base
+        self._occupied_layer = base.copy()
+        self._cells = {}
+        for space_id, x_pos, y_pos in layout['spaces']:
+            x0, y0, x1, y1 = self._rect_px(x_pos, y_pos, space_w - 10, space_h - 5)
+            label_org = self._px(x_pos + 5, y_pos + space_h - 15)
+            for layer, color in [(self._free_layer, self.FREE_COLOR), (self._occupied_layer, self.OCCUPIED_COLOR)]:
+                cv2.rectangle(layer, (x0, y0), (x1, y1), color, -1)
+                cv2.rectangle(layer, (x0, y0), (x1, y1), (0, 0, 0), 2)
+                cv2.putText(layer, space_id, label_org, self.FONT, font_scale, self.LABEL_COLOR, 1)
+
+            # The outline is drawn centered on the rectangle, so the cell reaches one pixel further
+            rows = slice(max(y0 - 1, 0), y1 + 2)
+            cols = slice(max(x0 - 1, 0), x1 + 2)
+            vehicle_org = self._px(x_pos + 5, y_pos + 10)
+            self._cells[space_id] = [rows, cols, (vehicle_org[0] - cols.start, vehicle_org[1] - rows.start),
+                                     (False, None)]
+
+        # The buffer starts as the free layer, matching the initial cell states
+        self.buffer = self._free_layer.copy()
+
+    def _draw_group(self, info, color, occupied_count, mini_states):
+        """Redraw a group box with its face color, counts and member boxes"""
+        x0, y0, x1, y1 = info['rect']
+        group = self.buffer[y0:y1 + 1, x0:x1 + 1]  # View: drawing is clipped to the group box
+        group[:] = self.GROUP_COLORS[color]
+        cv2.rectangle(group, (0, 0), (x1 - x0, y1 - y0), self.GROUP_EDGE_COLOR, 3)
+
+        title_org = (info['title_org'][0] - x0, info['title_org'][1] - y0)
+        count_org = (info['count_org'][0] - x0, info['count_org'][1] - y0)
+        cv2.putText(group, info['group_id'], title_org, self.FONT, 0.5 * self.scale, self.TEXT_COLOR, 2)
+        cv2.putText(group, f"({occupied_count}/{info['member_count']} occupied)", count_org,
+                    self.FONT, 0.35 * self.scale, self.TEXT_COLOR, 1)
+
+        for (_, member_idx, (mx0, my0, mx1, my1)), is_occupied in zip(info['minis'], mini_states):
+            mini_color = self.MINI_OCCUPIED_COLOR if is_occupied else self.MINI_FREE_COLOR
+            cv2.rectangle(group, (mx0 - x0, my0 - y0), (mx1 - x0, my1 - y0), mini_color, -1)
+            cv2.rectangle(group, (mx0 - x0, my0 - y0), (mx1 - x0, my1 - y0), (0, 0, 0), 1)
+            cv2.putText(group, f"{member_idx + 1}", (mx0 - x0 + 2, my1 - y0 - 2),
+                        self.FONT, 0.25 * self.scale, self.LABEL_COLOR, 1)
+
+    def render(self, parking_data, pos_list, image_width=1000, image_height=1000, timestamp=None):
+        """
+        Render the lot map into the reusable buffer
+
+        Args:
+            parking_data: Dictionary of space/group ID -> space data
+            pos_list: List of (x, y, w, h) parking positions
+            image_width: Width of the reference image the positions belong to
+            image_height: Height of the reference image the positions belong to
+            timestamp: Time shown in the footer (defaults to now)
+
+        Returns:
+            The BGR buffer; it is reused by the next render, copy it to keep it
+        """
+        # Space IDs only change with the positions, building them is most of the layout cost
+        space_ids_key = (tuple(pos_list), image_width, image_height)
+        if space_ids_key != self._space_ids_key:
+            self._space_ids_key = space_ids_key
+            self._space_ids = [lot_space_id(idx, pos, image_width, image_height) for idx, pos in enumerate(pos_list)]
+
+        layout = compute_lot_layout(parking_data, pos_list, image_width, image_height, self._space_ids)
+        if layout != self._layout:
+            self._build_layers(layout)
+
+        # Individual spaces: copy changed cells from the layer matching their state
+        font_scale = 0.35 * self.scale
+        for space_id, cell in self._cells.items():
+            rows, cols, vehicle_org, last_state = cell
+            data = parking_data.get(space_id)
+            is_occupied = data.get('occupied', True) if data is not None else True
+            vehicle_id = data.get('vehicle_id') if data is not None and is_occupied else None
+
+            state = (is_occupied, vehicle_id)
+            if state == last_state:
+                continue
+            cell[3] = state
+
+            layer = self._occupied_layer if is_occupied else self._free_layer
+            self.buffer[rows, cols] = layer[rows, cols]
+            if vehicle_id:
+                cv2.putText(self.buffer[rows, cols], f"V: {vehicle_id}", vehicle_org,
+                            self.FONT, font_scale, self.LABEL_COLOR, 1)
+
+        # Groups
+        for group_id, info in self._groups.items():
+            group_data = parking_data.get(group_id, {})
+            mini_states = tuple(parking_data[member_id].get('occupied', False)
+                                if member_id in parking_data else False
+                                for member_id, _, _ in info['minis'])
+            occupied_count = sum(mini_states)
+
+            if group_data.get('occupied', False) or occupied_count == info['member_count']:
+                color = 'red'  # Fully occupied
+            elif occupied_count > 0:
+                color = 'orange'  # Partially occupied
+            else:
+                color = 'green'  # Free
+
+            state = (color, mini_states)
+            if state != info['state']:
+                info['state'] = state
+                self._draw_group(info, color, occupied_count, mini_states)
+
+        # Title with stats
+        individual = [data for data in parking_data.values() if not data.get('is_group', False)]
+        free_count = sum(1 for data in individual if not data.get('occupied', True))
+        group_count = len(parking_data) - len(individual)
+        title = f"Parking Status: {free_count}/{len(individual)} Available, {group_count} Groups"
+
+        header = self.buffer[:self.HEADER_HEIGHT]
+        header[:] = self.BACKGROUND
+        (text_w, _), _ = cv2.getTextSize(title, self.FONT, 0.55, 1)
+        cv2.putText(header, title, ((header.shape[1] - text_w) // 2, self.HEADER_HEIGHT - 10),
+                    self.FONT, 0.55, self.TEXT_COLOR, 1)
+
+        # Timestamp in the footer, left of the legend
+        footer_top = self.buffer.shape[0] - self.FOOTER_HEIGHT
+        footer = self.buffer[footer_top:, :max(self.buffer.shape[1] - 330, 0)]
+        footer[:] = self._free_layer[footer_top:, :footer.shape[1]]
+        timestamp = timestamp or datetime.now()
+        cv2.putText(footer, f"Updated: {timestamp.strftime('%H:%M:%S')}", (5, self.FOOTER_HEIGHT // 2 + 4),
+                    self.FONT, 0.4, self.TEXT_COLOR, 1)
+
+        return self.buffer
+
+    def export_png(self, path, parking_data, pos_list, image_width=1000, image_height=1000):
+        """
+        Render the lot map and save it as a PNG file
+
+        Returns:
+            True if the file was written, False otherwise
+        """
+        try:
+            image = self.render(parking_data, pos_list, image_width, image_height)
+            if not cv2.imwrite(path, image):
+                print(f"Error exporting lot map: could not write {path}")
+                return False
+            print(f"Saved lot map to {path}")
+            return True
+        except Exception as e:
+            print(f"Error exporting lot map: {str(e)}")
+            return False
\ No newline at end of file
@@ -0,0 +1,311 @@
+import os
+import time
+
+import cv2
+import numpy as np
+
+
+class OccupancyHeatmap:
+    """
+    Running occupancy and dwell accumulators for parking spaces
+
+    Keeps per-space sums (observed time, occupied time, completed dwell time and count)
+    and a downscaled per-pixel occupancy grid in preallocated arrays. Each update is
+    O(spaces) vectorized work plus one small resize of the foreground mask, so heatmaps
+    over days of operation can be drawn at any time without rescanning history.
+
+    The accumulators are indexed like the parking positions they were fed with. Those
+    boxes are kept (relative to the frame size, so the layout matches at any resolution)
+    and saved with the data; when the layout changes, set_positions() moves the data of
+    every space still present to its new index and starts the other spaces from zero.
+    """
+
+    METRICS = ("occupancy", "dwell", "activity")
+
+    def __init__(self, num_spaces=0, cell_size=8, max_gap=60.0, save_path=None, save_interval=300.0):
+        """
+        Args:
+            num_spaces: Number of parking spaces to preallocate
+            cell_size: Pixels per cell of the per-pixel grid
+            max_gap: Longest interval (seconds) credited to one update, so pauses in
+                     processing are not counted as observed time
+            save_path: Optional .npz file the accumulators are persisted to
+            save_interval: Seconds between automatic saves
+        """
+        self.cell_size = cell_size
+        self.max_gap = max_gap
+        self.save_path = save_path
+        self.save_interval = save_interval
+
+        self._allocate_spaces(num_spaces)
+        self.positions = None  # (N, 4) boxes relative to the frame size, None while unknown
+        self.pixel_occupied = None  # Occupied seconds per grid cell
+        self.pixel_observed = 0.0  # Seconds the per-pixel grid has been fed
+
+        self.last_update = None
+        self.last_save = time.time()
+
+    def _allocate_spaces(self, num_spaces):
+        """Preallocate the per-space accumulators"""
+        self.observed_time = np.zeros(num_spaces, dtype=np.float64)
+        self.occupied_time = np.zeros(num_spaces, dtype=np.float64)
+        self.dwell_total = np.zeros(num_spaces, dtype=np.float64)
+        self.dwell_count = np.zeros(num_spaces, dtype=np.int64)
+        self.occupied = np.zeros(num_spaces, dtype=bool)
+        self.occupied_since = np.zeros(num_spaces, dtype=np.float64)
+
+    @property
+    def num_spaces(self):
+        return len(self.observed_time)
+
+    def set_positions(self, positions, frame_shape, min_iou=0.9):
+        """
+        Attach the accumulators to a parking layout, remapping them if the layout changed
+
+        Every new space takes the data of the old space whose box overlaps it best (IoU of
+        at least min_iou); spaces without one start empty, and data of removed spaces is
+        dropped. Data without known positions (or of another number of spaces) is reset.
+
+        Args:
+            positions: (x, y, w, h) parking positions, in the order of the updates
+            frame_shape: Shape of the frame the positions refer to
+
+        Returns:
+            True if the accumulators were remapped or reset
+        """
+        height, width = frame_shape[:2]
+        boxes = np.asarray(positions, dtype=np.float64).reshape(-1, 4) / [width, height, width, height]
+        old_boxes = self.positions
+        if old_boxes is not None and old_boxes.shape == boxes.shape and np.allclose(old_boxes, boxes, atol=2e-3):
+            return False
+
+        old = (self.observed_time, self.occupied_time, self.dwell_total,
+               self.dwell_count, self.occupied, self.occupied_since)
+        self._allocate_spaces(len(boxes))
+        new = (self.observed_time, self.occupied_time, self.dwell_total,
+               self.dwell_count, self.occupied, self.occupied_since)
+        self.positions = boxes
+
+        if old_boxes is None or not len(old_boxes) or not len(boxes) or len(old_boxes) != len(old[0]):
+            return True
+
+        # IoU of every new box with every old box, as (x1, y1, x2, y2) corners
+        new_corners = np.concatenate([boxes[:, :2], boxes[:, :2] + boxes[:, 2:]], axis=1)
+        old_corners = np.concatenate([old_boxes[:, :2], old_boxes[:, :2] + old_boxes[:, 2:]], axis=1)
+        w = np.clip(np.minimum(new_corners[:, None, 2], old_corners[None, :, 2]) -
+                    np.maximum(new_corners[:, None, 0], old_corners[None, :, 0]), 0, None)
+        h = np.clip(np.minimum(new_corners[:, None, 3], old_corners[None, :, 3]) -
+                    np.maximum(new_corners[:, None, 1], old_corners[None, :, 1]), 0, None)
+        inter = w * h
+        areas_new = boxes[:, 2] * boxes[:, 3]
+        areas_old = old_boxes[:, 2] * old_boxes[:, 3]
+        iou = inter / np.maximum(areas_new[:, None] + areas_old[None, :] - inter, 1e-12)
+
+        # Greedy one-to-one matching, best overlaps first
+        taken = np.zeros(len(old_boxes), dtype=bool)
+        matched = np.full(len(boxes), -1)
+        for flat in np.argsort(-iou, axis=None):
+            j, i = divmod(int(flat), len(old_boxes))
+            if iou[j, i] < min_iou:
+                break
+            if matched[j] < 0 and not taken[i]:
+                matched[j] = i
+                taken[i] = True
+
+        found = matched >= 0
+        for old_array, new_array in zip(old, new):
+            new_array[found] = old_array[matched[found]]
+        return True
+
+    def reset(self):
+        """Clear all accumulated data"""
+        self._allocate_spaces(self.num_spaces)
+        self.pixel_occupied = None
+        self.positions = None
+        self.pixel_observed = 0.0
+        self.last_update = None
+
+    def update(self, occupied, observed=None, foreground=None, timestamp=None):
+        """
+        Add one occupancy observation
+
+        The interval since the previous update is credited to the state seen at the
+        previous update, so the sums are exact for piecewise constant occupancy.
+
+        Args:
+            occupied: Sequence of occupancy flags, one per space in posList order
+            observed: Optional flags of spaces that were actually measured this update
+            foreground: Optional binary image (non-zero = occupied pixels) for the per-pixel grid
+            timestamp: Time of the observation in seconds (defaults to now)
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        occupied = np.asarray(occupied, dtype=bool)
+        if len(occupied) != self.num_spaces:
+            # Without positions the old data cannot be attributed to the new spaces
+            self._allocate_spaces(len(occupied))
+            self.positions = None
+        observed = np.ones(len(occupied), dtype=bool) if observed is None else np.asarray(observed, dtype=bool)
+
+        dt = 0.0 if self.last_update is None else min(max(timestamp - self.last_update, 0.0), self.max_gap)
+        self.last_update = timestamp
+
+        # Running sums for the interval that just ended
+        if dt > 0:
+            self.observed_time[observed] += dt
+            self.occupied_time[observed & self.occupied] += dt
+
+        # Dwell: close occupancies that ended, start the ones that began
+        measured_occupied = occupied & observed
+        ended = self.occupied & observed & ~occupied
+        started = measured_occupied & ~self.occupied
+        self.dwell_total[ended] += timestamp - self.occupied_since[ended]
+        self.dwell_count[ended] += 1
+        self.occupied_since[started] = timestamp
+        self.occupied[observed] = occupied[observed]
+
+        # Per-pixel grid from the downscaled foreground mask
+        if foreground is not None:
+            grid_h = max(foreground.shape[0] // self.cell_size, 1)
+            grid_w = max(foreground.shape[1] // self.cell_size, 1)
+            if self.pixel_occupied is None or self.pixel_occupied.shape != (grid_h, grid_w):
+                self.pixel_occupied = np.zeros((grid_h, grid_w), dtype=np.float64)
+                self.pixel_observed = 0.0
+            if dt > 0:
+                small = cv2.resize(foreground, (grid_w, grid_h), interpolation=cv2.INTER_AREA)
+                self.pixel_occupied += small.astype(np.float64) * (dt / 255.0)
+                self.pixel_observed += dt
+
+        # Persist periodically
+        if self.save_path and time.time() - self.last_save >= self.save_interval:
+            self.save()
+
+    def occupancy_rate(self):
+        """Fraction of observed time each space was occupied"""
+        return np.divide(self.occupied_time, self.observed_time,
+                         out=np.zeros_like(self.occupied_time), where=self.observed_time > 0)
+
+    def average_dwell(self):
+        """Average duration (seconds) of completed occupancies per space"""
+        return np.divide(self.dwell_total, self.dwell_count,
+                         out=np.zeros_like(self.dwell_total), where=self.dwell_count > 0)
+
+    def pixel_rate(self):
+        """Fraction of observed time each grid cell was foreground"""
+        if self.pixel_occupied is None or self.pixel_observed <= 0:
+            return None
+        return self.pixel_occupied / self.pixel_observed
+
+    def render_overlay(self, image, positions, metric="occupancy", alpha=0.5, show_values=True):
+        """
+        Draw a heatmap of the accumulated data over an image
+
+        Args:
+            image: BGR image the positions refer to (typically the reference image)
+            positions: List of (x, y, w, h) parking positions in the same order as the updates
+            metric: "occupancy" (percentage of time occupied), "dwell" (average dwell)
+                    or "activity" (per-pixel occupancy)
+            alpha: Opacity of the heatmap
+            show_values: Write the value into every space
+
+        Returns:
+            A new BGR image with the heatmap blended in
+        """
+        result = image.copy()
+        height, width = image.shape[:2]
+
+        if metric == "activity":
+            rate = self.pixel_rate()
+            if rate is None:
+                return result
+            heat = cv2.resize(np.clip(rate * 255, 0, 255).astype(np.uint8), (width, height),
+                              interpolation=cv2.INTER_LINEAR)
+            return cv2.addWeighted(cv2.applyColorMap(heat, cv2.COLORMAP_JET), alpha, result, 1 - alpha, 0)
+
+        if metric == "dwell":
+            values = self.average_dwell()
+            scale = values.max() if len(values) and values.max() > 0 else 1.0
+            normalized = values / scale
+        else:
+            values = self.occupancy_rate()
+            normalized = values
+
+        # One colormap lookup for all spaces, then fill the spaces on a single overlay
+        count = min(len(positions), len(normalized))
+        levels = np.clip(normalized[:count] * 255, 0, 255).astype(np.uint8).reshape(-1, 1)
+        colors = cv2.applyColorMap(levels, cv2.COLORMAP_JET).reshape(-1, 3) if count else []
+
+        overlay = result.copy()
+        for i in range(count):
+            x, y, w, h = [int(v) for v in positions[i]]
+            cv2.rectangle(overlay, (x, y), (x + w, y + h), tuple(int(c) for c in colors[i]), -1)
+        result = cv2.addWeighted(overlay, alpha, result, 1 - alpha, 0)
+
+        if show_values:
+            for i in range(count):
+                x, y, w, h = [int(v) for v in positions[i]]
+                text = f"{values[i] * 100:.0f}%" if metric == "occupancy" else f"{values[i] / 60:.1f}m"
+                cv2.putText(result, text, (x + 3, y + h // 2), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1)
+
+        return result
+
+    def save(self, path=None):
+        """Write the accumulators to an .npz file (atomically replacing the old one)"""
+        path = path or self.save_path
+        if not path:
+            return False
+
+        try:
+            directory = os.path.dirname(path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+
+            tmp_path = path + ".tmp.npz"
+            np.savez_compressed(
+                tmp_path,
+                observed_time=self.observed_time,
+                occupied_time=self.occupied_time,
+                dwell_total=self.dwell_total,
+                dwell_count=self.dwell_count,
+                occupied=self.occupied,
+                occupied_since=self.occupied_since,
+                pixel_occupied=self.pixel_occupied if self.pixel_occupied is not None else np.zeros((0, 0)),
+                pixel_observed=self.pixel_observed,
+                cell_size=self.cell_size,
+                positions=self.positions if self.positions is not None else np.zeros((0, 4))
+            )
+            os.replace(tmp_path, path)
+            self.last_save = time.time()
+            return True
+        except Exception as e:
+            print(f"Error saving occupancy heatmap: {str(e)}")
+            return False
+
+    def load(self, path=None):
+        """Restore the accumulators from an .npz file written by save()"""
+        path = path or self.save_path
+        if not path or not os.path.exists(path):
+            return False
+
+        try:
+            with np.load(path) as data:
+                self.observed_time = data['observed_time']
+                self.occupied_time = data['occupied_time']
+                self.dwell_total = data['dwell_total']
+                self.dwell_count = data['dwell_count']
+                self.occupied = data['occupied']
+                self.occupied_since = data['occupied_since']
+                self.pixel_occupied = data['pixel_occupied'] if data['pixel_occupied'].size else None
+                self.pixel_observed = float(data['pixel_observed'])
+                self.cell_size = int(data['cell_size'])
+                # Files without positions cannot be matched to a layout and are reset on first use
+                positions = data['positions'] if 'positions' in data.files else None
+                self.positions = positions if positions is not None and len(positions) == len(self.observed_time) \
+                    else None
+
+            # Occupancies still open when the file was written have no known end
+            self.occupied[:] = False
+            self.last_update = None
+            return True
+        except Exception as e:
+            print(f"Error loading occupancy heatmap: {str(e)}")
+            return False
\ No newline at end of file
@@ -0,0 +1,168 @@
+import os
+
+import cv2
+import numpy as np
+
+from models.detections import COCO_CLASSES, make_detections, empty_detections, vehicle_class_ids, clip_detections, \
+    nms, to_detection_list
+
+
+DEFAULT_ONNX_PATH = "models/yolov8n.onnx"
+
+
+class ONNXDetector:
+    """
+    YOLO detector for ONNX models run with OpenCV DNN, without torch
+
+    Works with YOLOv5 exports (N x anchors x (5 + classes), with objectness) and YOLOv8
+    exports (N x (4 + classes) x anchors, without objectness); the layout is recognised
+    from the output shape. Frames are letterboxed into one batch buffer, and decoding,
+    score filtering and the mapping back to frame coordinates are array operations per
+    frame, followed by per-class NMS.
+    """
+
+    # COCO class names up to the vehicle classes, indexed like YOLO class ids
+    CLASSES = COCO_CLASSES
+
+    def __init__(self, model_path=DEFAULT_ONNX_PATH, confidence_threshold=0.5, nms_threshold=0.45,
+                 input_size=640, num_classes=80, vehicle_classes=None):
+        """
+        Args:
+            model_path: Path of the .onnx file (see models/export_onnx.py)
+            confidence_threshold: Minimum score of a detection
+            nms_threshold: IoU above which overlapping boxes of a class are suppressed
+            input_size: Square input size the model was exported with
+            num_classes: Number of classes the model predicts
+            vehicle_classes: Class ids returned as vehicles (default: the shared vehicle classes)
+        """
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"Missing {model_path}")
+
+        self.model_path = model_path
+        self.confidence_threshold = confidence_threshold
+        self.nms_threshold = nms_threshold
+        self.input_size = input_size
+        self.num_classes = num_classes
+        self.vehicle_classes = np.array(vehicle_classes, dtype=np.int32) if vehicle_classes is not None \
+            else vehicle_class_ids(self.CLASSES)
+        self.classes = self.CLASSES
+
+        self.net = cv2.dnn.readNetFromONNX(model_path)
+        self._batch_supported = True  # Cleared when the model only accepts one frame per call
+        print(f"ONNX model loaded from {model_path}")
+
+    def set_confidence_threshold(self, threshold):
+        """Update the confidence threshold"""
+        self.confidence_threshold = threshold
+
+    def letterbox(self, frames):
+        """
+        Resize frames into the square model input, keeping the aspect ratio
+
+        Returns:
+            (batch, scales, pads): (N, S, S, 3) uint8 batch padded with grey, the resize
+            factor of each frame and its (x, y) padding offset
+        """
+        size = self.input_size
+        batch = np.full((len(frames), size, size, 3), 114, dtype=np.uint8)
+        scales = np.empty(len(frames), dtype=np.float32)
+        pads = np.empty((len(frames), 2), dtype=np.float32)
+
+        for i, frame in enumerate(frames):
+            height, width = frame.shape[:2]
+            scale = min(size / height, size / width)
+            new_w, new_h = int(round(width * scale)), int(round(height * scale))
+            pad_x, pad_y = (size - new_w) // 2, (size - new_h) // 2
+
+            batch[i, pad_y:pad_y + new_h, pad_x:pad_x + new_w] = cv2.resize(frame, (new_w, new_h),
+                                                                             interpolation=cv2.INTER_LINEAR)
+            scales[i] = scale
+            pads[i] = (pad_x, pad_y)
+
+        return batch, scales, pads
+
+    def _forward(self, batch):
+        """Run the network on a letterboxed batch, one frame per call if batching is not supported"""
+        if self._batch_supported or len(batch) == 1:
+            try:
+                self.net.setInput(cv2.dnn.blobFromImages(batch, 1 / 255.0, swapRB=True))
+                return self.net.forward()
+            except cv2.error:
+                if len(batch) == 1:
+                    raise
+                # Models exported with a fixed batch of one
+                self._batch_supported = False
+
+        outputs = []
+        for image in batch:
+            self.net.setInput(cv2.dnn.blobFromImage(image, 1 / 255.0, swapRB=True))
+            outputs.append(self.net.forward())
+        return np.concatenate(outputs)
+
+    def _decode(self, output, scale, pad, frame_shape):
+        """
+        Vehicle detections of one frame from its raw model output
+
+        Args:
+            output: (anchors, attributes) array, or (attributes, anchors) for YOLOv8
+
+        Returns:
+            Structured detection array (see models/detections.py)
+        """
+        if output.shape[0] < output.shape[1]:
+            output = output.T  # YOLOv8 puts the attributes first
+
+        if output.shape[1] == self.num_classes + 5:
+            class_scores = output[:, 5:] * output[:, 4:5]  # YOLOv5: scale by objectness
+        else:
+            class_scores = output[:, 4:]
+
+        # The max is much cheaper than argmax, so classes are only looked up for anchors above the threshold
+        scores = class_scores.max(axis=1)
+        candidates = np.flatnonzero(scores >= self.confidence_threshold)
+        class_ids = class_scores[candidates].argmax(axis=1)
+        is_vehicle = (class_ids[:, None] == self.vehicle_classes).any(axis=1)
+        if not is_vehicle.any():
+            return empty_detections()
+        candidates, class_ids = candidates[is_vehicle], class_ids[is_vehicle]
+
+        # Centre/size in the letterboxed input to corners in the frame
+        centres, sizes = output[candidates, :2], output[candidates, 2:4]
+        offset = np.asarray(pad, dtype=np.float32)
+        boxes = np.concatenate([centres - sizes / 2 - offset, centres + sizes / 2 - offset], axis=1) / scale
+        detections = clip_detections(make_detections(boxes, scores[candidates], class_ids), frame_shape)
+
+        return nms(detections, self.nms_threshold)
+
+    def detect_vehicles(self, frame):
+        """Detect vehicles in a frame, as [[x1, y1, x2, y2], score, class_id] entries"""
+        return self.detect_vehicles_batch([frame])[0]
+
+    def detect_vehicles_batch(self, frames):
+        """
+        Detect vehicles in several frames with one network call
+
+        Returns:
+            List with the detections of each frame, in the format of detect_vehicles
+        """
+        return [to_detection_list(detections) for detections in self.detect_arrays_batch(frames)]
+
+    def detect_arrays_batch(self, frames):
+        """
+        Detect vehicles in several frames with one network call
+
+        Returns:
+            List with a structured detection array per frame
+        """
+        if not frames:
+            return []
+
+        try:
+            batch, scales, pads = self.letterbox(frames)
+            outputs = self._forward(batch)
+            outputs = outputs.reshape(len(frames), outputs.shape[-2], outputs.shape[-1])
+            return [self._decode(output, scale, pad, frame.shape)
+                    for output, scale, pad, frame in zip(outputs, scales, pads, frames)]
+        except Exception as e:
+            print(f"Error in ONNX detection: {str(e)}")
+            return [empty_detections() for _ in frames]
\ No newline at end of file
@@ -4,7 +4,12 @@ import threading
 import time
 import os
 import pickle
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from models.occupancy_heatmap import OccupancyHeatmap
+from models.centroid_tracker import CentroidTracker
+from utils.frame_cache import FrameIntermediates
+from utils.image_processor import extract_blobs, draw_blobs, count_line_crossings, CountingRegion
 
 
 def get_centroid(x, y, w, h):
@@ -33,7 +38,7 @@ class ParkingManager:
         self.free_spaces = 0
         self.occupied_spaces = 0
         self.vehicle_counter = 0
-        self.matches = []
+        self.matches = CentroidTracker()
 
         # Detection parameters
         self.parking_threshold = self.DEFAULT_THRESHOLD
@@ -42,6 +47,11 @@ class ParkingManager:
         self.min_contour_width = self.MIN_CONTOUR_SIZE
         self.min_contour_height = self.MIN_CONTOUR_SIZE
         self.offset = self.DEFAULT_OFFSET
+        self.counting_band_height = None  # Process only this band around the line (None = whole frame)
+        self.counting_polygons = None  # ROI polygons processed instead of the band
+        self.counting_context = 48  # Pixels processed around the band/polygons, for vehicles at their edge
+        self._counting_region = None
+        self._counting_region_key = None
 
         # Video/image references
         self.video_reference_map = {}
@@ -63,12 +73,78 @@ class ParkingManager:
         self.parking_visualizer = None
         self.parking_data = {}
 
+        # Version of parking_data, bumped on every change so views can skip redundant redraws
+        self.data_version = 0
+        self._version_lock = threading.Lock()
+
+        # Occupancy and dwell heatmap accumulators, one file per reference image in the log directory
+        self.occupancy_heatmap = OccupancyHeatmap()
+        self._heatmap_reference = None
+        self._heatmap_lock = threading.Lock()
+
         # For simultaneous detection
         self.simultaneous_mode = False
         self.vehicle_detection_result = None
-        self.vehicle_detection_thread = None
         self.parking_detection_result = None
-        self.parking_detection_thread = None
+        self._detection_executor = None  # One long-lived worker per engine, created on first use
+        self._result_buffers = [None, None]  # Alternating output frames of process_frame_simultaneous
+        self._result_index = 0
+        self._last_intermediates = None  # Intermediates of the last frame, reused as the previous frame
+
+    def mark_parking_data_changed(self):
+        """Bump the parking data version after parking_data was modified and return the new version"""
+        with self._version_lock:
+            self.data_version += 1
+            return self.data_version
+
+    def heatmap_path(self, reference_image):
+        """File of the heatmap accumulators of a reference image"""
+        base_name = os.path.splitext(os.path.basename(reference_image))[0]
+        return os.path.join(self.log_dir, f"occupancy_heatmap_{base_name}.npz")
+
+    def _select_heatmap(self, reference_image):
+        """Switch to the accumulators of a reference image, saving the current ones (lock held)"""
+        if not reference_image or reference_image == self._heatmap_reference:
+            return
+        if self._heatmap_reference is not None:
+            self.occupancy_heatmap.save()
+
+        self.occupancy_heatmap = OccupancyHeatmap(save_path=self.heatmap_path(reference_image))
+        self.occupancy_heatmap.load()
+        self._heatmap_reference = reference_image
+
+    def record_occupancy(self, occupied, observed=None, foreground=None, positions=None, reference_image=None):
+        """
+        Feed one occupancy observation into the heatmap accumulators
+
+        Args:
+            occupied: Occupancy flags, one per space in the order of positions
+            observed: Optional flags of the spaces that were actually measured
+            foreground: Optional processed (binary) frame for the per-pixel heatmap
+            positions: (x, y, w, h) parking positions in foreground coordinates (default: posList);
+                       the data is remapped when they differ from the stored layout
+            reference_image: Reference image the positions belong to, selecting the heatmap file
+        """
+        positions = self.posList if positions is None else positions
+        with self._heatmap_lock:
+            self._select_heatmap(reference_image)
+            if foreground is not None:
+                self.occupancy_heatmap.set_positions(positions, foreground.shape)
+            self.occupancy_heatmap.update(occupied, observed=observed, foreground=foreground)
+
+    def render_occupancy_heatmap(self, image, metric="occupancy", alpha=0.5, positions=None, reference_image=None):
+        """
+        Draw the accumulated heatmap of a reference image over an image
+
+        Args:
+            positions: (x, y, w, h) parking positions in image coordinates (default: posList)
+            reference_image: Reference image whose heatmap is drawn (default: the last one recorded)
+        """
+        positions = self.posList if positions is None else positions
+        with self._heatmap_lock:
+            self._select_heatmap(reference_image)
+            self.occupancy_heatmap.set_positions(positions, image.shape)
+            return self.occupancy_heatmap.render_overlay(image, positions, metric=metric, alpha=alpha)
 
     def _ensure_directories_exist(self):
         """Ensure necessary directories exist"""
@@ -171,6 +247,7 @@ class ParkingManager:
             self.occupied_spaces = 0
             self.parking_data = {}  # Clear parking data dictionary
             print("All parking positions cleared")
+        self.mark_parking_data_changed()
         return True
 
     def check_parking_space(self, img_pro, img):
@@ -225,6 +302,8 @@ class ParkingManager:
         if not hasattr(self, 'parking_data'):
             return
 
+        changed = False
+
         # First pass: Update individual slot statuses
         for i, pos in enumerate(self.posList):
             # Skip invalid position formats
@@ -258,10 +337,13 @@ class ParkingManager:
                         'in_group': False,  # Not part of a group by default
                         'group_id': None  # No group by default
                     }
+                    changed = True
                 else:
                     # Only update occupied status if not manually set
-                    if not self.parking_data[space_id].get('manually_set', False):
-                        self.parking_data[space_id]['occupied'] = is_occupied
+                    space_data = self.parking_data[space_id]
+                    if not space_data.get('manually_set', False) and space_data.get('occupied') != is_occupied:
+                        space_data['occupied'] = is_occupied
+                        changed = True
 
         # Second pass: Update group information
         for group_id, data in list(self.parking_data.items()):
@@ -278,9 +360,15 @@ class ParkingManager:
                         space_id = f"S{i + 1}-{section}"
 
                         # Update the space to know it belongs to a group
-                        if space_id in self.parking_data:
-                            self.parking_data[space_id]['in_group'] = True
-                            self.parking_data[space_id]['group_id'] = group_id
+                        space_data = self.parking_data.get(space_id)
+                        if space_data is not None and (not space_data.get('in_group', False)
+                                                       or space_data.get('group_id') != group_id):
+                            space_data['in_group'] = True
+                            space_data['group_id'] = group_id
+                            changed = True
+
+        if changed:
+            self.mark_parking_data_changed()
 
     def update_allocation_status(self, img_pro, img):
         """Update both the original parking status and the allocation system"""
@@ -295,50 +383,101 @@ class ParkingManager:
 
         return img
 
-    def detect_vehicles(self, frame1, frame2):
-        """Process frames to detect and count vehicles"""
-        # Get difference between frames
-        d = cv2.absdiff(frame1, frame2)
-        grey = cv2.cvtColor(d, cv2.COLOR_BGR2GRAY)
+    def get_counting_region(self, frame_shape, line_y):
+        """
+        Region vehicle detection has to process, rebuilt only when the settings change
 
-        blur = cv2.GaussianBlur(grey, (5, 5), 0)
+        Returns:
+            CountingRegion, or None to process the whole frame
+        """
+        if not self.counting_polygons and not self.counting_band_height:
+            return None
+
+        polygons = tuple(tuple(map(tuple, p)) for p in self.counting_polygons) if self.counting_polygons else None
+        key = (frame_shape[:2], line_y, self.counting_band_height, polygons, self.counting_context)
+        if key != self._counting_region_key:
+            self._counting_region = CountingRegion(frame_shape, line_y, self.counting_band_height,
+                                                   self.counting_polygons, self.counting_context)
+            self._counting_region_key = key
+        return self._counting_region
+
+    def get_frame_intermediates(self, frame, prev_frame=None):
+        """
+        Shared intermediates of a frame, holding the previous frame's grayscale image
 
+        The previous frame's intermediates are reused when prev_frame is the frame object
+        passed in the last call, so its grayscale image is not computed again. Only that
+        image is kept, so memory stays bounded however long frames are chained.
+        """
+        previous = None
+        if prev_frame is not None:
+            last = self._last_intermediates
+            previous = last if last is not None and last.frame is prev_frame else FrameIntermediates(prev_frame)
+
+        intermediates = FrameIntermediates(frame, previous)
+        self._last_intermediates = intermediates
+        return intermediates
+
+    @staticmethod
+    def preprocess_parking(intermediates):
+        """Binary image of edges used to decide whether a parking space is occupied"""
+        def compute():
+            imgThreshold = cv2.adaptiveThreshold(intermediates.blurred((3, 3), 1), 255,
+                                                 cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 25, 16)
+            imgProcessed = cv2.medianBlur(imgThreshold, 5)
+            kernel = np.ones((3, 3), np.uint8)
+            return cv2.dilate(imgProcessed, kernel, iterations=1)
+
+        return intermediates.get('parking_processed', compute)
+
+    def _detect_motion_boxes(self, intermediates, line_y):
+        """
+        Boxes of moving blobs between a frame and its previous frame
+
+        Returns:
+            (N, 4) int array of (x, y, w, h) boxes in frame coordinates
+        """
+        # Only the counting region is processed when one is configured
+        region = self.get_counting_region(intermediates.frame.shape, line_y)
+        if region is not None:
+            d = cv2.absdiff(region.crop(intermediates.previous_gray()), region.crop(intermediates.gray()))
+        else:
+            d = intermediates.difference()
+
+        blur = cv2.GaussianBlur(d, (5, 5), 0)
         _, th = cv2.threshold(blur, 20, 255, cv2.THRESH_BINARY)
         dilated = cv2.dilate(th, np.ones((3, 3)))
         kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2, 2))
-
         closing = cv2.morphologyEx(dilated, cv2.MORPH_CLOSE, kernel)
-        contours, _ = cv2.findContours(closing, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
 
-        # Draw detection line
+        # Blobs filtered by size in one array operation
+        if region is not None:
+            closing = region.apply_mask(closing)
+        boxes, _ = extract_blobs(closing, self.min_contour_width, self.min_contour_height)
+        return region.from_crop(boxes) if region is not None else boxes
+
+    def detect_vehicles(self, frame1, frame2):
+        """Process frames to detect and count vehicles"""
         line_y = self.line_height
         if line_y >= frame1.shape[0]:
             line_y = frame1.shape[0] - 50
-        cv2.line(frame1, (0, line_y), (frame1.shape[1], line_y), (0, 255, 0), 2)
 
-        # Process contours
-        for (i, c) in enumerate(contours):
-            (x, y, w, h) = cv2.boundingRect(c)
-            contour_valid = (w >= self.min_contour_width) and (h >= self.min_contour_height)
+        boxes = self._detect_motion_boxes(FrameIntermediates(frame1, FrameIntermediates(frame2)), line_y)
+        centroids = boxes[:, :2] + boxes[:, 2:4] // 2
 
-            if not contour_valid:
-                continue
+        region = self.get_counting_region(frame1.shape, line_y)
+        if region is not None:
+            region.draw(frame1)
 
-            cv2.rectangle(frame1, (x - 10, y - 10), (x + w + 10, y + h + 10), (255, 0, 0), 2)
+        # Draw detection line
+        cv2.line(frame1, (0, line_y), (frame1.shape[1], line_y), (0, 255, 0), 2)
 
-            centroid = get_centroid(x, y, w, h)
-            self.matches.append(centroid)
-            cv2.circle(frame1, centroid, 5, (0, 255, 0), -1)
+        # Draw all vehicles at once
+        draw_blobs(frame1, boxes, centroids)
 
         # Check for vehicles crossing the line
-        new_matches = []
-        for (x, y) in self.matches:
-            if (line_y - self.offset) < y < (line_y + self.offset):
-                self.vehicle_counter += 1
-            else:
-                new_matches.append((x, y))
-
-        self.matches = new_matches
+        self.matches, crossed = count_line_crossings(self.matches, centroids, line_y, self.offset)
+        self.vehicle_counter += crossed
 
         # Display count
         cv2.putText(frame1, f"Vehicle Count: {self.vehicle_counter}", (10, 30),
@@ -369,86 +508,149 @@ class ParkingManager:
             if hasattr(self, 'ml_detector') and self.ml_detector:
                 del self.ml_detector
 
+            # Persist the heatmap accumulators
+            with self._heatmap_lock:
+                self.occupancy_heatmap.save()
+
+            # Stop the detection workers
+            if self._detection_executor is not None:
+                self._detection_executor.shutdown(wait=True)
+                self._detection_executor = None
+
             # Clean up any other resources here
             import gc
             gc.collect()
 
     # New methods for simultaneous detection
 
-    def process_frame_simultaneous(self, current_frame, prev_frame=None):
-        """Process a frame using both parking and vehicle detection simultaneously"""
-        if self.simultaneous_mode:
-            # Create copies of the frame for each detection method
-            parking_frame = current_frame.copy()
-            vehicle_frame = current_frame.copy() if prev_frame is not None else None
-
-            # Start threads for parallel processing
-            self.parking_detection_thread = threading.Thread(
-                target=self._process_parking_detection,
-                args=(parking_frame,)
-            )
-            self.parking_detection_thread.start()
-
-            if prev_frame is not None and vehicle_frame is not None:
-                self.vehicle_detection_thread = threading.Thread(
-                    target=self._process_vehicle_detection,
-                    args=(vehicle_frame, prev_frame)
-                )
-                self.vehicle_detection_thread.start()
+    def submit_frame(self, current_frame, prev_frame=None, positions=None, reference_image=None):
+        """
+        Start both detection engines on a frame without waiting for them
 
-            # Wait for threads to complete
-            if self.parking_detection_thread:
-                self.parking_detection_thread.join()
+        The engines run on a long-lived pool with one worker each and keep their own state,
+        so nothing is locked while they work.
 
-            if prev_frame is not None and self.vehicle_detection_thread:
-                self.vehicle_detection_thread.join()
+        Args:
+            positions: (x, y, w, h) parking positions in frame coordinates (default: posList)
+            reference_image: Reference image of the positions, selecting the heatmap they feed
+                             (default: current_reference_image)
+
+        Returns:
+            (parking_future, vehicle_future); vehicle_future is None without a previous frame.
+            Pass them to merge_frame_results() to publish the results.
+        """
+        return self.submit_intermediates(self.get_frame_intermediates(current_frame, prev_frame),
+                                         positions, reference_image)
+
+    def submit_intermediates(self, intermediates, positions=None, reference_image=None):
+        """Start both detection engines on the intermediates of a frame (see submit_frame)"""
+        if self._detection_executor is None:
+            self._detection_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="detection")
+
+        # The parking engine and the heatmap must see the same layout, so take it once here
+        positions = list(self.posList if positions is None else positions)
+        if reference_image is None:
+            reference_image = self.current_reference_image
+        parking_future = self._detection_executor.submit(self._process_parking_detection, intermediates,
+                                                         positions, reference_image)
+        vehicle_future = None
+        if intermediates.has_previous:
+            vehicle_future = self._detection_executor.submit(self._process_vehicle_detection, intermediates)
+        return parking_future, vehicle_future
+
+    def merge_frame_results(self, parking_future, vehicle_future=None):
+        """
+        Wait for the engines of one frame and publish their results (the only locked step)
+
+        Returns:
+            Dict with the frame's 'parking' and 'vehicles' results (vehicles None without a
+            previous frame) and the 'vehicle_count', 'free' and 'total' counters after it
+        """
+        positions, parking_results, occupied, observed, imgProcessed, reference_image = parking_future.result()
+        vehicle = vehicle_future.result() if vehicle_future is not None else None
+        vehicle_results = None
+
+        with self.data_lock:
+            free = sum(1 for result in parking_results if result[4])
+            self.free_spaces = free
+            self.total_spaces = len(positions)
+            self.occupied_spaces = self.total_spaces - free
+            self.parking_detection_result = parking_results
+
+            if vehicle is not None:
+                vehicle_results, crossed = vehicle
+                self.vehicle_counter += crossed
+                self.vehicle_detection_result = vehicle_results
+
+            results = {'parking': parking_results, 'vehicles': vehicle_results,
+                       'vehicle_count': self.vehicle_counter, 'free': free, 'total': len(positions)}
+
+        self.record_occupancy(occupied, observed, imgProcessed, positions=positions, reference_image=reference_image)
+        return results
+
+    def annotate_results(self, frame, results):
+        """Draw the results returned by merge_frame_results onto a frame (in place)"""
+        # Draw parking spaces
+        for i, (x, y, w, h, is_free) in enumerate(results['parking']):
+            color = (0, 255, 0) if is_free else (0, 0, 255)  # Green for free, Red for occupied
+            cv2.rectangle(frame, (x, y), (x + w, y + h), color, 2)
+
+            # Add space ID
+            cv2.putText(frame, f"S{i}", (x + 5, y + 15),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 0), 1)
+
+        # If we have vehicle detection results, draw vehicles and count
+        if results['vehicles'] is not None:
+            # Draw detection line
+            line_y = self.line_height
+            if line_y >= frame.shape[0]:
+                line_y = frame.shape[0] - 50
+            cv2.line(frame, (0, line_y), (frame.shape[1], line_y), (0, 255, 0), 2)
+
+            # Draw vehicle count
+            cv2.putText(frame, f"Vehicle Count: {results['vehicle_count']}", (10, 60),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 200, 0), 2)
+
+            # Draw rectangles for detected vehicles
+            draw_blobs(frame, results['vehicles'])
+
+        # Add parking space information
+        cv2.putText(frame, f"Free: {results['free']}/{results['total']}", (10, 30),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+        return frame
+
+    def _next_result_buffer(self, frame):
+        """Preallocated output frame, alternating between two so the previous result stays valid"""
+        self._result_index = 1 - self._result_index
+        buffer = self._result_buffers[self._result_index]
+        if buffer is None or buffer.shape != frame.shape or buffer.dtype != frame.dtype:
+            buffer = np.empty_like(frame)
+            self._result_buffers[self._result_index] = buffer
+        np.copyto(buffer, frame)
+        return buffer
+
+    def process_frame_simultaneous(self, current_frame, prev_frame=None, positions=None, reference_image=None):
+        """
+        Process a frame using both parking and vehicle detection simultaneously
+
+        Both engines read the same frame and share its intermediates (grayscale, blurs,
+        previous grayscale), so each product is computed once per frame. Passing the
+        previous call's frame object as prev_frame also reuses its grayscale image.
+        In simultaneous mode the returned frame is one of two reused buffers, valid until
+        the next-but-one call. positions and reference_image are passed to submit_frame.
+        """
+        if self.simultaneous_mode:
+            # Run both engines on the worker pool and merge their results
+            results = self.merge_frame_results(*self.submit_frame(current_frame, prev_frame, positions,
+                                                                  reference_image))
 
             # Merge results into one frame
-            result_frame = current_frame.copy()
-
-            # If we have parking results, draw parking spaces
-            if self.parking_detection_result is not None:
-                for i, (x, y, w, h, is_free) in enumerate(self.parking_detection_result):
-                    color = (0, 255, 0) if is_free else (0, 0, 255)  # Green for free, Red for occupied
-                    cv2.rectangle(result_frame, (x, y), (x + w, y + h), color, 2)
-
-                    # Add space ID
-                    cv2.putText(result_frame, f"S{i}", (x + 5, y + 15),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 0), 1)
-
-            # If we have vehicle detection results, draw vehicles and count
-            if self.vehicle_detection_result is not None and prev_frame is not None:
-                # Draw detection line
-                line_y = self.line_height
-                if line_y >= result_frame.shape[0]:
-                    line_y = result_frame.shape[0] - 50
-                cv2.line(result_frame, (0, line_y), (result_frame.shape[1], line_y), (0, 255, 0), 2)
-
-                # Draw vehicle count
-                cv2.putText(result_frame, f"Vehicle Count: {self.vehicle_counter}", (10, 60),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 200, 0), 2)
-
-                # Draw rectangles for detected vehicles
-                for rect in self.vehicle_detection_result:
-                    x, y, w, h = rect
-                    cv2.rectangle(result_frame, (x - 10, y - 10), (x + w + 10, y + h + 10), (255, 0, 0), 2)
-
-            # Add parking space information
-            cv2.putText(result_frame, f"Free: {self.free_spaces}/{self.total_spaces}", (10, 30),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-
-            return result_frame
+            return self.annotate_results(self._next_result_buffer(current_frame), results)
         else:
             # Use standard detection based on current mode
             if self.detection_mode == "parking":
                 # Preprocess the frame for parking detection
-                imgGray = cv2.cvtColor(current_frame, cv2.COLOR_BGR2GRAY)
-                imgBlur = cv2.GaussianBlur(imgGray, (3, 3), 1)
-                imgThreshold = cv2.adaptiveThreshold(imgBlur, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                                                     cv2.THRESH_BINARY_INV, 25, 16)
-                imgProcessed = cv2.medianBlur(imgThreshold, 5)
-                kernel = np.ones((3, 3), np.uint8)
-                imgProcessed = cv2.dilate(imgProcessed, kernel, iterations=1)
+                imgProcessed = self.preprocess_parking(self.get_frame_intermediates(current_frame))
 
                 return self.check_parking_space(imgProcessed, current_frame.copy())
             elif prev_frame is not None:
@@ -456,93 +658,57 @@ class ParkingManager:
             else:
                 return current_frame.copy()
 
-    def _process_parking_detection(self, frame):
-        """Process parking detection in a separate thread"""
-        # Preprocess the frame
-        imgGray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        imgBlur = cv2.GaussianBlur(imgGray, (3, 3), 1)
-        imgThreshold = cv2.adaptiveThreshold(imgBlur, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                                             cv2.THRESH_BINARY_INV, 25, 16)
-        imgProcessed = cv2.medianBlur(imgThreshold, 5)
-        kernel = np.ones((3, 3), np.uint8)
-        imgProcessed = cv2.dilate(imgProcessed, kernel, iterations=1)
-
-        # Process each parking space
-        parking_results = []
-        space_counter = 0
-
-        with self.data_lock:
-            for i, (x, y, w, h) in enumerate(self.posList):
-                # Ensure coordinates are within image bounds
-                if (y >= 0 and y + h < imgProcessed.shape[0] and x >= 0 and x + w < imgProcessed.shape[1]):
-                    # Get crop of parking space
-                    img_crop = imgProcessed[y:y + h, x:x + w]
-                    count = cv2.countNonZero(img_crop)
-                    is_free = count < self.parking_threshold
-
-                    if is_free:
-                        space_counter += 1
-
-                    # Store results
-                    parking_results.append((x, y, w, h, is_free))
-
-            self.free_spaces = space_counter
-            self.total_spaces = len(self.posList)
-            self.occupied_spaces = self.total_spaces - self.free_spaces
-            self.parking_detection_result = parking_results
+    def _process_parking_detection(self, intermediates, positions, reference_image=None):
+        """
+        Parking engine, run on a detection worker
 
-    def _process_vehicle_detection(self, current_frame, prev_frame):
-        """Process vehicle detection in a separate thread"""
-        # Get difference between frames
-        d = cv2.absdiff(prev_frame, current_frame)
-        grey = cv2.cvtColor(d, cv2.COLOR_BGR2GRAY)
-        blur = cv2.GaussianBlur(grey, (5, 5), 0)
-        _, th = cv2.threshold(blur, 20, 255, cv2.THRESH_BINARY)
-        dilated = cv2.dilate(th, np.ones((3, 3)))
-        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2, 2))
-        closing = cv2.morphologyEx(dilated, cv2.MORPH_CLOSE, kernel)
+        Args:
+            positions: Snapshot of the parking positions taken by submit_intermediates
+            reference_image: Reference image of the positions, handed on to the heatmap
 
-        # Find contours
-        contours, _ = cv2.findContours(closing, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+        Returns:
+            (positions, parking_results, occupied, observed, imgProcessed, reference_image)
+        """
+        # Preprocess the frame
+        imgProcessed = self.preprocess_parking(intermediates)
 
-        # Process contours and update vehicle detection
-        vehicle_results = []
-        line_y = self.line_height
+        # Results are published by merge_frame_results
+        parking_results = []
+        occupied = np.zeros(len(positions), dtype=bool)
+        observed = np.zeros(len(positions), dtype=bool)
+        for i, (x, y, w, h) in enumerate(positions):
+            # Ensure coordinates are within image bounds
+            if (y >= 0 and y + h < imgProcessed.shape[0] and x >= 0 and x + w < imgProcessed.shape[1]):
+                # Get crop of parking space
+                img_crop = imgProcessed[y:y + h, x:x + w]
+                count = cv2.countNonZero(img_crop)
+                is_free = count < self.parking_threshold
 
-        # Make a copy of matches to work with
-        with self.data_lock:
-            matches_copy = self.matches.copy()
+                occupied[i] = not is_free
+                observed[i] = True
 
-        # Process each contour
-        for (i, c) in enumerate(contours):
-            (x, y, w, h) = cv2.boundingRect(c)
-            contour_valid = (w >= self.min_contour_width) and (h >= self.min_contour_height)
+                # Store results
+                parking_results.append((x, y, w, h, is_free))
 
-            if not contour_valid:
-                continue
+        return positions, parking_results, occupied, observed, imgProcessed, reference_image
 
-            # Save for drawing
-            vehicle_results.append((x, y, w, h))
+    def _process_vehicle_detection(self, intermediates):
+        """
+        Vehicle engine, run on a detection worker
 
-            # Add centroid
-            centroid = get_centroid(x, y, w, h)
-            matches_copy.append(centroid)
+        The centroid tracker belongs to this engine, so it is updated without the data lock.
 
-        # Check for vehicles crossing the line
-        new_matches = []
-        new_counter = self.vehicle_counter
+        Returns:
+            (vehicle_results, crossed)
+        """
+        line_y = self.line_height
 
-        for (x, y) in matches_copy:
-            if (line_y - self.offset) < y < (line_y + self.offset):
-                new_counter += 1
-            else:
-                new_matches.append((x, y))
+        vehicle_results = self._detect_motion_boxes(intermediates, line_y)
+        centroids = vehicle_results[:, :2] + vehicle_results[:, 2:4] // 2
 
-        # Update vehicle data
-        with self.data_lock:
-            self.matches = new_matches
-            self.vehicle_counter = new_counter
-            self.vehicle_detection_result = vehicle_results
+        # Check for vehicles crossing the line
+        self.matches, crossed = count_line_crossings(self.matches, centroids, line_y, self.offset)
+        return vehicle_results, crossed
 
     # Add these methods to the ParkingManager class
 
@@ -582,7 +748,9 @@ class ParkingManager:
                 is_group_occupied = occupied_count > (total_members / 2)
 
                 # Update group status
-                data['occupied'] = is_group_occupied
+                if data.get('occupied') != is_group_occupied:
+                    data['occupied'] = is_group_occupied
+                    self.mark_parking_data_changed()
 
                 # Draw group boundary on the image
                 x, y, w, h = data['position']
@@ -652,4 +820,6 @@ class ParkingManager:
 
                     if space_id in self.parking_data:
                         self.parking_data[space_id]['in_group'] = True
-                        self.parking_data[space_id]['group_id'] = group_id
\ No newline at end of file
+                        self.parking_data[space_id]['group_id'] = group_id
+
+        self.mark_parking_data_changed()
\ No newline at end of file
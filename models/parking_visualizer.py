@@ -1,13 +1,11 @@
 import cv2
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.patches import Rectangle
-from matplotlib.lines import Line2D
 import xgboost as xgb
 import pandas as pd
 from datetime import datetime
 import pickle
 import os
+from models.report_renderer import ReportRenderer
 
 
 class ParkingVisualizer:
@@ -32,6 +30,7 @@ class ParkingVisualizer:
         self.margin = 50
         self.space_width = 80
         self.space_height = 120
+        self.report_renderer = None  # Created on first use, reused across calls
 
     def _ensure_directories(self):
         """Ensure necessary directories exist"""
@@ -233,156 +232,21 @@ class ParkingVisualizer:
         return best_space_id
 
     def generate_visualization(self, save_path=None):
-        """Generate a visual representation of the parking lot with proper group handling"""
+        """
+        Generate a visual representation of the parking lot with proper group handling
+
+        Rendering is headless (Agg) and the returned figure is reused by the next call,
+        so repeated calls do not leak figures.
+        """
+        if self.report_renderer is None:
+            self.report_renderer = ReportRenderer(space_width=self.space_width,
+                                                  space_height=self.space_height,
+                                                  margin=self.margin)
+
         try:
-            # Create figure and axis with explicit DPI setting
-            fig = plt.figure(figsize=(12, 8), dpi=100)
-            ax = fig.add_subplot(1, 1, 1)
-
-            # Calculate grid dimensions based on number of spaces
-            num_spaces = len(self.parking_data)
-            cols = int(np.ceil(np.sqrt(num_spaces * 1.5)))  # Approximate width:height ratio of 3:2
-            rows = int(np.ceil(num_spaces / cols))
-
-            # Set plot limits
-            ax.set_xlim(0, cols * self.space_width + self.margin * 2)
-            ax.set_ylim(0, rows * self.space_height + self.margin * 2)
-
-            # Find all spaces in groups
-            group_spaces = {}  # Dict of group_id -> list of space_ids
-            spaces_in_groups = set()
-
-            # First identify spaces that belong to groups
-            for space_id, data in self.parking_data.items():
-                # Skip if this is a group entry itself
-                if data.get('is_group', False):
-                    continue
-
-                # Check if this space belongs to a group
-                if data.get('in_group', False) and data.get('group_id'):
-                    group_id = data['group_id']
-                    if group_id not in group_spaces:
-                        group_spaces[group_id] = []
-
-                    group_spaces[group_id].append(space_id)
-                    spaces_in_groups.add(space_id)
-
-            # Draw individual spaces
-            grid_index = 0  # For spaces that don't have position data
-
-            for space_id, data in self.parking_data.items():
-                # Skip group metadata entries
-                if data.get('is_group', False):
-                    continue
-
-                # Get position data (use real position or calculate grid position)
-                if 'position' in data:
-                    x, y, w, h = data['position']
-                else:
-                    row = grid_index // cols
-                    col = grid_index % cols
-                    x = col * self.space_width + self.margin
-                    y = row * self.space_height + self.margin
-                    w = self.space_width - 5
-                    h = self.space_height - 5
-                    grid_index += 1
-
-                # Determine color based on occupancy
-                if data.get('occupied', False):
-                    color = 'red'
-                    alpha = 0.7
-                else:
-                    color = 'green'
-                    alpha = 0.5
-
-                # For spaces in groups, use lighter colors and thinner borders
-                if space_id in spaces_in_groups:
-                    alpha -= 0.1
-                    linewidth = 1
-                else:
-                    linewidth = 2
-
-                # Draw the rectangle for this space
-                rect = Rectangle((x, y), w, h, linewidth=linewidth,
-                                 edgecolor='black', facecolor=color, alpha=alpha)
-                ax.add_patch(rect)
-
-                # Add space ID
-                ax.text(x + 5, y + 5, space_id.split('-')[0] if '-' in space_id else space_id,
-                        fontsize=10 if space_id not in spaces_in_groups else 8)
-
-                # Add vehicle ID if occupied
-                if data.get('occupied', False) and data.get('vehicle_id'):
-                    ax.text(x + 5, y + h - 20, f"V: {data['vehicle_id']}",
-                            fontsize=8, color='white')
-
-                # Add allocation score if applicable
-                if data.get('allocation_score', 0) > 0:
-                    score_text = f"{data['allocation_score']:.2f}"
-                    ax.text(x + w - 30, y + 5, score_text, fontsize=8)
-
-            # Draw group boundaries
-            for group_id, member_ids in group_spaces.items():
-                if not member_ids:
-                    continue
-
-                # Calculate the bounds of this group
-                min_x = min(self.parking_data[space_id]['position'][0]
-                            for space_id in member_ids if 'position' in self.parking_data[space_id])
-                min_y = min(self.parking_data[space_id]['position'][1]
-                            for space_id in member_ids if 'position' in self.parking_data[space_id])
-                max_x = max(self.parking_data[space_id]['position'][0] + self.parking_data[space_id]['position'][2]
-                            for space_id in member_ids if 'position' in self.parking_data[space_id])
-                max_y = max(self.parking_data[space_id]['position'][1] + self.parking_data[space_id]['position'][3]
-                            for space_id in member_ids if 'position' in self.parking_data[space_id])
-
-                # Draw group boundary with dashed line
-                group_rect = Rectangle((min_x - 5, min_y - 5),
-                                       (max_x - min_x) + 10,
-                                       (max_y - min_y) + 10,
-                                       linewidth=2, linestyle='--',
-                                       edgecolor='orange', fill=False)
-                ax.add_patch(group_rect)
-
-                # Add group label
-                group_num = group_id.split('_')[-1] if '_' in group_id else group_id
-                group_label = f"Group {group_num}"
-                ax.text(min_x, min_y - 10, group_label, fontsize=12, color='orange', weight='bold')
-
-                # Calculate free spaces in the group
-                free_spaces = sum(1 for sid in member_ids if not self.parking_data[sid]['occupied'])
-                ax.text(min_x + 80, min_y - 10,
-                        f"Free: {free_spaces}/{len(member_ids)}",
-                        fontsize=10, color='orange')
-
-            # Add legend
-            green_patch = Rectangle((0, 0), 1, 1, facecolor='green', alpha=0.5)
-            red_patch = Rectangle((0, 0), 1, 1, facecolor='red', alpha=0.7)
-            orange_line = Line2D([0], [0], color='orange', linestyle='--', linewidth=2)
-            ax.legend([green_patch, red_patch, orange_line],
-                      ['Free', 'Occupied', 'Group'], loc='upper right')
-
-            # Add statistics - exclude group metadata entries
-            free_count = sum(1 for data in self.parking_data.values()
-                             if not data.get('is_group', False) and not data.get('occupied', False))
-            total = sum(1 for data in self.parking_data.values()
-                        if not data.get('is_group', False))
-
-            ax.set_title(f'Parking Allocation Status - {free_count}/{total} Available')
-
-            # Add timestamp
-            ax.text(self.margin, rows * self.space_height + self.margin * 1.5,
-                    f"Last Updated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
-                    fontsize=10)
-
-            # Ensure tight layout
-            plt.tight_layout()
-
-            # Save if needed
+            fig = self.report_renderer.render(self.parking_data, save_path=save_path)
             if save_path:
-                plt.savefig(save_path)
                 print(f"Saved visualization to {save_path}")
-
             return fig
 
         except Exception as e:
@@ -391,15 +255,37 @@ class ParkingVisualizer:
             traceback.print_exc()  # Print full stack trace
 
             # Return fallback error figure
-            fig = plt.figure(figsize=(8, 6), dpi=100)
-            ax = fig.add_subplot(1, 1, 1)
-            ax.text(0.5, 0.5, f"Error in parking visualization:\n{str(e)}",
-                    ha='center', va='center', color='red')
-            ax.set_axis_off()
-            return fig
+            return self.report_renderer.render_error(f"Error in parking visualization:\n{str(e)}")
+
+    def mark_heatmap(self, frame, heatmap, positions, metric="occupancy", alpha=0.5):
+        """
+        Draw an occupancy heatmap over a frame
+
+        Parameters:
+        - frame: Image the parking positions refer to
+        - heatmap: OccupancyHeatmap
+        - positions: posList the heatmap was fed in the order of (parking_data order may differ)
+        - metric: "occupancy", "dwell" or "activity"
+        - alpha: Opacity of the heatmap
+
+        Returns:
+        - A new image with the heatmap blended in
+        """
+        heatmap.set_positions(positions, frame.shape)
+        return heatmap.render_overlay(frame, positions, metric=metric, alpha=alpha)
 
     def mark_parking_spaces(self, frame, highlight_free=True):
         """Mark parking spaces on a video frame"""
+        frame_height, frame_width = frame.shape[:2]
+
+        # Solid highlight patch shared by every free space, sized to the largest space
+        highlight = None
+        if highlight_free and self.parking_data:
+            max_w = max(data['position'][2] for data in self.parking_data.values())
+            max_h = max(data['position'][3] for data in self.parking_data.values())
+            highlight = np.empty((max(max_h, 1), max(max_w, 1)) + frame.shape[2:], dtype=frame.dtype)
+            highlight[:] = (0, 255, 0)
+
         for space_id, data in self.parking_data.items():
             x, y, w, h = data['position']
 
@@ -423,10 +309,13 @@ class ParkingVisualizer:
 
             # Highlight free spaces if requested
             if highlight_free and not data['occupied']:
-                # Add a subtle highlight effect
-                overlay = frame.copy()
-                cv2.rectangle(overlay, (x + 2, y + 2), (x + w - 2, y + h - 2), (0, 255, 0), -1)
-                cv2.addWeighted(overlay, 0.2, frame, 0.8, 0, frame)
+                # Add a subtle highlight effect, blending only the pixels inside the space
+                # (a full-frame blend leaves everything outside the highlight unchanged)
+                x1, y1 = max(x + 2, 0), max(y + 2, 0)
+                x2, y2 = min(x + w - 1, frame_width), min(y + h - 1, frame_height)
+                if x2 > x1 and y2 > y1:
+                    roi = frame[y1:y2, x1:x2]
+                    roi[:] = cv2.addWeighted(highlight[:y2 - y1, :x2 - x1], 0.2, roi, 0.8, 0)
 
         # Add stats to frame
         free_count = sum(1 for data in self.parking_data.values() if not data['occupied'])
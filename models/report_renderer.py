@@ -0,0 +1,251 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.patches import Rectangle
+from matplotlib.collections import PatchCollection
+from matplotlib.lines import Line2D
+
+
+class ReportRenderer:
+    """
+    Headless renderer for parking lot snapshot reports
+
+    Draws through the Agg backend on an object-oriented Figure that is created once and
+    cleared between renders, so it never goes through pyplot or a GUI backend and memory
+    stays flat in long-running processes.
+    """
+
+    def __init__(self, figsize=(12, 8), dpi=100, space_width=80, space_height=120, margin=50):
+        self.figure = Figure(figsize=figsize, dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.figure)
+
+        # Fixed margins instead of a tight layout pass on every render
+        self.figure.subplots_adjust(left=0.06, right=0.98, bottom=0.05, top=0.94)
+
+        self.space_width = space_width
+        self.space_height = space_height
+        self.margin = margin
+
+    def render(self, parking_data, save_path=None, timestamp=None, lot_name=None):
+        """
+        Render a parking lot snapshot with proper group handling
+
+        Args:
+            parking_data: Dictionary of space/group ID -> space data
+            save_path: Optional path of the PNG file to write
+            timestamp: Time of the snapshot (defaults to now)
+            lot_name: Optional lot name shown in the title
+
+        Returns:
+            The figure; it is reused by the next render
+        """
+        # Drop the previous render's artists, the figure itself is reused
+        self.figure.clear()
+        ax = self.figure.add_subplot(1, 1, 1)
+
+        # Calculate grid dimensions based on number of spaces
+        num_spaces = len(parking_data)
+        cols = max(int(np.ceil(np.sqrt(num_spaces * 1.5))), 1)  # Approximate width:height ratio of 3:2
+        rows = int(np.ceil(num_spaces / cols))
+
+        # Set plot limits
+        ax.set_xlim(0, cols * self.space_width + self.margin * 2)
+        ax.set_ylim(0, rows * self.space_height + self.margin * 2)
+
+        # Find all spaces in groups
+        group_spaces = {}  # Dict of group_id -> list of space_ids
+        spaces_in_groups = set()
+
+        # First identify spaces that belong to groups
+        for space_id, data in parking_data.items():
+            # Skip if this is a group entry itself
+            if data.get('is_group', False):
+                continue
+
+            # Check if this space belongs to a group
+            if data.get('in_group', False) and data.get('group_id'):
+                group_id = data['group_id']
+                if group_id not in group_spaces:
+                    group_spaces[group_id] = []
+
+                group_spaces[group_id].append(space_id)
+                spaces_in_groups.add(space_id)
+
+        # Draw individual spaces, collected so they are added and drawn as one artist
+        grid_index = 0  # For spaces that don't have position data
+        space_rects = []
+
+        for space_id, data in parking_data.items():
+            # Skip group metadata entries
+            if data.get('is_group', False):
+                continue
+
+            # Get position data (use real position or calculate grid position)
+            if 'position' in data:
+                x, y, w, h = data['position']
+            else:
+                row = grid_index // cols
+                col = grid_index % cols
+                x = col * self.space_width + self.margin
+                y = row * self.space_height + self.margin
+                w = self.space_width - 5
+                h = self.space_height - 5
+                grid_index += 1
+
+            # Determine color based on occupancy
+            if data.get('occupied', False):
+                color = 'red'
+                alpha = 0.7
+            else:
+                color = 'green'
+                alpha = 0.5
+
+            # For spaces in groups, use lighter colors and thinner borders
+            if space_id in spaces_in_groups:
+                alpha -= 0.1
+                linewidth = 1
+            else:
+                linewidth = 2
+
+            # Rectangle for this space
+            space_rects.append(Rectangle((x, y), w, h, linewidth=linewidth,
+                                         edgecolor='black', facecolor=color, alpha=alpha))
+
+            # Add space ID
+            ax.text(x + 5, y + 5, space_id.split('-')[0] if '-' in space_id else space_id,
+                    fontsize=10 if space_id not in spaces_in_groups else 8)
+
+            # Add vehicle ID if occupied
+            if data.get('occupied', False) and data.get('vehicle_id'):
+                ax.text(x + 5, y + h - 20, f"V: {data['vehicle_id']}",
+                        fontsize=8, color='white')
+
+            # Add allocation score if applicable
+            if data.get('allocation_score', 0) > 0:
+                score_text = f"{data['allocation_score']:.2f}"
+                ax.text(x + w - 30, y + 5, score_text, fontsize=8)
+
+        if space_rects:
+            ax.add_collection(PatchCollection(space_rects, match_original=True), autolim=False)
+
+        # Draw group boundaries
+        for group_id, member_ids in group_spaces.items():
+            positions = [parking_data[space_id]['position'] for space_id in member_ids
+                         if 'position' in parking_data[space_id]]
+            if not positions:
+                continue
+
+            # Calculate the bounds of this group
+            min_x = min(x for x, y, w, h in positions)
+            min_y = min(y for x, y, w, h in positions)
+            max_x = max(x + w for x, y, w, h in positions)
+            max_y = max(y + h for x, y, w, h in positions)
+
+            # Draw group boundary with dashed line
+            group_rect = Rectangle((min_x - 5, min_y - 5),
+                                   (max_x - min_x) + 10,
+                                   (max_y - min_y) + 10,
+                                   linewidth=2, linestyle='--',
+                                   edgecolor='orange', fill=False)
+            ax.add_patch(group_rect)
+
+            # Add group label
+            group_num = group_id.split('_')[-1] if '_' in group_id else group_id
+            group_label = f"Group {group_num}"
+            ax.text(min_x, min_y - 10, group_label, fontsize=12, color='orange', weight='bold')
+
+            # Calculate free spaces in the group
+            free_spaces = sum(1 for sid in member_ids if not parking_data[sid].get('occupied', False))
+            ax.text(min_x + 80, min_y - 10,
+                    f"Free: {free_spaces}/{len(member_ids)}",
+                    fontsize=10, color='orange')
+
+        # Add legend
+        green_patch = Rectangle((0, 0), 1, 1, facecolor='green', alpha=0.5)
+        red_patch = Rectangle((0, 0), 1, 1, facecolor='red', alpha=0.7)
+        orange_line = Line2D([0], [0], color='orange', linestyle='--', linewidth=2)
+        ax.legend([green_patch, red_patch, orange_line],
+                  ['Free', 'Occupied', 'Group'], loc='upper right')
+
+        # Add statistics - exclude group metadata entries
+        free_count = sum(1 for data in parking_data.values()
+                         if not data.get('is_group', False) and not data.get('occupied', False))
+        total = sum(1 for data in parking_data.values()
+                    if not data.get('is_group', False))
+
+        title = f'Parking Allocation Status - {free_count}/{total} Available'
+        ax.set_title(f"{lot_name}: {title}" if lot_name else title)
+
+        # Add timestamp
+        timestamp = timestamp or datetime.now()
+        ax.text(self.margin, rows * self.space_height + self.margin * 1.5,
+                f"Last Updated: {timestamp.strftime('%Y-%m-%d %H:%M:%S')}",
+                fontsize=10)
+
+        # Save if needed
+        if save_path:
+            self.figure.savefig(save_path)
+
+        return self.figure
+
+    def render_error(self, message):
+        """Render a figure showing an error message instead of the lot"""
+        self.figure.clear()
+        ax = self.figure.add_subplot(1, 1, 1)
+        ax.text(0.5, 0.5, message, ha='center', va='center', color='red')
+        ax.set_axis_off()
+        return self.figure
+
+
+# Renderer owned by each worker process of render_report_batch
+_worker_renderer = None
+
+
+def _init_report_worker(figsize, dpi):
+    """Create the worker process's renderer once, it is reused for every snapshot"""
+    global _worker_renderer
+    _worker_renderer = ReportRenderer(figsize=figsize, dpi=dpi)
+
+
+def _render_report_job(job):
+    """Render one snapshot in a worker process and write it to disk"""
+    lot_name, parking_data, timestamp, save_path = job
+    try:
+        _worker_renderer.render(parking_data, save_path=save_path, timestamp=timestamp, lot_name=lot_name)
+        return save_path
+    except Exception as e:
+        print(f"Error rendering report for {lot_name} at {timestamp}: {str(e)}")
+        return None
+
+
+def render_report_batch(snapshots, output_dir, max_workers=None, figsize=(12, 8), dpi=100):
+    """
+    Render many lot snapshots to PNG files in a process pool
+
+    Each worker process keeps a single ReportRenderer, and the PNGs are written by the
+    workers themselves, so only the parking data travels between processes.
+
+    Args:
+        snapshots: Iterable of (lot_name, parking_data, timestamp) tuples
+        output_dir: Directory the PNG files are written to
+        max_workers: Number of worker processes (defaults to the CPU count)
+        figsize: Figure size in inches
+        dpi: Figure resolution
+
+    Yields:
+        Path of each written PNG in input order, or None for snapshots that failed
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    jobs = [(lot_name, parking_data, timestamp,
+             os.path.join(output_dir, f"{lot_name}_{timestamp.strftime('%Y%m%d_%H%M%S')}.png"))
+            for lot_name, parking_data, timestamp in snapshots]
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_report_worker,
+                             initargs=(figsize, dpi)) as executor:
+        for save_path in executor.map(_render_report_job, jobs):
+            yield save_path
\ No newline at end of file
@@ -0,0 +1,276 @@
+import threading
+
+import cv2
+import numpy as np
+
+from models.detections import detect_arrays_batch, scale_detections, make_detections, to_detection_list
+
+
+def rects_bounds(rects, frame_shape, margin=0):
+    """
+    Bounding box of (x, y, w, h) rectangles, grown by a margin and clipped to the frame
+
+    Returns:
+        (x1, y1, x2, y2), None without rectangles
+    """
+    if not rects:
+        return None
+    rects = np.asarray(rects, dtype=np.int64).reshape(-1, 4)
+    height, width = frame_shape[:2]
+    x1 = int(np.clip(rects[:, 0].min() - margin, 0, width - 1))
+    y1 = int(np.clip(rects[:, 1].min() - margin, 0, height - 1))
+    x2 = int(np.clip((rects[:, 0] + rects[:, 2]).max() + margin, x1 + 1, width))
+    y2 = int(np.clip((rects[:, 1] + rects[:, 3]).max() + margin, y1 + 1, height))
+    return x1, y1, x2, y2
+
+
+def tile_starts(start, end, tile, stride):
+    """Start offsets of the fewest evenly spaced tiles covering [start, end) with at most `stride` between them"""
+    if end - start <= tile:
+        return [start]
+    count = int(np.ceil((end - start - tile) / stride)) + 1
+    return [int(v) for v in np.linspace(start, end - tile, count).round()]
+
+
+def make_tiles(bounds, tile_size=640, overlap=0.2, rects=None, margin=0):
+    """
+    Split a region into overlapping tiles of about tile_size x tile_size pixels
+
+    Tiles are square unless the region is thinner than tile_size: a thin band gets tiles
+    of its full thickness stretched along it to the same area, so a band is covered by
+    a few wide tiles rather than many small ones that detectors would upscale.
+
+    Args:
+        bounds: (x1, y1, x2, y2) region in frame coordinates
+        tile_size: Side of the square of the tile area, in pixels of the region
+        overlap: Share of a tile shared with its neighbour, so vehicles up to that size
+                 are whole in at least one tile
+        rects: Optional (x, y, w, h) rectangles; tiles touching none of them are dropped
+        margin: Margin around the rectangles used for that test
+
+    Returns:
+        List of (x1, y1, x2, y2) tiles
+    """
+    x1, y1, x2, y2 = bounds
+    area = tile_size * tile_size
+    if x2 - x1 >= y2 - y1:
+        height = min(tile_size, y2 - y1)
+        width = min(x2 - x1, max(tile_size, area // height))
+    else:
+        width = min(tile_size, x2 - x1)
+        height = min(y2 - y1, max(tile_size, area // width))
+    stride_x = max(1, int(width * (1 - overlap)))
+    stride_y = max(1, int(height * (1 - overlap)))
+
+    tiles = [(tx, ty, tx + width, ty + height)
+             for ty in tile_starts(y1, y2, height, stride_y)
+             for tx in tile_starts(x1, x2, width, stride_x)]
+
+    if rects:
+        boxes = np.asarray(rects, dtype=np.int64).reshape(-1, 4)
+        rx1, ry1 = boxes[:, 0] - margin, boxes[:, 1] - margin
+        rx2, ry2 = boxes[:, 0] + boxes[:, 2] + margin, boxes[:, 1] + boxes[:, 3] + margin
+        tiles = [t for t in tiles
+                 if np.any((rx1 < t[2]) & (rx2 > t[0]) & (ry1 < t[3]) & (ry2 > t[1]))]
+    return tiles
+
+
+def merge_detections(boxes, scores, class_ids, tile_ids, iou_threshold=0.5, containment_threshold=0.8):
+    """
+    Cross-tile NMS of detections gathered from overlapping tiles
+
+    Greedy per-class NMS by score. Besides the usual IoU test, boxes of different tiles are
+    merged when the smaller one lies mostly inside the other: a vehicle cut by a tile edge
+    gives a partial box there and a whole one in the neighbouring tile, and their IoU is
+    low when much of the vehicle lies outside the first tile. The kept box grows to the
+    union of the boxes merged into it, so a partial box never wins over the whole one.
+
+    Args:
+        boxes: (N, 4) array of (x1, y1, x2, y2) in frame coordinates
+        scores, class_ids, tile_ids: (N,) arrays
+        iou_threshold: IoU above which the lower-scoring box is suppressed
+        containment_threshold: Share of the smaller box's area inside a box of another tile
+                               above which the two are merged
+
+    Returns:
+        (keep, boxes): indices of the kept detections by descending score, and their
+        (len(keep), 4) boxes after merging
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    order = np.argsort(-np.asarray(scores), kind='stable')
+    class_ids = np.asarray(class_ids)
+    tile_ids = np.asarray(tile_ids)
+    areas = np.maximum(boxes[:, 2] - boxes[:, 0], 0) * np.maximum(boxes[:, 3] - boxes[:, 1], 0)
+
+    keep, merged = [], []
+    suppressed = np.zeros(len(boxes), dtype=bool)
+    for i in order:
+        if suppressed[i]:
+            continue
+        keep.append(int(i))
+        box = boxes[i].copy()
+        merged.append(box)
+
+        # Overlap of the remaining boxes of the class with box i
+        others = ~suppressed & (class_ids == class_ids[i])
+        others[i] = False
+        candidates = np.flatnonzero(others)
+        if not len(candidates):
+            continue
+        w = np.clip(np.minimum(boxes[i, 2], boxes[candidates, 2]) - np.maximum(boxes[i, 0], boxes[candidates, 0]), 0, None)
+        h = np.clip(np.minimum(boxes[i, 3], boxes[candidates, 3]) - np.maximum(boxes[i, 1], boxes[candidates, 1]), 0, None)
+        inter = w * h
+        iou = inter / np.maximum(areas[i] + areas[candidates] - inter, 1e-9)
+        contained = inter / np.maximum(np.minimum(areas[i], areas[candidates]), 1e-9)
+
+        parts = (contained > containment_threshold) & (tile_ids[candidates] != tile_ids[i])
+        if parts.any():
+            box[:2] = np.minimum(box[:2], boxes[candidates[parts], :2].min(axis=0))
+            box[2:] = np.maximum(box[2:], boxes[candidates[parts], 2:].max(axis=0))
+        suppressed[candidates[(iou > iou_threshold) | parts]] = True
+
+    return keep, np.array(merged).reshape(-1, 4)
+
+
+class TiledInference:
+    """
+    Runs a detector on regions of interest instead of a downscaled full frame
+
+    The region (the band around the counting line or the area of the parking spaces) is
+    split into overlapping tiles at native resolution, so small distant vehicles keep
+    their pixels and no compute goes to sky and buildings. The tiles of all frames go to
+    the detector in one detect_vehicles_batch call; boxes are shifted back to frame
+    coordinates and merged by cross-tile NMS. When a region needs more than `max_tiles`
+    tiles it is downscaled until it fits, which bounds the cost per frame; `max_pixels`
+    optionally caps the total tile pixels as well, at the price of resolution.
+
+    The region is set from the UI thread with set_region() and read by the inference
+    worker; it is one tuple swapped under a lock, and tiles are cached per region.
+    """
+
+    def __init__(self, tile_size=640, overlap=0.2, max_tiles=4, max_pixels=None, nms_threshold=0.5):
+        """
+        Args:
+            tile_size: Tile side in frame pixels
+            overlap: Share of a tile shared with its neighbours
+            max_tiles: Largest number of tiles per frame
+            max_pixels: Optional cap on the tile pixels per frame after downscaling
+                        (e.g. 640 * 360 to never cost more than the full-frame path)
+            nms_threshold: IoU of the cross-tile NMS
+        """
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.max_tiles = max(1, max_tiles)
+        self.max_pixels = max_pixels
+        self.nms_threshold = nms_threshold
+
+        self._region = None  # (bounds, rects, margin)
+        self._lock = threading.Lock()
+        self._tile_cache = {}
+        self.last_tile_count = 0
+
+    def set_region(self, bounds, rects=None, margin=0):
+        """
+        Restrict inference to a region; bounds None means the whole frame
+
+        Args:
+            bounds: (x1, y1, x2, y2) region in frame coordinates
+            rects: Optional (x, y, w, h) rectangles inside the region, tiles without any are skipped
+            margin: Margin kept around the rectangles
+        """
+        region = (tuple(bounds), tuple(map(tuple, rects)) if rects else None, margin) if bounds else None
+        with self._lock:
+            self._region = region
+
+    @property
+    def active(self):
+        return self._region is not None
+
+    def tiles(self, frame_shape):
+        """
+        Tiles of the current region in a frame
+
+        Returns:
+            (tiles, scale): (x1, y1, x2, y2) tiles in frame coordinates and the factor they
+            are resized by before inference (1.0 at native resolution)
+        """
+        with self._lock:
+            region = self._region
+        if region is None:
+            return [], 1.0
+
+        key = (frame_shape[:2], region)
+        cached = self._tile_cache.get(key)
+        if cached is not None:
+            return cached
+
+        bounds, rects, margin = region
+        height, width = frame_shape[:2]
+        x1, y1 = max(0, bounds[0]), max(0, bounds[1])
+        bounds = (x1, y1, max(x1 + 1, min(bounds[2], width)), max(y1 + 1, min(bounds[3], height)))
+
+        # Native resolution when the region fits in max_tiles, otherwise grow the tiles (and
+        # shrink them at inference) until it does; with max_pixels, once one tile covers the
+        # region it is shrunk just enough to fit
+        scale = 1.0
+        while True:
+            tile_size = int(round(self.tile_size / scale))
+            tiles = make_tiles(bounds, tile_size, self.overlap, rects, margin)
+            pixels = sum((t[2] - t[0]) * (t[3] - t[1]) for t in tiles)
+            fits_pixels = self.max_pixels is None or pixels * scale * scale <= self.max_pixels
+            if len(tiles) <= self.max_tiles and fits_pixels:
+                break
+            if len(tiles) <= 1 or tile_size >= max(width, height):
+                if not fits_pixels:
+                    scale = float(np.sqrt(self.max_pixels / pixels))
+                break
+            scale *= 0.8
+
+        if len(self._tile_cache) > 8:
+            self._tile_cache.clear()
+        self._tile_cache[key] = (tiles, scale)
+        return tiles, scale
+
+    def detect_batch(self, detector, frames):
+        """
+        Detections of each frame inside the region, in frame coordinates
+
+        Returns:
+            List with the [[x1, y1, x2, y2], score, class_id] detections of each frame
+        """
+        crops, owners, offsets = [], [], []
+        scales = []
+        for index, frame in enumerate(frames):
+            tiles, scale = self.tiles(frame.shape)
+            for tx1, ty1, tx2, ty2 in tiles:
+                crop = frame[ty1:ty2, tx1:tx2]
+                if scale != 1.0:
+                    crop = cv2.resize(crop, (max(1, int(crop.shape[1] * scale)), max(1, int(crop.shape[0] * scale))),
+                                      interpolation=cv2.INTER_AREA)
+                crops.append(crop)
+                owners.append(index)
+                offsets.append((tx1, ty1))
+                scales.append(scale)
+        self.last_tile_count = len(crops) // max(1, len(frames))
+
+        if not crops:
+            return [[] for _ in frames]
+        tile_detections = detect_arrays_batch(detector, crops)
+
+        # Gather the detections of each frame in frame coordinates, remembering their tile
+        gathered = [([], []) for _ in frames]
+        for tile_id, (detections, owner, offset, scale) in enumerate(zip(tile_detections, owners, offsets, scales)):
+            gathered[owner][0].append(scale_detections(detections, 1 / scale, 1 / scale, offset))
+            gathered[owner][1].append(np.full(len(detections), tile_id))
+
+        results = []
+        for detections, tile_ids in gathered:
+            detections = np.concatenate(detections) if detections else None
+            if detections is None or not len(detections):
+                results.append([])
+                continue
+            keep, merged = merge_detections(detections['box'], detections['score'], detections['class_id'],
+                                            np.concatenate(tile_ids), self.nms_threshold)
+            results.append(to_detection_list(make_detections(merged, detections['score'][keep],
+                                                             detections['class_id'][keep])))
+        return results
\ No newline at end of file
@@ -1,34 +1,73 @@
-import torch
-from torchvision.models import detection
-from torchvision.models.detection import FasterRCNN_ResNet50_FPN_Weights
 import numpy as np
 import time
 import cv2
+from models.onnx_detector import ONNXDetector, DEFAULT_ONNX_PATH
+from models.detections import TORCHVISION_CLASSES, COCO_CLASSES, VOC_CLASSES, vehicle_class_ids, make_detections, \
+    empty_detections, filter_detections, clip_detections, to_detection_list
+from models.inference_profile import PROFILES, default_thread_count, optimize_for_cpu, inference_context, \
+    compare_detectors
+
+# torch is optional, ONNX models run through OpenCV DNN without it
+try:
+    import torch
+    from torchvision.models import detection
+    from torchvision.models.detection import FasterRCNN_ResNet50_FPN_Weights
+except ImportError:
+    torch = None
 
 
 class VehicleDetector:
-    def __init__(self, confidence_threshold=0.5):
+    def __init__(self, confidence_threshold=0.5, model_path=None, profile="default", num_threads=None,
+                 quantize=False):
+        """
+        Args:
+            confidence_threshold: Minimum detection score
+            model_path: Optional .onnx model, loaded before the torch models are tried
+            profile: "default" (float model) or "cpu_optimized" (inference_mode and its own
+                     intra-op thread count during inference)
+            num_threads: Torch intra-op threads in the CPU profile (default: all cores but one)
+            quantize: In the CPU profile, also apply INT8 dynamic quantization where supported;
+                      off until self_check has been run on the target cameras
+        """
         self.confidence_threshold = confidence_threshold
+        self.profile = profile if profile in PROFILES else "default"
+        self.quantize = quantize
+        self.num_threads = None
+        self.optimizations = []  # Optimizations the CPU profile could apply to the loaded model
 
         # Force CPU usage to avoid CUDA issues
-        self.device = torch.device('cpu')
+        self.device = torch.device('cpu') if torch is not None else 'cpu'
         print(f"Using device: {self.device}")
 
+        if self.profile == "cpu_optimized" and torch is not None:
+            self.num_threads = num_threads or default_thread_count()
+            self.optimizations.append(f"{self.num_threads} threads")
+
         # Cache for previously detected frames to improve performance
         self.detection_cache = {}
         self.cache_max_size = 20
         self.last_inference_time = 0
         self.inference_interval = 0.5  # Minimum time between full inferences (seconds)
 
+        # An explicitly requested ONNX model needs neither torch nor the default weights
+        if model_path is not None and str(model_path).lower().endswith(".onnx") and self._load_onnx(model_path):
+            return
+
         try:
             # Try to load FasterRCNN model
             print("Loading ML model...")
             try:
+                if torch is None:
+                    raise ImportError("torch is not installed")
                 self.model = detection.fasterrcnn_resnet50_fpn(weights=FasterRCNN_ResNet50_FPN_Weights.DEFAULT)
                 # Optimize model for inference
                 self.model.eval()
                 # Move model to device
                 self.model = self.model.to(self.device)
+                if self.profile == "cpu_optimized":
+                    self.model, applied = optimize_for_cpu(self.model, self.quantize)
+                    self.optimizations.extend(applied)
+                    print(f"CPU profile: {', '.join(self.optimizations)}")
                 # Use TorchScript to optimize model if possible
                 try:
                     self.model = torch.jit.script(self.model)
@@ -50,6 +89,10 @@ class VehicleDetector:
                     self.model_type = "yolov8"
                 except Exception as e:
                     print(f"Could not load YOLOv8: {e}")
+
+                    # Exported YOLO model, if present, before the old MobileNet-SSD
+                    if self._load_onnx(DEFAULT_ONNX_PATH):
+                        return
                     print("Loading fallback OpenCV DNN model...")
 
                     # Load OpenCV DNN model as fallback
@@ -76,93 +119,150 @@ class VehicleDetector:
                         self.model = None
                         self.model_type = "none"
 
-            # COCO class names (we're interested in vehicles)
-            self.classes = [
-                'background', 'person', 'bicycle', 'car', 'motorcycle',
-                'airplane', 'bus', 'train', 'truck', 'boat'
-            ]
-            self.vehicle_classes = [2, 3, 5, 6, 7, 8]  # Indices of vehicle classes
         except Exception as e:
             print(f"Error loading ML model: {str(e)}")
             self.model = None
             self.model_type = "none"
 
+        # Class names of the backend's label space, and the shared vehicle classes in it
+        if self.model_type == "yolov8":
+            self.classes = getattr(self.model, 'names', None) or COCO_CLASSES
+        elif self.model_type == "opencv":
+            self.classes = VOC_CLASSES
+        else:
+            self.classes = TORCHVISION_CLASSES
+        self.vehicle_classes = vehicle_class_ids(self.classes)
+
+    def _load_onnx(self, model_path):
+        """Load an ONNX model as the detection backend, False if that is not possible"""
+        try:
+            self.model = ONNXDetector(model_path, self.confidence_threshold)
+        except Exception as e:
+            print(f"Could not load ONNX model: {e}")
+            return False
+
+        self.model_type = "onnx"
+        self.classes = ONNXDetector.CLASSES
+        self.vehicle_classes = self.model.vehicle_classes
+        return True
+
     # Add detect_vehicles method that was missing
     def detect_vehicles(self, image):
         """Detect vehicles in an image and return bounding boxes, classes, and scores"""
-        if self.model is None:
-            return []
+        return self.detect_vehicles_batch([image])[0]
+
+    def detect_vehicles_batch(self, images):
+        """
+        Detect vehicles in several images with one model call
+
+        On CPU one call on 4-8 images is faster than as many single-image calls, since the
+        per-call overhead is paid once. The images may differ in size.
+
+        Args:
+            images: List of BGR images
+
+        Returns:
+            List with the detections of each image, in the format of detect_vehicles
+        """
+        return [to_detection_list(detections) for detections in self.detect_arrays_batch(images)]
+
+    def detect_arrays_batch(self, images):
+        """
+        Detect vehicles in several images, as one structured array per image
+
+        Each backend only converts its raw output to parallel box/score/class arrays;
+        confidence and vehicle class filtering are shared mask operations.
+
+        Returns:
+            List with a structured detection array (see models/detections.py) per image
+        """
+        if self.model is None or not images:
+            return [empty_detections() for _ in images]
 
         try:
             if self.model_type == "fasterrcnn":
-                # Convert image to tensor
-                img_tensor = torch.from_numpy(image.transpose((2, 0, 1))).float().div(255.0).unsqueeze(0).to(
-                    self.device)
+                # torchvision detection models take a list of CHW tensors
+                img_tensors = [torch.from_numpy(image.transpose((2, 0, 1))).float().div(255.0).to(self.device)
+                               for image in images]
 
                 # Perform inference
-                with torch.no_grad():
-                    prediction = self.model(img_tensor)
+                with inference_context(self.profile, self.num_threads):
+                    predictions = self.model(img_tensors)
 
-                # Process predictions
-                boxes = prediction[0]['boxes'].cpu().numpy()
-                scores = prediction[0]['scores'].cpu().numpy()
-                labels = prediction[0]['labels'].cpu().numpy()
+                # A TorchScript model returns (losses, detections)
+                if isinstance(predictions, tuple):
+                    predictions = predictions[1]
 
-                # Filter vehicle classes and confidence threshold
-                vehicle_detections = []
-                for box, score, label in zip(boxes, scores, labels):
-                    if score >= self.confidence_threshold and label in self.vehicle_classes:
-                        x1, y1, x2, y2 = box
-                        vehicle_detections.append([[int(x1), int(y1), int(x2), int(y2)], score, int(label)])
-
-                return vehicle_detections
+                # One device-to-host copy per output tensor
+                raw = [make_detections(prediction['boxes'].cpu().numpy(), prediction['scores'].cpu().numpy(),
+                                       prediction['labels'].cpu().numpy())
+                       for prediction in predictions]
 
             elif self.model_type == "yolov8":
-                # YOLOv8 detection
-                results = self.model(image, verbose=False)
-
-                # Process results
-                vehicle_detections = []
-                for result in results:
-                    for box in result.boxes:
-                        x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                        conf = float(box.conf)
-                        cls = int(box.cls)
-
-                        # Filter for vehicles and confidence threshold
-                        # YOLOv8 classes: 2=car, 5=bus, 7=truck
-                        if conf >= self.confidence_threshold and cls in [2, 5, 7]:
-                            vehicle_detections.append([[int(x1), int(y1), int(x2), int(y2)], conf, cls])
+                # YOLOv8 detection, one result per image holding (N, 4), (N,) and (N,) tensors
+                with inference_context(self.profile, self.num_threads):
+                    results = self.model(list(images), verbose=False)
+                raw = [make_detections(result.boxes.xyxy.cpu().numpy(), result.boxes.conf.cpu().numpy(),
+                                       result.boxes.cls.cpu().numpy())
+                       for result in results]
 
-                return vehicle_detections
+            elif self.model_type == "onnx":
+                # Letterboxing, decoding, filtering and NMS happen in the ONNX backend
+                return self.model.detect_arrays_batch(images)
 
             elif self.model_type == "opencv":
-                # OpenCV DNN detection
-                height, width = image.shape[:2]
-                blob = cv2.dnn.blobFromImage(image, 0.007843, (300, 300), 127.5)
+                # OpenCV DNN detection on one blob holding all images
+                blob = cv2.dnn.blobFromImages(images, 0.007843, (300, 300), 127.5)
                 self.model.setInput(blob)
-                detections = self.model.forward()
+                output = self.model.forward().reshape(-1, 7)
 
-                vehicle_detections = []
-                for i in range(detections.shape[2]):
-                    confidence = detections[0, 0, i, 2]
-                    class_id = int(detections[0, 0, i, 1])
+                # Rows are (image, class, score, x1, y1, x2, y2) with coordinates relative to the image
+                image_ids = output[:, 0].astype(np.int64)
+                raw = []
+                for image_id, image in enumerate(images):
+                    rows = output[image_ids == image_id]
+                    height, width = image.shape[:2]
+                    raw.append(make_detections(rows[:, 3:7] * np.array([width, height, width, height]),
+                                               rows[:, 2], rows[:, 1]))
 
-                    # Filter for vehicles and confidence threshold
-                    if confidence >= self.confidence_threshold and class_id in self.vehicle_classes:
-                        # Extract bounding box
-                        box = detections[0, 0, i, 3:7] * np.array([width, height, width, height])
-                        x1, y1, x2, y2 = box.astype("int")
-                        vehicle_detections.append([[x1, y1, x2, y2], confidence, class_id])
+            else:
+                return [empty_detections() for _ in images]
 
-                return vehicle_detections
-
-            return []
+            return [clip_detections(filter_detections(detections, self.confidence_threshold, self.vehicle_classes),
+                                    image.shape)
+                    for detections, image in zip(raw, images)]
 
         except Exception as e:
             print(f"Error in detect_vehicles: {e}")
-            return []
+            return [empty_detections() for _ in images]
+
+    def self_check(self, frames, iou_threshold=0.5):
+        """
+        Compare the CPU-optimized model with the float model on sample frames
+
+        Loads a second detector with the default profile as the reference, so run it
+        offline or on a background thread.
+
+        Args:
+            frames: Sample BGR frames from the cameras the detector will be used on
+            iou_threshold: Minimum IoU for a detection to count as the same
+
+        Returns:
+            Dict from compare_detectors (recall, precision, mean_iou, reference_ms,
+            candidate_ms), or None when this detector uses the default profile
+        """
+        if self.profile == "default" or self.model_type not in ("fasterrcnn", "yolov8"):
+            return None
+
+        reference = VehicleDetector(self.confidence_threshold, profile="default")
+        report = compare_detectors(reference, self, frames, iou_threshold)
+        print(f"CPU profile self-check on {report['frames']} frames: recall {report['recall']:.2f}, "
+              f"precision {report['precision']:.2f}, mean IoU {report['mean_iou']:.2f}, "
+              f"{report['reference_ms']:.1f} ms -> {report['candidate_ms']:.1f} ms per frame")
+        return report
 
     def set_confidence_threshold(self, threshold):
         """Update the confidence threshold"""
-        self.confidence_threshold = threshold
\ No newline at end of file
+        self.confidence_threshold = threshold
+        if self.model_type == "onnx":
+            self.model.set_confidence_threshold(threshold)
\ No newline at end of file
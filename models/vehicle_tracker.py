@@ -2,6 +2,7 @@ import cv2
 import numpy as np
 import time
 from models.yolo_detector import YOLODetector
+from models.lazy_detector import LazyDetector
 from models.deep_sort_tracker import DeepSORTTracker
 
 
@@ -14,12 +15,13 @@ class VehicleTracker:
                  confidence_threshold=0.5, use_cuda=True):
         self.confidence_threshold = confidence_threshold
 
-        # Initialize YOLO detector
-        self.detector = YOLODetector(
+        # Load the YOLO detector in the background, frames before it is ready have no detections
+        self.detector = LazyDetector(lambda: YOLODetector(
             model_path=yolo_model_path,
             confidence_threshold=confidence_threshold,
             use_cuda=use_cuda
-        )
+        ), name="YOLO detector")
+        self.detector.start_loading()
 
         # Initialize DeepSORT tracker
         self.tracker = DeepSORTTracker(
@@ -45,6 +47,9 @@ class VehicleTracker:
         self.tracked_vehicles = {}  # Dictionary to store vehicle data by ID
         self.vehicle_count = 0
 
+        # Optional CountingZones replacing the single counting line
+        self.counting_zones = None
+
         print("Vehicle tracker initialized with YOLO and DeepSORT")
 
     def process_frame(self, frame, line_height=None, offset=10):
@@ -104,6 +109,9 @@ class VehicleTracker:
         """
         Process tracks and count vehicles crossing a line
 
+        With counting_zones set, the last step of every track is counted against all
+        configured lines and zones in one vectorized update instead.
+
         Args:
             frame: Frame to draw on
             tracks: List of tracks (ID, bbox, class_id)
@@ -114,9 +122,14 @@ class VehicleTracker:
             tuple: (processed_frame, vehicle_count)
         """
         # Draw counting line
-        cv2.line(frame, (0, line_height), (frame.shape[1], line_height), (0, 255, 0), 2)
+        zones = self.counting_zones
+        if zones:
+            zones.draw(frame)
+        else:
+            cv2.line(frame, (0, line_height), (frame.shape[1], line_height), (0, 255, 0), 2)
 
         vehicle_count = self.vehicle_count
+        moves_from, moves_to, move_classes = [], [], []
 
         # Process each track
         for track_id, bbox, class_id in tracks:
@@ -141,8 +154,17 @@ class VehicleTracker:
                 if len(self.tracked_vehicles[track_id]['positions']) > 30:
                     self.tracked_vehicles[track_id]['positions'] = self.tracked_vehicles[track_id]['positions'][-30:]
 
+            if zones:
+                # Collected here, counted for all tracks at once below
+                positions = self.tracked_vehicles[track_id]['positions']
+                if len(positions) >= 2:
+                    moves_from.append(positions[-2])
+                    moves_to.append(positions[-1])
+                    known = isinstance(class_id, int) and 0 <= class_id < len(self.classes)
+                    move_classes.append(self.classes[class_id] if known else class_id)
+
             # Check if vehicle has crossed the line
-            if not self.tracked_vehicles[track_id]['counted']:
+            elif not self.tracked_vehicles[track_id]['counted']:
                 # We need at least 2 positions to check crossing
                 positions = self.tracked_vehicles[track_id]['positions']
                 if len(positions) >= 2:
@@ -159,6 +181,9 @@ class VehicleTracker:
                         cv2.putText(frame, f"ID:{track_id} COUNTED", (x1, y1 - 15),
                                     cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
 
+        if zones and moves_from:
+            vehicle_count += zones.update(moves_from, moves_to, move_classes)
+
         # Draw the tracks
         frame = self.tracker.draw_tracks(frame, tracks)
 
@@ -195,6 +220,8 @@ class VehicleTracker:
         self.vehicle_count = 0
         # Clear tracking history
         self.tracked_vehicles = {}
+        if self.counting_zones:
+            self.counting_zones.reset_counts()
 
     def set_confidence_threshold(self, threshold):
         """Update the confidence threshold"""
@@ -1,21 +1,49 @@
 import cv2
 import numpy as np
-import torch
 import os
 import time
 from pathlib import Path
 from collections import OrderedDict
+from models.onnx_detector import ONNXDetector
+from models.detections import COCO_CLASSES, VOC_CLASSES, vehicle_class_ids, make_detections, empty_detections, \
+    filter_detections, clip_detections, to_detection_list
+from models.inference_profile import PROFILES, default_thread_count, inference_context
+
+# torch is optional, ONNX models run through OpenCV DNN without it
+try:
+    import torch
+except ImportError:
+    torch = None
 
 
 class YOLODetector:
     """
     YOLO-based detector for vehicle detection
-    Supports YOLOv5 and YOLOv8 models
+    Supports YOLOv5 and YOLOv8 models, and their ONNX exports without torch
     """
 
-    def __init__(self, model_path=None, confidence_threshold=0.5, use_cuda=True):
+    def __init__(self, model_path=None, confidence_threshold=0.5, use_cuda=True, profile="default", num_threads=None):
+        """
+        Args:
+            model_path: YOLOv5 weights or an .onnx export (default: yolov5s)
+            confidence_threshold: Minimum detection score
+            use_cuda: Use the GPU when available
+            profile: "default" or "cpu_optimized" (inference_mode and its own intra-op thread
+                     count during inference; see VehicleDetector)
+            num_threads: Torch intra-op threads in the CPU profile (default: all cores but one)
+        """
         self.confidence_threshold = confidence_threshold
-        self.device = torch.device('cuda' if torch.cuda.is_available() and use_cuda else 'cpu')
+        self.profile = profile if profile in PROFILES else "default"
+        self.num_threads = None
+        self.optimizations = []
+        if torch is not None:
+            self.device = torch.device('cuda' if torch.cuda.is_available() and use_cuda else 'cpu')
+        else:
+            self.device = 'cpu'
+
+        if self.profile == "cpu_optimized" and torch is not None:
+            self.num_threads = num_threads or default_thread_count()
+            self.optimizations.append(f"{self.num_threads} threads")
 
         # Cache for previously detected frames to improve performance
         self.detection_cache = OrderedDict()
@@ -23,12 +51,19 @@ class YOLODetector:
         self.last_inference_time = 0
         self.inference_interval = 0.5  # Minimum time between full inferences (seconds)
 
-        # Classes we're interested in for vehicle detection
-        self.vehicle_classes = [2, 3, 5, 6, 7, 8]  # car, motorcycle, bus, train, truck, boat
+        # Load model, ONNX exports go through OpenCV DNN
+        if model_path is not None and str(model_path).lower().endswith(".onnx"):
+            self.model = ONNXDetector(model_path, confidence_threshold)
+            self.model_type = "onnx"
+            self.classes = ONNXDetector.CLASSES
+        else:
+            self.model = self._load_model(model_path)
+            self.model_type = "yolov5"  # Default model type
+            # YOLOv5 models carry their class names, the MobileNet-SSD fallback uses VOC classes
+            self.classes = getattr(self.model, 'names', None) or getattr(self.model, 'classes', None) or COCO_CLASSES
 
-        # Load model
-        self.model = self._load_model(model_path)
-        self.model_type = "yolov5"  # Default model type
+        # Classes we're interested in for vehicle detection: car, motorcycle, bus, truck
+        self.vehicle_classes = vehicle_class_ids(self.classes)
 
         print(f"YOLO detector initialized using {self.device}")
 
@@ -65,8 +100,7 @@ class YOLODetector:
                                 "models/MobileNetSSD_deploy.prototxt",
                                 "models/MobileNetSSD_deploy.caffemodel"
                             )
-                            self.classes = ["background", "person", "bicycle", "car", "motorcycle",
-                                            "airplane", "bus", "train", "truck", "boat"]
+                            self.classes = VOC_CLASSES
                             self.confidence_threshold = confidence_threshold
                             print("CV2 model loaded successfully")
                         except Exception as e:
@@ -74,14 +108,14 @@ class YOLODetector:
                             self.net = None
 
                     def __call__(self, img):
-                        # Simple wrapper to match yolov5 API
+                        # Simple wrapper to match yolov5 API, which also takes a list of images
+                        imgs = img if isinstance(img, list) else [img]
                         if self.net is None:
                             # Return empty results if model failed to load
-                            return SimpleResults()
+                            return SimpleResults([[] for _ in imgs])
 
-                        height, width = img.shape[:2]
-                        blob = cv2.dnn.blobFromImage(
-                            cv2.resize(img, (300, 300)),
+                        blob = cv2.dnn.blobFromImages(
+                            [cv2.resize(i, (300, 300)) for i in imgs],
                             0.007843, (300, 300), 127.5
                         )
 
@@ -89,26 +123,27 @@ class YOLODetector:
                         self.net.setInput(blob)
                         detections = self.net.forward()
 
-                        # Process detections
+                        # Rows are (image, class, score, x1, y1, x2, y2) with relative coordinates
+                        rows = detections.reshape(-1, 7)
+                        rows = rows[rows[:, 2] > self.confidence_threshold]
+                        image_ids = rows[:, 0].astype(np.int64)
+
+                        # One (N, 6) array of x1, y1, x2, y2, score, class per image, like yolov5
                         results = []
-                        for i in range(detections.shape[2]):
-                            confidence = detections[0, 0, i, 2]
-                            if confidence > self.confidence_threshold:
-                                class_id = int(detections[0, 0, i, 1])
-                                # Get bounding box
-                                box = detections[0, 0, i, 3:7] * np.array([width, height, width, height])
-                                (x1, y1, x2, y2) = box.astype("int")
-                                # Create result in format similar to yolov5
-                                result = [x1, y1, x2, y2, float(confidence), class_id]
-                                results.append(result)
-
-                        # Return in format similar to yolov5
+                        for image_id, image in enumerate(imgs):
+                            image_rows = rows[image_ids == image_id]
+                            height, width = image.shape[:2]
+                            boxes = image_rows[:, 3:7] * np.array([width, height, width, height], dtype=np.float32)
+                            results.append(np.concatenate([boxes, image_rows[:, 2:3], image_rows[:, 1:2]], axis=1))
+
                         return SimpleResults(results)
 
                 # Simple class to mimic yolov5 results
                 class SimpleResults:
                     def __init__(self, detections=None):
-                        self.xyxy = [np.array(detections if detections else [])]
+                        # One (N, 6) array of detections per image
+                        self.xyxy = [np.asarray(d, dtype=np.float32).reshape(-1, 6) for d in detections] \
+                            if detections else [np.empty((0, 6), dtype=np.float32)]
 
                 # Return simple detector
                 return SimpleDetector(self.confidence_threshold)
@@ -152,72 +187,7 @@ class YOLODetector:
             # Update last inference time
             self.last_inference_time = current_time
 
-            vehicle_detections = []
-
-            # Handle different model types
-            if self.model_type == "fasterrcnn":
-                # Convert frame to tensor efficiently
-                img = torch.from_numpy(frame.transpose(2, 0, 1)).float().div(255.0).unsqueeze(0)
-                img = img.to(self.device)
-                # Create a list of tensors as expected by the model
-                img_list = [img[0]]
-
-                with torch.no_grad():
-                    predictions = self.model(img_list)
-
-                # Extract detections
-                boxes = predictions[0]['boxes'].cpu().numpy().astype(int)
-                scores = predictions[0]['scores'].cpu().numpy()
-                labels = predictions[0]['labels'].cpu().numpy()
-
-                # Filter by confidence and vehicle classes
-                for box, score, label in zip(boxes, scores, labels):
-                    if score > self.confidence_threshold and label in self.vehicle_classes:
-                        vehicle_detections.append(([box[0], box[1], box[2], box[3]], float(score), int(label)))
-
-            elif self.model_type == "yolov5":
-                # Use YOLOv5 API
-                results = self.model(frame)
-
-                # Extract detections from results
-                for det in results.xyxy[0]:  # Process first image in batch
-                    if len(det) >= 6:  # Make sure we have all elements
-                        x1, y1, x2, y2, conf, cls = det[:6]
-
-                        # Convert tensor values to Python types
-                        x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
-                        conf = float(conf)
-                        cls = int(cls)
-
-                        if conf > self.confidence_threshold and cls in self.vehicle_classes:
-                            vehicle_detections.append(
-                                ([x1, y1, x2, y2], conf, cls)
-                            )
-
-            elif self.model_type == "opencv":
-                # Use OpenCV DNN model
-                height, width = frame.shape[:2]
-                blob = cv2.dnn.blobFromImage(
-                    cv2.resize(frame, (300, 300)),
-                    0.007843, (300, 300), 127.5
-                )
-
-                # Run detection
-                self.model.setInput(blob)
-                detections = self.model.forward()
-
-                # Process detections
-                for i in range(detections.shape[2]):
-                    confidence = detections[0, 0, i, 2]
-                    if confidence > self.confidence_threshold:
-                        class_id = int(detections[0, 0, i, 1])
-                        if class_id in self.vehicle_classes:
-                            # Get bounding box
-                            box = detections[0, 0, i, 3:7] * np.array([width, height, width, height])
-                            (x1, y1, x2, y2) = box.astype("int")
-                            vehicle_detections.append(
-                                ([x1, y1, x2, y2], float(confidence), class_id)
-                            )
+            vehicle_detections = self._infer([frame])[0]
 
             # Store in cache
             self.detection_cache[frame_hash] = vehicle_detections
@@ -233,8 +203,118 @@ class YOLODetector:
             # Return empty list on error to prevent crashing
             return []
 
+    def detect_vehicles_batch(self, frames):
+        """
+        Detect vehicles in several frames with one model call
+
+        Unlike detect_vehicles, there is no cache or minimum interval: every frame is
+        processed. On CPU one call on 4-8 frames is faster than as many single calls.
+
+        Args:
+            frames: List of BGR frames
+
+        Returns:
+            List with the detections of each frame, in the format of detect_vehicles
+        """
+        if self.model is None or not frames:
+            return [[] for _ in frames]
+
+        try:
+            return self._infer(frames)
+        except Exception as e:
+            print(f"Error in batch vehicle detection: {str(e)}")
+            return [[] for _ in frames]
+
+    def detect_arrays_batch(self, frames):
+        """
+        Detect vehicles in several frames, as one structured array per frame
+
+        Like detect_vehicles_batch, without cache or minimum interval.
+
+        Returns:
+            List with a structured detection array (see models/detections.py) per frame
+        """
+        if self.model is None or not frames:
+            return [empty_detections() for _ in frames]
+
+        try:
+            return self._infer_arrays(frames)
+        except Exception as e:
+            print(f"Error in batch vehicle detection: {str(e)}")
+            return [empty_detections() for _ in frames]
+
+    def _infer(self, frames):
+        """Run the model on a list of frames and return the vehicle detections of each as lists"""
+        return [to_detection_list(detections) for detections in self._infer_arrays(frames)]
+
+    def _infer_arrays(self, frames):
+        """
+        Run the model on a list of frames and filter the vehicle detections of each
+
+        Each model type only converts its raw output to parallel box/score/class arrays;
+        confidence and vehicle class filtering are shared mask operations.
+        """
+        # Handle different model types
+        if self.model_type == "fasterrcnn":
+            # Convert frames to tensors, the model takes a list of them
+            img_list = [torch.from_numpy(frame.transpose(2, 0, 1)).float().div(255.0).to(self.device)
+                        for frame in frames]
+
+            with inference_context(self.profile, self.num_threads):
+                predictions = self.model(img_list)
+
+            raw = [make_detections(prediction['boxes'].cpu().numpy(), prediction['scores'].cpu().numpy(),
+                                   prediction['labels'].cpu().numpy())
+                   for prediction in predictions]
+
+        elif self.model_type == "yolov5":
+            # Use YOLOv5 API, a list of images is one batch
+            with inference_context(self.profile, self.num_threads):
+                results = self.model(list(frames))
+
+            # One (N, 6) array of x1, y1, x2, y2, score, class per image, a tensor for real YOLOv5 models
+            raw = []
+            for image_detections in results.xyxy:
+                if hasattr(image_detections, 'cpu'):
+                    image_detections = image_detections.cpu().numpy()
+                image_detections = np.asarray(image_detections, dtype=np.float32).reshape(-1, 6)
+                raw.append(make_detections(image_detections[:, :4], image_detections[:, 4], image_detections[:, 5]))
+
+        elif self.model_type == "onnx":
+            # Letterboxing, decoding, filtering and NMS happen in the ONNX backend
+            return self.model.detect_arrays_batch(frames)
+
+        elif self.model_type == "opencv":
+            # Use OpenCV DNN model on one blob holding all frames
+            blob = cv2.dnn.blobFromImages(
+                [cv2.resize(frame, (300, 300)) for frame in frames],
+                0.007843, (300, 300), 127.5
+            )
+
+            # Run detection
+            self.model.setInput(blob)
+            rows = self.model.forward().reshape(-1, 7)
+
+            # Rows are (image, class, score, x1, y1, x2, y2) with coordinates relative to the frame
+            image_ids = rows[:, 0].astype(np.int64)
+            raw = []
+            for image_id, frame in enumerate(frames):
+                frame_rows = rows[image_ids == image_id]
+                height, width = frame.shape[:2]
+                raw.append(make_detections(frame_rows[:, 3:7] * np.array([width, height, width, height]),
+                                           frame_rows[:, 2], frame_rows[:, 1]))
+
+        else:
+            return [empty_detections() for _ in frames]
+
+        return [clip_detections(filter_detections(detections, self.confidence_threshold, self.vehicle_classes),
+                                frame.shape)
+                for detections, frame in zip(raw, frames)]
+
     def set_confidence_threshold(self, threshold):
         """Update the confidence threshold"""
         self.confidence_threshold = threshold
+        if self.model_type == "onnx":
+            self.model.set_confidence_threshold(threshold)
         # Clear cache when threshold changes
         self.detection_cache.clear()
\ No newline at end of file
@@ -14,7 +14,7 @@ from ui.reference_tab import ReferenceTab
 from models.parking_visualizer import ParkingVisualizer
 from models.allocation_engine import ParkingAllocationEngine
 from ui.parking_allocation_tab import ParkingAllocationTab
-from models.vehicle_detector import VehicleDetector
+from models.centroid_tracker import CentroidTracker
 from utils.resource_manager import ensure_directories_exist, load_parking_positions
 from utils.media_paths import list_available_videos
 
@@ -24,6 +24,7 @@ class ParkingManagementSystem:
     MIN_CONTOUR_SIZE = 40
     DEFAULT_OFFSET = 10
     DEFAULT_LINE_HEIGHT = 400
+    PRELOAD_ML_DETECTOR = False  # Start loading the ML detector at launch instead of on first use
 
     def __init__(self, master):
         self.master = master
@@ -41,7 +42,7 @@ class ParkingManagementSystem:
         self.video_capture = None
         self.current_video = None
         self.vehicle_counter = 0
-        self.matches = []  # For vehicle counting
+        self.matches = CentroidTracker()  # For vehicle counting
         self.line_height = self.DEFAULT_LINE_HEIGHT
         self.min_contour_width = self.MIN_CONTOUR_SIZE
         self.min_contour_height = self.MIN_CONTOUR_SIZE
@@ -51,6 +52,7 @@ class ParkingManagementSystem:
         self.log_data = []  # For logging events
         self.use_ml_detection = False
         self.ml_detector = None
+        self.ml_detector_handles = {}  # Lazily loaded detectors by (ML method, inference profile)
         self.ml_confidence = self.DEFAULT_CONFIDENCE
         self._cleanup_lock = threading.Lock()
         self.data_lock = threading.Lock()
@@ -102,6 +104,10 @@ class ParkingManagementSystem:
         self.use_yolo_tracking = False
         self.vehicle_tracker = None
 
+        # Optionally load the ML detector in the background now, so enabling it later is instant
+        if self.PRELOAD_ML_DETECTOR:
+            self.detection_tab.get_ml_handle(self.detection_tab.ml_method_var.get()).start_loading()
+
     def setup_video_reference_map(self):
         """Set up the map between videos and reference images"""
         self.video_reference_map = {
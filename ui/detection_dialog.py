@@ -220,7 +220,7 @@ class DetectionDialog:
                     self.app.min_contour_width,
                     self.app.min_contour_height,
                     self.app.offset,
-                    self.app.matches.copy() if hasattr(self.app, 'matches') else [],
+                    self.app.matches if hasattr(self.app, 'matches') else None,
                     self.app.vehicle_counter
                 )
 
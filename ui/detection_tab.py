@@ -3,11 +3,23 @@ from tkinter import ttk, filedialog, messagebox
 from PIL import Image, ImageTk
 import cv2
 import numpy as np
+import threading
 import time
+from collections import deque
 from datetime import datetime
 from utils.video_utils import list_available_videos
-from utils.image_processor import process_parking_spaces, detect_vehicles_traditional, process_ml_detections
+from utils.image_processor import process_parking_spaces, detect_vehicles_traditional, process_ml_detections, \
+    CountingRegion, preprocess_parking_frame
 from utils.tracker_integration import initialize_tracker, process_ml_detections_with_tracking
+from utils.mjpeg_server import MJPEGServer
+from utils.pipeline import Pipeline, END
+from models.background_subtractor import BackgroundSubtractorDetector
+from models.inference_worker import InferenceWorker
+from models.tiled_inference import TiledInference, rects_bounds
+from models.detections import detect_arrays_batch, scale_detections, to_detection_list
+from models.lazy_detector import LazyDetector
+from models.centroid_tracker import CentroidTracker
+from models.counting_zones import CountingZones
 
 
 class DetectionTab:
@@ -15,6 +27,9 @@ class DetectionTab:
     The Detection Tab handles video processing and display
     """
 
+    # Processing scales offered for the background subtraction engines
+    PROCESSING_SCALES = {"1": 1.0, "1/2": 0.5, "1/4": 0.25}
+
     def __init__(self, parent, app):
         self.parent = parent
         self.app = app
@@ -209,6 +224,49 @@ class DetectionTab:
         # Set up trace for live updates while dragging
         self.offset_var.trace_add("write", self.update_offset_display)
 
+        # Motion engine used when ML detection is off
+        engine_frame = ttk.Frame(self.vehicle_settings_frame)
+        engine_frame.pack(fill=X, padx=5, pady=5)
+
+        ttk.Label(engine_frame, text="Motion Engine:").pack(side=LEFT)
+        self.motion_engine_var = StringVar(value="Frame Difference")
+        ttk.Combobox(engine_frame, textvariable=self.motion_engine_var, state="readonly", width=16,
+                     values=["Frame Difference", "MOG2", "KNN"]).pack(side=LEFT, padx=5)
+
+        scale_frame = ttk.Frame(self.vehicle_settings_frame)
+        scale_frame.pack(fill=X, padx=5, pady=5)
+
+        ttk.Label(scale_frame, text="Processing Scale:").pack(side=LEFT)
+        self.processing_scale_var = StringVar(value="1/2")
+        ttk.Combobox(scale_frame, textvariable=self.processing_scale_var, state="readonly", width=6,
+                     values=list(self.PROCESSING_SCALES.keys())).pack(side=LEFT, padx=5)
+        self.bg_detector = None
+
+        # Counting region: motion detection can skip everything outside a band around the line
+        region_frame = ttk.Frame(self.vehicle_settings_frame)
+        region_frame.pack(fill=X, padx=5, pady=5)
+
+        ttk.Label(region_frame, text="Process:").pack(side=LEFT)
+        self.counting_region_var = StringVar(value="Full Frame")
+        ttk.Combobox(region_frame, textvariable=self.counting_region_var, state="readonly", width=10,
+                     values=["Full Frame", "Band"]).pack(side=LEFT, padx=5)
+        ttk.Label(region_frame, text="Band Height:").pack(side=LEFT)
+        self.band_height_var = IntVar(value=160)
+        ttk.Spinbox(region_frame, from_=20, to=720, increment=20, width=5,
+                    textvariable=self.band_height_var).pack(side=LEFT, padx=5)
+        self._counting_region = None
+        self._counting_region_key = None
+
+        # Counting lines and zones loaded from a JSON file, replacing the horizontal line
+        zones_frame = ttk.Frame(self.vehicle_settings_frame)
+        zones_frame.pack(fill=X, padx=5, pady=5)
+
+        self.counting_zones = None
+        self.zones_label = ttk.Label(zones_frame, text="Counting: single line")
+        self.zones_label.pack(side=LEFT)
+        ttk.Button(zones_frame, text="Clear", width=6, command=self.clear_counting_zones).pack(side=RIGHT)
+        ttk.Button(zones_frame, text="Load Zones...", command=self.load_counting_zones).pack(side=RIGHT, padx=5)
+
         # Reset counter button
         reset_frame = ttk.Frame(self.vehicle_settings_frame)
         reset_frame.pack(fill=X, padx=5, pady=5)
@@ -241,6 +299,12 @@ class DetectionTab:
                                            variable=self.ml_var, command=self.on_ml_toggle)
         self.ml_checkbox.pack(side=LEFT)
 
+        # CPU inference profile: inference_mode and a dedicated intra-op thread count
+        self.cpu_profile_var = BooleanVar(value=False)
+        cpu_profile_checkbox = ttk.Checkbutton(ml_checkbox_frame, text="CPU-optimized",
+                                               variable=self.cpu_profile_var, command=self.on_cpu_profile_toggle)
+        cpu_profile_checkbox.pack(side=LEFT, padx=10)
+
         # ML Confidence setting
         confidence_frame = ttk.Frame(self.ml_frame)
         confidence_frame.pack(fill=X, padx=5, pady=5)
@@ -260,6 +324,17 @@ class DetectionTab:
         # Set up trace for live updates while dragging
         self.confidence_var.trace_add("write", self.update_confidence_display)
 
+        # ML region: tiles at native resolution around the counting line or the parking spaces
+        ml_region_frame = ttk.Frame(self.ml_frame)
+        ml_region_frame.pack(fill=X, padx=5, pady=5)
+
+        ttk.Label(ml_region_frame, text="Region:").pack(side=LEFT)
+        self.ml_region_var = StringVar(value="Full Frame")
+        ttk.Combobox(ml_region_frame, textvariable=self.ml_region_var, state="readonly", width=14,
+                     values=["Full Frame", "Counting Band", "Parking Spaces"]).pack(side=LEFT, padx=5)
+        self.tiled_inference = TiledInference(tile_size=640, overlap=0.2)
+        self._ml_region_key = None
+
         # Tracking options frame (initially hidden)
         self.tracking_frame = ttk.LabelFrame(self.settings_frame, text="Tracking Settings")
 
@@ -298,17 +373,43 @@ class DetectionTab:
         self.processing_time_label = ttk.Label(status_frame, text="Processing: 0 ms")
         self.processing_time_label.pack(anchor=W, padx=5, pady=2)
 
+        # Throughput and queue depth of the capture pipeline stages
+        self.pipeline_label = ttk.Label(status_frame, text="Pipeline: idle", foreground="grey")
+        self.pipeline_label.pack(anchor=W, padx=5, pady=2)
+
+        # Network stream of the annotated frames
+        stream_frame = ttk.LabelFrame(self.settings_frame, text="Network Stream")
+        stream_frame.pack(fill=X, padx=10, pady=5, expand=False)
+
+        stream_port_frame = ttk.Frame(stream_frame)
+        stream_port_frame.pack(fill=X, padx=5, pady=2)
+        ttk.Label(stream_port_frame, text="Port:").pack(side=LEFT)
+        self.stream_port_var = IntVar(value=8080)
+        ttk.Entry(stream_port_frame, textvariable=self.stream_port_var, width=6).pack(side=LEFT, padx=5)
+
+        self.stream_var = BooleanVar(value=False)
+        ttk.Checkbutton(stream_frame, text="Serve annotated stream (MJPEG)",
+                        variable=self.stream_var, command=self.toggle_stream_server).pack(anchor=W, padx=5, pady=2)
+
+        self.stream_status_label = ttk.Label(stream_frame, text="Stream: Off", foreground="grey")
+        self.stream_status_label.pack(anchor=W, padx=5, pady=2)
+        self.stream_server = None
   
         # Initialize video settings
         self.running = False
         self.video_capture = None
+        self.pipeline = None
+        self.worker_events = deque()  # Log events of the pipeline workers, written by the Tk thread
+        self.rescale_pending = False  # The analysis stage saw a new frame size
+        self.inference_worker = None  # Background ML detection on the latest frame
+        self._inference_worker_lock = threading.Lock()  # Used by the analysis stage and the Tk thread
         self.prev_frame = None
         self.frame_count = 0
-        self.frame_skip = 2
         self.last_processing_time = 0
 
         # Show appropriate settings based on mode
         self.on_mode_change()
+        self.snapshot_settings()
 
     # Methods for formatted slider displays
     def update_threshold_display(self, *args):
@@ -594,13 +695,6 @@ class DetectionTab:
                 messagebox.showerror("Error", f"Failed to open video source: {video_source}")
                 return
 
-            # Update UI
-            self.running = True
-            self.detection_button_var.set("Stop Detection")
-
-            # Start frame processing
-            self.process_frame()
-
             # Update app current video
             self.app.current_video = video_source
 
@@ -618,15 +712,96 @@ class DetectionTab:
                     self.app.current_reference_image = ref_image
                     self.app.load_parking_positions(ref_image)
 
+            # Positions and frame size are set before the analysis stage sees the first frame
+            width = int(self.video_capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+            height = int(self.video_capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            if width and height and self.update_frame_dimensions(width, height):
+                self.app.scale_positions_to_current_dimensions()
+            self.flush_events()
+
+            # Read, preprocess and analyse frames in the background
+            self.snapshot_settings()
+            self.start_pipeline(live=video_source == 0)
+
+            # Update UI
+            self.running = True
+            self.detection_button_var.set("Stop Detection")
+
+            # Start frame processing
+            self.process_frame()
+
         except Exception as e:
             self.app.log_event(f"Error starting detection: {str(e)}")
             messagebox.showerror("Error", f"Failed to start detection: {str(e)}")
 
+    def start_pipeline(self, live=False):
+        """
+        Start the capture, preprocessing, analysis and annotation stages for the current
+        video capture
+
+        Each stage runs in its own worker with bounded queues between them, so throughput
+        follows the slowest stage instead of the sum of all of them. Only display is left
+        to process_frame on the Tk thread; analysis reads a snapshot of the Tk settings. A
+        live source drops stale frames, a video file waits so no frame is skipped and is
+        read at its own frame rate.
+
+        Args:
+            live: True for a webcam
+        """
+        capture = self.video_capture
+        drop_policy = "drop_oldest" if live else "block"
+
+        # Files are paced by the capture stage; a webcam delivers frames at its own rate
+        fps = capture.get(cv2.CAP_PROP_FPS) if not live else 0
+        frame_interval = 1.0 / fps if fps and 1 <= fps <= 240 else 0.0
+        next_frame_time = [None]
+
+        def read_frame():
+            ret, img = capture.read()
+            if not ret:
+                # A webcam may fail temporarily, a file has ended
+                return None if live else END
+
+            if frame_interval:
+                now = time.perf_counter()
+                # Start over after a stall of more than a second instead of rushing to catch up
+                if next_frame_time[0] is None or now - next_frame_time[0] > 1.0:
+                    next_frame_time[0] = now
+                elif next_frame_time[0] > now:
+                    time.sleep(next_frame_time[0] - now)
+                next_frame_time[0] += frame_interval
+            return img
+
+        def preprocess(img):
+            if self.app.detection_mode == "parking":
+                return img, preprocess_parking_frame(img)
+            return img, None
+
+        self.pipeline = Pipeline(output_size=1 if live else 2, output_policy=drop_policy)
+        self.pipeline.add_source("capture", read_frame)
+        self.pipeline.add_stage("preprocess", preprocess, queue_size=2, drop_policy=drop_policy)
+        self.pipeline.add_stage("analysis", self.analyse_frame, queue_size=2, drop_policy=drop_policy)
+        self.pipeline.add_stage("annotate", self.annotate_frame, queue_size=2, drop_policy=drop_policy)
+        self.pipeline.start()
+
+    def stop_pipeline(self):
+        """Stop the capture pipeline"""
+        if self.pipeline is not None:
+            self.pipeline.stop()
+            self.pipeline = None
+        self.pipeline_label.config(text="Pipeline: idle")
+
     def stop_detection(self):
         """Stop video detection"""
         self.running = False
         self.detection_button_var.set("Start Detection")
 
+        # The reader thread uses the capture, stop it first
+        self.stop_pipeline()
+
+        # Results of this source must not show up on the next one
+        self.stop_inference_worker()
+
         # Release video capture
         if self.video_capture:
             self.video_capture.release()
@@ -638,6 +813,37 @@ class DetectionTab:
         # Reset frame count
         self.frame_count = 0
 
+        # The next source needs its own background model
+        if self.bg_detector is not None:
+            self.bg_detector.reset()
+
+    def toggle_stream_server(self):
+        """Start or stop the MJPEG server for the annotated frames"""
+        if not self.stream_var.get():
+            self.stop_stream_server()
+            return
+
+        try:
+            self.stream_server = MJPEGServer(port=int(self.stream_port_var.get()))
+            self.stream_server.start()
+            self.stream_status_label.config(text=f"Stream: {self.stream_server.url}", foreground="green")
+            self.app.log_event(f"Serving annotated stream at {self.stream_server.url}")
+        except Exception as e:
+            self.stream_server = None
+            self.stream_var.set(False)
+            self.stream_status_label.config(text="Stream: Off", foreground="grey")
+            self.app.log_event(f"Error starting stream server: {str(e)}")
+            messagebox.showerror("Error", f"Failed to start stream server: {str(e)}")
+
+    def stop_stream_server(self):
+        """Stop the MJPEG server if it is running"""
+        if self.stream_server is not None:
+            self.stream_server.stop()
+            self.stream_server = None
+            self.app.log_event("Stopped annotated stream")
+        self.stream_var.set(False)
+        self.stream_status_label.config(text="Stream: Off", foreground="grey")
+
     def update_threshold(self, event=None):
         """Update parking threshold value"""
         self.app.parking_threshold = self.threshold_var.get()
@@ -656,10 +862,89 @@ class DetectionTab:
         """Update offset value"""
         self.app.offset = self.offset_var.get()
 
+    def get_counting_region(self, frame_shape):
+        """Counting region for the current settings, or None to process the whole frame"""
+        settings = self.analysis_settings
+        band_height = settings['band_height']
+        if settings['counting_region'] != "Band" or not band_height:
+            return None
+
+        key = (frame_shape[:2], self.app.line_height, band_height)
+        if key != self._counting_region_key:
+            self._counting_region = CountingRegion(frame_shape, self.app.line_height, band_height)
+            self._counting_region_key = key
+        return self._counting_region
+
+    def detect_vehicles_motion(self, img):
+        """
+        Detect and count moving vehicles with the selected motion engine
+
+        Returns:
+            (processed_img, new_matches, new_vehicle_counter)
+        """
+        region = self.get_counting_region(img.shape)
+        engine = self.analysis_settings['motion_engine']
+        if engine not in BackgroundSubtractorDetector.METHODS:
+            return detect_vehicles_traditional(
+                img.copy(),
+                self.prev_frame,
+                self.app.line_height,
+                self.app.min_contour_width,
+                self.app.min_contour_height,
+                self.app.offset,
+                self.app.matches,
+                self.app.vehicle_counter,
+                region,
+                self.counting_zones
+            )
+
+        scale = self.PROCESSING_SCALES.get(self.analysis_settings['processing_scale'], 0.5)
+        if self.bg_detector is None:
+            self.bg_detector = BackgroundSubtractorDetector(method=engine, scale=scale)
+        else:
+            self.bg_detector.configure(method=engine, scale=scale)
+
+        return self.bg_detector.detect(
+            img,
+            self.app.line_height,
+            self.app.min_contour_width,
+            self.app.min_contour_height,
+            self.app.offset,
+            self.app.matches,
+            self.app.vehicle_counter,
+            region,
+            self.counting_zones
+        )
+
+    def load_counting_zones(self):
+        """Load counting lines and zones from a JSON file"""
+        path = filedialog.askopenfilename(title="Load Counting Zones", initialdir=self.app.config_dir,
+                                          filetypes=[("JSON files", "*.json"), ("All files", "*.*")])
+        if not path:
+            return
+
+        zones = CountingZones.load(path)
+        if zones is None or not zones:
+            messagebox.showerror("Error", "The file does not contain any counting lines or zones.")
+            return
+
+        self.counting_zones = zones
+        self.app.matches = CentroidTracker()
+        self.zones_label.config(text=f"Counting: {len(zones.lines)} lines, {len(zones.zones)} zones")
+        self.app.log_event(f"Loaded counting zones from {path}")
+
+    def clear_counting_zones(self):
+        """Go back to counting on the horizontal line"""
+        self.counting_zones = None
+        self.app.matches = CentroidTracker()
+        self.zones_label.config(text="Counting: single line")
+
     def reset_counter(self):
         """Reset vehicle counter"""
         self.app.vehicle_counter = 0
-        self.app.matches = []
+        self.app.matches = CentroidTracker()
+        if self.counting_zones:
+            self.counting_zones.reset_counts()
         if hasattr(self.app, 'vehicle_tracker') and self.app.vehicle_tracker:
             self.app.vehicle_tracker.reset_count()
         self.update_status_info(
@@ -678,44 +963,80 @@ class DetectionTab:
         self.app.ml_confidence = self.confidence_var.get()
 
         if ml_enabled:
-            try:
-                # Check which ML method to use
-                ml_method = self.ml_method_var.get()
+            # Check which ML method to use
+            ml_method = self.ml_method_var.get()
+
+            # The detector loads in the background, motion detection is used until it is ready
+            handle = self.get_ml_handle(ml_method)
+            handle.set_confidence_threshold(self.app.ml_confidence)
+            if not handle.ready:
+                self.app.log_event(f"Loading {handle.name} in the background...")
+            handle.start_loading()
+
+            self.app.ml_detector = handle
+            # Store in a separate variable for tracking
+            self.app.vehicle_tracker = handle if ml_method == "YOLO + DeepSORT" else None
+            self.update_ml_status()
+        else:
+            # Disable ML detection
+            self.stop_inference_worker()
+            self.app.ml_detector = None
+            self.app.vehicle_tracker = None
+            self.ml_status_label.config(text="ML Detection: Disabled", foreground="grey")
+
+    def on_cpu_profile_toggle(self):
+        """Switch the inference profile, reloading ML detection if it is on"""
+        if self.ml_var.get():
+            self.on_ml_toggle()
 
-                if ml_method == "YOLO + DeepSORT":
+    def get_ml_handle(self, ml_method):
+        """
+        Lazily loaded detector of an ML method
+
+        Handles are kept by the app, so a detector is loaded once per session and switching
+        ML off and on again is instant.
+        """
+        profile = "cpu_optimized" if self.cpu_profile_var.get() else "default"
+        key = (ml_method, profile)
+        handles = self.app.ml_detector_handles
+        if key not in handles:
+            confidence = self.app.ml_confidence
+
+            if ml_method == "YOLO + DeepSORT":
+                def factory():
                     # Initialize the YOLO + DeepSORT tracker
-                    self.app.ml_detector = initialize_tracker(
-                        confidence_threshold=self.app.ml_confidence,
-                        use_cuda=True  # You can make this configurable
-                    )
+                    return initialize_tracker(confidence_threshold=confidence, use_cuda=True)
+            else:
+                def factory():
+                    # Initialize the original ML detector, importing torch only now
+                    from models.vehicle_detector import VehicleDetector
+                    return VehicleDetector(confidence_threshold=confidence, profile=profile)
 
-                    # Store in a separate variable for tracking
-                    self.app.vehicle_tracker = self.app.ml_detector
-                    self.app.log_event("YOLO + DeepSORT tracker initialized")
+            name = f"{ml_method} detector" + (" (CPU-optimized)" if profile != "default" else "")
+            handles[key] = LazyDetector(factory, name=name)
+        return handles[key]
 
-                else:
-                    # Initialize the original ML detector
-                    self.app.log_event("Initializing ML detector...")
-                    from models.vehicle_detector import VehicleDetector
-                    self.app.ml_detector = VehicleDetector(confidence_threshold=self.app.ml_confidence)
-                    self.app.vehicle_tracker = None
-                    self.app.log_event("ML detector initialized")
-
-                # Show success message
-                self.ml_status_label.config(text="ML Detection: Active", foreground="green")
-
-            except Exception as e:
-                self.ml_var.set(False)
-                self.app.use_ml_detection = False
-                error_msg = f"Failed to initialize ML detection: {str(e)}"
-                self.app.log_event(error_msg)
-                self.ml_status_label.config(text="ML Detection: Error", foreground="red")
-                messagebox.showerror("ML Initialization Error", error_msg)
-        else:
-            # Disable ML detection
+    def update_ml_status(self):
+        """Show the loading state of the ML detector, polling until it is ready or failed"""
+        handle = self.app.ml_detector
+        if not self.app.use_ml_detection or not isinstance(handle, LazyDetector):
+            return
+
+        if handle.state == LazyDetector.LOADING:
+            self.ml_status_label.config(text="ML Detection: Loading...", foreground="orange")
+            self.parent.after(250, self.update_ml_status)
+        elif handle.ready:
+            self.ml_status_label.config(text="ML Detection: Active", foreground="green")
+            self.app.log_event(f"{handle.name} ready")
+        elif handle.state == LazyDetector.FAILED:
+            self.ml_var.set(False)
+            self.app.use_ml_detection = False
             self.app.ml_detector = None
             self.app.vehicle_tracker = None
-            self.ml_status_label.config(text="ML Detection: Disabled", foreground="grey")
+            error_msg = f"Failed to initialize ML detection: {handle.error}"
+            self.app.log_event(error_msg)
+            self.ml_status_label.config(text="ML Detection: Error", foreground="red")
+            messagebox.showerror("ML Initialization Error", error_msg)
 
     def on_confidence_change(self, event=None):
         """Update ML confidence threshold"""
@@ -732,60 +1053,86 @@ class DetectionTab:
 
         # Update process_frame method (around line 573)
 
-    def process_frame(self):
-        """Process a video frame"""
-        if not self.running or not self.video_capture:
-            return
+    def snapshot_settings(self):
+        """
+        Copy the settings the analysis stage reads from Tk variables
 
+        Tk variables may only be read on the Tk thread, so process_frame takes this snapshot
+        on every tick and the pipeline workers read the copy.
+        """
         try:
-            start_time = time.time()
-
-            # Read frame from video
-            ret, img = self.video_capture.read()
-
-            # Check if frame was read successfully
-            if not ret:
-                # For video files, this means end of video
-                if isinstance(self.video_source_var.get(), str) and not self.video_source_var.get() == "Webcam":
-                    self.app.log_event("End of video reached")
-                    self.stop_detection()
-                else:
-                    # For webcam, this could be a temporary error
-                    self.parent.after(100, self.process_frame)
-                return
+            band_height = int(self.band_height_var.get())
+        except (TclError, ValueError):
+            band_height = None
+        self.analysis_settings = {
+            'debug': self.debug_var.get() == "On",
+            'motion_engine': self.motion_engine_var.get(),
+            'processing_scale': self.processing_scale_var.get(),
+            'counting_region': self.counting_region_var.get(),
+            'band_height': band_height,
+            'ml_method': self.ml_method_var.get(),
+            'ml_region': self.ml_region_var.get()
+        }
+
+    def post_event(self, message):
+        """Log an event from a pipeline worker, written to the log by the Tk thread"""
+        self.worker_events.append(message)
+
+    def flush_events(self):
+        """Write the events posted by the pipeline workers to the log"""
+        while self.worker_events:
+            self.app.log_event(self.worker_events.popleft())
+
+    def update_frame_dimensions(self, width, height):
+        """
+        Record the frame size of the source
+
+        Returns:
+            True if it changed and the parking positions need to be rescaled
+        """
+        if width == self.app.image_width and height == self.app.image_height:
+            return False
+        self.app.image_width = width
+        self.app.image_height = height
+
+        if self.app.current_reference_image in self.app.reference_dimensions:
+            ref_width, ref_height = self.app.reference_dimensions[self.app.current_reference_image]
+            if ref_width != width or ref_height != height:
+                self.post_event(f"Updating dimensions from {ref_width}x{ref_height} to {width}x{height}")
+        return self.app.detection_mode == "parking"
+
+    def analyse_frame(self, item):
+        """
+        Analysis stage: parking occupancy or vehicle detection and counting on one frame
+
+        Runs on a pipeline worker, so it reads the settings from analysis_settings and posts
+        log events instead of touching Tk.
+
+        Args:
+            item: (frame, preprocessed parking image or None) from the preprocess stage
+
+        Returns:
+            Dict for the annotation stage, {'error': message} on failure, or None to skip
+            the frame (the first vehicle frame only seeds prev_frame)
+        """
+        start_time = time.perf_counter()
+        settings = self.analysis_settings
+        try:
+            img, imgProcessed = item
+            overlay = None
 
-            # Resize frame for display if needed
+            # Positions are rescaled on the Tk thread, which owns the app's position lists
             original_height, original_width = img.shape[:2]
-            if original_width != self.app.image_width or original_height != self.app.image_height:
-                self.app.image_width = original_width
-                self.app.image_height = original_height
-
-                # Scale parking positions if needed (only for parking detection)
-                if self.app.detection_mode == "parking":
-                    self.app.scale_positions_to_current_dimensions()
+            if self.update_frame_dimensions(original_width, original_height):
+                self.rescale_pending = True
 
             # Process the frame based on detection mode
             processed_img = None
 
-            # Ensure dimensions are correctly updated before scaling
-            if self.app.current_reference_image in self.app.reference_dimensions:
-                ref_width, ref_height = self.app.reference_dimensions[self.app.current_reference_image]
-                if ref_width != original_width or ref_height != original_height:
-                    self.app.log_event(
-                        f"Updating dimensions from {ref_width}x{ref_height} to {original_width}x{original_height}")
-
             if self.app.detection_mode == "parking":
-                # Convert to grayscale and blur for processing
-                imgGray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-                imgBlur = cv2.GaussianBlur(imgGray, (3, 3), 1)
-                imgThreshold = cv2.adaptiveThreshold(imgBlur, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                                                     cv2.THRESH_BINARY_INV, 25, 16)
-                imgProcessed = cv2.medianBlur(imgThreshold, 5)
-
-                # Apply dilation and erosion to clean up
-                kernel = np.ones((3, 3), np.uint8)
-                imgProcessed = cv2.dilate(imgProcessed, kernel, iterations=1)
-                imgProcessed = cv2.erode(imgProcessed, kernel, iterations=1)
+                # Normally done by the preprocess stage, unless the mode just changed
+                if imgProcessed is None:
+                    imgProcessed = preprocess_parking_frame(img)
 
                 # Get scaled positions for current frame size
                 scaled_positions = self.app.posList.copy()
@@ -802,7 +1149,7 @@ class DetectionTab:
                 space_groups = getattr(self.app, 'space_groups', {})
 
                 # Process with scaled positions, threshold, and space groups
-                debug_mode = hasattr(self, 'debug_var') and self.debug_var.get() == "On"
+                debug_mode = settings['debug']
                 processed_small_img, free_spaces, occupied_spaces, total_spaces = process_parking_spaces(
                     imgProcessed, processing_img.copy(), scaled_positions,
                     int(self.app.parking_threshold * width_scale),
@@ -825,9 +1172,12 @@ class DetectionTab:
                                 section += "1" if y < int(imgProcessed.shape[0] / 2) else "2"
                                 space_id = f"S{i + 1}-{section}"
 
-                                if space_id in self.app.parking_manager.parking_data:
-                                    self.app.parking_manager.parking_data[space_id]['in_group'] = True
-                                    self.app.parking_manager.parking_data[space_id]['group_id'] = group_id
+                                space_data = self.app.parking_manager.parking_data.get(space_id)
+                                if space_data is not None and (not space_data.get('in_group', False)
+                                                               or space_data.get('group_id') != group_id):
+                                    space_data['in_group'] = True
+                                    space_data['group_id'] = group_id
+                                    self.app.parking_manager.mark_parking_data_changed()
 
                 # Scale back up for display if needed
                 processed_img = cv2.resize(processed_small_img, (self.app.image_width, self.app.image_height))
@@ -845,22 +1195,15 @@ class DetectionTab:
                 if self.prev_frame is None or self.frame_count == 0:
                     self.prev_frame = img.copy()
                     self.frame_count = 1
-
-                    # Schedule next frame and return
-                    self.parent.after(30, self.process_frame)
-                    return
+                    return None
 
                 self.frame_count += 1
 
-                # Adjust frame skip rate for vehicle detection
-                self.frame_skip = 8 if self.app.use_ml_detection else 4
-
-                # Check if we should use ML detection
-                if self.app.use_ml_detection and self.app.ml_detector:
+                # Check if we should use ML detection (motion detection until the detector has loaded)
+                if self.app.use_ml_detection and self.app.ml_detector and getattr(self.app.ml_detector, 'ready', True):
                     try:
                         # Check if we're using YOLO + DeepSORT
-                        ml_method = getattr(self, 'ml_method_var', None)
-                        if ml_method and ml_method.get() == "YOLO + DeepSORT" and hasattr(self.app, 'vehicle_tracker'):
+                        if settings['ml_method'] == "YOLO + DeepSORT" and hasattr(self.app, 'vehicle_tracker'):
                             # Process with tracking
                             processed_img, new_matches, new_vehicle_counter = process_ml_detections_with_tracking(
                                 img.copy(),
@@ -868,7 +1211,8 @@ class DetectionTab:
                                 self.app.line_height,
                                 self.app.offset,
                                 self.app.vehicle_counter,
-                                self.app.ml_detector.classes if hasattr(self.app.ml_detector, 'classes') else []
+                                self.app.ml_detector.classes if hasattr(self.app.ml_detector, 'classes') else [],
+                                self.counting_zones
                             )
 
                             # Update app state
@@ -878,17 +1222,11 @@ class DetectionTab:
                             # Update the processed image
                             img = processed_img
                         else:
-                            # Only run ML detection on certain frames to improve performance
-                            if self.frame_count % self.frame_skip == 0:
-                                # Use our safe detection method
-                                detections = self.safe_ml_detection(img)
-
-                                # Store for use in skipped frames
-                                self.last_detections = detections
-                            else:
-                                # Use the last known detections for in-between frames
-                                detections = self.last_detections if hasattr(self,
-                                                                             'last_detections') and self.last_detections is not None else []
+                            # Inference runs in the background on the newest frame, use its latest result
+                            self.update_ml_region(img.shape)
+                            worker = self.get_inference_worker()
+                            worker.submit(img, self.frame_count)
+                            detections, detection_frame = worker.latest()
 
                             # Check if we have valid detections to process
                             if not isinstance(detections, list):
@@ -902,43 +1240,33 @@ class DetectionTab:
                                 self.app.offset,
                                 self.app.matches,
                                 self.app.vehicle_counter,
-                                self.app.ml_detector.classes if hasattr(self.app.ml_detector, 'classes') else []
+                                self.app.ml_detector.classes if hasattr(self.app.ml_detector, 'classes') else [],
+                                self.counting_zones
                             )
 
                             # Update app state
                             self.app.matches = new_matches
                             self.app.vehicle_counter = new_vehicle_counter
 
+                            # Show how many frames behind the detections are
+                            age = f"{self.frame_count - detection_frame} frames" if detection_frame is not None \
+                                else "pending"
+                            if self.tiled_inference.active:
+                                age += f", {self.tiled_inference.last_tile_count} tiles"
+                            overlay = f"Detection age: {age}"
+
                             # Update the processed image
                             img = processed_img
 
                     except Exception as e:
                         print(f"ML detection error: {str(e)}")
-                        self.app.log_event(f"ML detection error: {str(e)}")
+                        self.post_event(f"ML detection error: {str(e)}")
 
                         # Fallback to traditional method
-                        processed_img, new_matches, new_vehicle_counter = detect_vehicles_traditional(
-                            img.copy(),
-                            self.prev_frame,
-                            self.app.line_height,
-                            self.app.min_contour_width,
-                            self.app.min_contour_height,
-                            self.app.offset,
-                            self.app.matches,
-                            self.app.vehicle_counter
-                        )
+                        processed_img, new_matches, new_vehicle_counter = self.detect_vehicles_motion(img)
                 else:
-                    # Use traditional vehicle detection
-                    processed_img, new_matches, new_vehicle_counter = detect_vehicles_traditional(
-                        img.copy(),
-                        self.prev_frame,
-                        self.app.line_height,
-                        self.app.min_contour_width,
-                        self.app.min_contour_height,
-                        self.app.offset,
-                        self.app.matches,
-                        self.app.vehicle_counter
-                    )
+                    # Use traditional (motion based) vehicle detection
+                    processed_img, new_matches, new_vehicle_counter = self.detect_vehicles_motion(img)
 
                 # Update app state
                 self.app.matches = new_matches
@@ -951,20 +1279,71 @@ class DetectionTab:
             # Update the previous frame for the next iteration
             self.prev_frame = img.copy()
 
-            # Convert to RGB for display
-            img_rgb = cv2.cvtColor(processed_img, cv2.COLOR_BGR2RGB)
+            return {'image': processed_img, 'overlay': overlay,
+                    'analysis_time': time.perf_counter() - start_time}
 
-            # Convert to PIL format
-            img_pil = Image.fromarray(img_rgb)
+        except Exception as e:
+            return {'error': str(e)}
 
-            # Reuse ImageTk object if possible
-            if not hasattr(self, 'img_tk') or self.img_tk is None:
-                self.img_tk = ImageTk.PhotoImage(image=img_pil)
-            else:
-                # Create a new PhotoImage (can't update existing one)
-                self.img_tk = ImageTk.PhotoImage(image=img_pil)
+    def annotate_frame(self, result):
+        """
+        Annotation stage: overlays, the stream server and conversion for display
+
+        Returns:
+            The result with 'image' as a PIL image for the Tk label
+        """
+        if 'error' in result:
+            return result
+        start_time = time.perf_counter()
+        processed_img = result['image']
+
+        if result['overlay']:
+            cv2.putText(processed_img, result['overlay'], (10, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 200, 255), 2)
+
+        # Hand the annotated frame to the stream server (encoded on its own thread)
+        stream_server = self.stream_server
+        if stream_server is not None:
+            stream_server.publish(processed_img)
+
+        # Convert to RGB and PIL format, only the PhotoImage has to be made on the Tk thread
+        result['image'] = Image.fromarray(cv2.cvtColor(processed_img, cv2.COLOR_BGR2RGB))
+        result['processing_time'] = result['analysis_time'] + time.perf_counter() - start_time
+        return result
+
+    def process_frame(self):
+        """
+        Display stage: show the newest annotated frame and update the status widgets
+
+        Capture, preprocessing, analysis and annotation run in the pipeline workers, so the
+        Tk thread only handles settings, log events and widgets.
+        """
+        if not self.running or not self.video_capture:
+            return
+
+        try:
+            # Settings go to the workers and their events come back here
+            self.snapshot_settings()
+            self.flush_events()
+            if self.rescale_pending:
+                self.rescale_pending = False
+                self.app.scale_positions_to_current_dimensions()
+
+            # Take the next annotated frame from the pipeline
+            item = self.pipeline.get() if self.pipeline is not None else END
+
+            if item is END:
+                self.app.log_event("End of video reached")
+                self.stop_detection()
+                return
+            if item is None:
+                # The workers are still on the next frame
+                self.parent.after(5, self.process_frame)
+                return
+            if 'error' in item:
+                raise RuntimeError(item['error'])
 
             # Display the image
+            self.img_tk = ImageTk.PhotoImage(image=item['image'])
             if hasattr(self, 'image_label'):
                 self.image_label.configure(image=self.img_tk)
                 self.image_label.image = self.img_tk
@@ -984,20 +1363,20 @@ class DetectionTab:
             # Update allocation tab less frequently (every ~10 seconds at 30fps)
             if hasattr(self.app, 'allocation_tab'):
                 # Assuming ~30fps, update every 300 frames (10 seconds)
+                # Queued so these coalesce with the tab's own refreshes; unchanged data costs nothing
                 if self.frame_count % 300 == 0:
-                    self.app.allocation_tab.update_visualization()
-                    self.app.allocation_tab.update_statistics()
+                    self.app.allocation_tab.queue_function(self.app.allocation_tab.update_visualization)
+                    self.app.allocation_tab.queue_function(self.app.allocation_tab.update_statistics)
 
-            # Calculate and display processing time
-            processing_time = (time.time() - start_time) * 1000  # Convert to ms
+            # Display analysis and annotation time of the frame
+            processing_time = item['processing_time'] * 1000  # Convert to ms
             self.last_processing_time = processing_time
             self.processing_time_label.config(text=f"Processing: {processing_time:.1f} ms")
+            if self.pipeline is not None:
+                self.pipeline_label.config(text=f"Pipeline: {self.pipeline.describe()}")
 
-            # Schedule next frame processing with better delay
-            if self.app.detection_mode == "parking" or not self.app.use_ml_detection:
-                self.parent.after(30, self.process_frame)  # 30ms delay for standard processing
-            else:
-                self.parent.after(40, self.process_frame)  # 40ms delay for ML processing
+            # The next frames are already in the workers, only let Tk handle its events
+            self.parent.after(1, self.process_frame)
 
         except Exception as e:
             self.app.log_event(f"Error processing frame: {str(e)}")
@@ -1009,7 +1388,7 @@ class DetectionTab:
         try:
             # Make sure app has parking_manager
             if not hasattr(self.app, 'parking_manager'):
-                self.app.log_event("No parking manager found")
+                self.post_event("No parking manager found")
                 return
 
             # Create parking_data if it doesn't exist in parking_manager
@@ -1017,6 +1396,9 @@ class DetectionTab:
                 self.app.parking_manager.parking_data = {}
 
             # Update parking spaces data
+            changed = False
+            occupied = np.zeros(len(self.app.posList), dtype=bool)
+            observed = np.zeros(len(self.app.posList), dtype=bool)
             for i, (x, y, w, h) in enumerate(self.app.posList):
                 # Convert coordinates to integers to fix the "slice indices must be integers" error
                 x, y, w, h = int(x), int(y), int(w), int(h)
@@ -1027,6 +1409,8 @@ class DetectionTab:
                     img_crop = img_pro[y:y + h, x:x + w]
                     count = cv2.countNonZero(img_crop)
                     is_occupied = count >= self.app.parking_threshold
+                    occupied[i] = is_occupied
+                    observed[i] = True
 
                     # Generate section based on position (cast to int to avoid float division issues)
                     section = "A" if x < int(img_pro.shape[1] / 2) else "B"
@@ -1045,59 +1429,86 @@ class DetectionTab:
                             'distance_to_entrance': x + y,  # Simple distance estimation
                             'section': section
                         }
-                    else:
+                        changed = True
+                    elif self.app.parking_manager.parking_data[space_id].get('occupied') != is_occupied:
                         # Just update occupancy status
                         self.app.parking_manager.parking_data[space_id]['occupied'] = is_occupied
+                        changed = True
+
+            # Only bump the data version when something actually changed
+            if changed:
+                self.app.parking_manager.mark_parking_data_changed()
+
+            # Feed the occupancy/dwell heatmap accumulators
+            self.app.parking_manager.record_occupancy(occupied, observed, img_pro, positions=self.app.posList,
+                                                      reference_image=getattr(self.app, 'current_reference_image', None))
 
             # Only log updates occasionally to reduce console spam
             if self.frame_count % 100 == 0:  # Log every 100 frames
-                self.app.log_event(f"Updated parking data for {len(self.app.posList)} spaces")
+                self.post_event(f"Updated parking data for {len(self.app.posList)} spaces")
         except Exception as e:
-            self.app.log_event(f"Error updating parking allocation data: {str(e)}")
+            self.post_event(f"Error updating parking allocation data: {str(e)}")
+
+    def get_inference_worker(self):
+        """Inference worker for the current ML detector, replaced when the detector changes"""
+        with self._inference_worker_lock:
+            detector = self.app.ml_detector
+            if self.inference_worker is None or self.inference_worker.detector is not detector:
+                if self.inference_worker is not None:
+                    self.inference_worker.stop()
+                tiler = self.tiled_inference
+
+                def detect_batch(imgs):
+                    if tiler.active:
+                        return tiler.detect_batch(detector, imgs)
+                    return self.detect_scaled_batch(detector, imgs)
+
+                self.inference_worker = InferenceWorker(detector, detect_batch)
+            return self.inference_worker
+
+    def update_ml_region(self, frame_shape):
+        """Restrict ML inference to the selected region, the whole (downscaled) frame otherwise"""
+        region = self.analysis_settings['ml_region']
+        band_height = self.analysis_settings['band_height'] or 160
+        positions = tuple(map(tuple, self.app.posList)) if region == "Parking Spaces" else ()
+
+        key = (region, frame_shape[:2], self.app.line_height, band_height, positions)
+        if key == self._ml_region_key:
+            return
+        self._ml_region_key = key
 
-    def safe_ml_detection(self, img):
-        """Safely perform ML detection with error handling and fallback"""
+        if region == "Counting Band":
+            self.tiled_inference.set_region(CountingRegion(frame_shape, self.app.line_height, band_height).bounds)
+        elif region == "Parking Spaces" and positions:
+            margin = 10
+            self.tiled_inference.set_region(rects_bounds(positions, frame_shape, margin), positions, margin)
+        else:
+            self.tiled_inference.set_region(None)
+
+    def stop_inference_worker(self):
+        """Stop background ML inference"""
+        with self._inference_worker_lock:
+            if self.inference_worker is not None:
+                self.inference_worker.stop()
+                self.inference_worker = None
+
+    @staticmethod
+    def detect_scaled_batch(detector, imgs):
+        """
+        Run a detector on 640x360 copies of frames and scale the boxes back to each frame
+
+        Touches no Tk state, so it can run on the inference worker. Detectors with
+        detect_vehicles_batch get all frames in one call.
+        """
         try:
-            if not self.app.ml_detector:
-                return []
-
-            # Check if we're using the tracker or regular detector
-            ml_method = getattr(self, 'ml_method_var', None)
-            if ml_method and ml_method.get() == "YOLO + DeepSORT" and hasattr(self.app, 'vehicle_tracker'):
-                # For YOLO+DeepSORT, we don't need to do anything here
-                # The detections will be handled in process_ml_detections_with_tracking
-                return []
-
-            # Use the regular detector
-            # Create a smaller image for detection
-            ml_img = cv2.resize(img, (640, 360))
-
-            # Get vehicle detections
-            detections = self.app.ml_detector.detect_vehicles(ml_img)
-
-            # Ensure we have a valid result
-            if detections is None:
-                return []
-
-            # Scale detection coordinates back to original image size
-            if len(detections) > 0:
-                width_scale = self.app.image_width / 640
-                height_scale = self.app.image_height / 360
-
-                for i, detection in enumerate(detections):
-                    if len(detection) >= 3:
-                        box = detection[0]
-                        if len(box) >= 4:
-                            x1, y1, x2, y2 = box
-                            detections[i][0] = [
-                                int(x1 * width_scale),
-                                int(y1 * height_scale),
-                                int(x2 * width_scale),
-                                int(y2 * height_scale)
-                            ]
-
-            return detections
+            # Create smaller images for detection
+            ml_imgs = [cv2.resize(img, (640, 360)) for img in imgs]
+
+            # Get vehicle detections as structured arrays and scale them back to original image size
+            batch_detections = detect_arrays_batch(detector, ml_imgs)
+            return [to_detection_list(scale_detections(detections, img.shape[1] / 640, img.shape[0] / 360))
+                    for img, detections in zip(imgs, batch_detections)]
 
         except Exception as e:
             print(f"Error in ML detection: {str(e)}")
-            return []
\ No newline at end of file
+            return [[] for _ in imgs]
\ No newline at end of file
@@ -1,17 +1,25 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
+import cv2
 import numpy as np
+from PIL import Image, ImageTk
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from matplotlib.transforms import Bbox, TransformedBbox
 import threading
 import queue
 import time
 import random
 from datetime import datetime
 import traceback
+from models.lot_map_renderer import LotMapRenderer, compute_lot_layout, lot_space_id
+from utils.media_paths import get_reference_image_path
 
 
 class ParkingAllocationTab:
+    # Above this many changed regions a single full-figure blit is cheaper
+    MAX_BLIT_REGIONS = 20
+
     def __init__(self, parent, app):
         self.parent = parent
         self.app = app
@@ -22,14 +30,24 @@ class ParkingAllocationTab:
 
         # Set up UI state variables
         self.show_visualization = tk.BooleanVar(value=True)
+        self.renderer_choice = tk.StringVar(value="Matplotlib")
         self.highlight_free_spaces = tk.BooleanVar(value=True)
         self.auto_allocation_enabled = tk.BooleanVar(value=False)
         self.preferred_section = tk.StringVar(value="Any")
         self.load_balancing_weight = tk.DoubleVar(value=0.3)
         self.vehicle_size = tk.IntVar(value=1)
 
-        # Queue for thread-safe UI updates
+        # Queue for thread-safe UI updates; pending calls are tracked so duplicates coalesce
         self.update_queue = queue.Queue()
+        self._pending_functions = set()
+        self._pending_lock = threading.Lock()
+
+        # Parking data version each view last rendered, so unchanged data is not redrawn
+        self._rendered_versions = {}
+
+        # OpenCV renderer, a fast alternative to the matplotlib view for large lots
+        self.lot_map_renderer = LotMapRenderer()
+        self.raster_image = None
 
         # Variables for vehicle simulation
         self.next_vehicle_id = 1
@@ -43,6 +61,9 @@ class ParkingAllocationTab:
         self.update_thread = threading.Thread(target=self.update_loop, daemon=True)
         self.update_thread.start()
 
+        # Queued functions touch Tk and matplotlib, so they run on the main thread
+        self.parent.after(100, self.process_update_queue)
+
     def setup_ui(self):
         """Set up the UI components for the parking allocation tab"""
         # Configure grid layout
@@ -63,10 +84,10 @@ class ParkingAllocationTab:
         self.canvas_frame.grid_rowconfigure(0, weight=1)
 
         # Initial visualization with explicit DPI setting
-        self.fig = plt.Figure(figsize=(10, 6), dpi=100)  # Explicitly set DPI
-        self.ax = self.fig.add_subplot(111)
-        self.canvas = FigureCanvasTkAgg(self.fig, self.canvas_frame)
-        self.canvas.get_tk_widget().grid(row=0, column=0, sticky="nsew")
+        self._create_canvas()
+
+        # Raster view for the OpenCV renderer, shown instead of the canvas when selected
+        self.raster_label = ttk.Label(self.canvas_frame, anchor="center")
 
         # Right side - Control panel
         self.control_frame = ttk.Frame(self.parent)
@@ -90,20 +111,39 @@ class ParkingAllocationTab:
         # Toggle visualization view
         viz_check = ttk.Checkbutton(viz_frame, text="Show visualization",
                                     variable=self.show_visualization,
-                                    command=self.update_visualization)
+                                    command=lambda: self.update_visualization(force=True))
         viz_check.pack(anchor="w", padx=5, pady=3)
 
         # Highlight free spaces
         highlight_check = ttk.Checkbutton(viz_frame, text="Highlight free spaces",
                                           variable=self.highlight_free_spaces,
-                                          command=self.update_visualization)
+                                          command=lambda: self.update_visualization(force=True))
         highlight_check.pack(anchor="w", padx=5, pady=3)
 
+        # Renderer selection
+        renderer_frame = ttk.Frame(viz_frame)
+        renderer_frame.pack(fill="x", padx=5, pady=3)
+        ttk.Label(renderer_frame, text="Renderer:").pack(side="left")
+        renderer_combo = ttk.Combobox(renderer_frame, textvariable=self.renderer_choice,
+                                      values=["Matplotlib", "OpenCV"], state="readonly", width=12)
+        renderer_combo.pack(side="left", padx=5)
+        renderer_combo.bind("<<ComboboxSelected>>", self._on_renderer_changed)
+
         # Update button
         update_btn = ttk.Button(viz_frame, text="Refresh Visualization",
-                                command=self.update_visualization)
+                                command=lambda: self.update_visualization(force=True))
         update_btn.pack(fill="x", padx=5, pady=5)
 
+        # Export button
+        export_btn = ttk.Button(viz_frame, text="Export Lot Map (PNG)",
+                                command=self.export_lot_map)
+        export_btn.pack(fill="x", padx=5, pady=5)
+
+        # Heatmap button
+        heatmap_btn = ttk.Button(viz_frame, text="Show Occupancy Heatmap",
+                                 command=self.show_occupancy_heatmap)
+        heatmap_btn.pack(fill="x", padx=5, pady=5)
+
     def _add_allocation_controls(self):
         """Add allocation controls to the control panel"""
         alloc_frame = ttk.LabelFrame(self.control_frame, text="Space Allocation")
@@ -179,11 +219,15 @@ class ParkingAllocationTab:
         """Add a separator line to the control panel"""
         ttk.Separator(self.control_frame, orient="horizontal").pack(fill="x", padx=5, pady=10)
 
-    def update_visualization(self):
-        """Update the parking visualization with simplified error handling"""
+    def update_visualization(self, force=False):
+        """Update the parking visualization, redrawing only the spaces whose state changed"""
         if not self.show_visualization.get():
             return
 
+        if self.renderer_choice.get() == "OpenCV":
+            self._update_raster_visualization(force)
+            return
+
         try:
             # Check if we need to recreate the figure
             canvas_exists = hasattr(self, 'canvas') and self.canvas and self.canvas.get_tk_widget().winfo_exists()
@@ -199,265 +243,460 @@ class ParkingAllocationTab:
                         print(f"Error destroying canvas: {e}")
                         pass
 
-                self.fig = plt.Figure(figsize=(10, 6), dpi=100)
-                self.ax = self.fig.add_subplot(111)
-                self.canvas = FigureCanvasTkAgg(self.fig, self.canvas_frame)
-                self.canvas.get_tk_widget().grid(row=0, column=0, sticky="nsew")
+                self._create_canvas()
+                force = True
 
-            # Clear the figure for fresh drawing
-            self.ax.clear()
+            render_key = self._needs_refresh('visualization', force)
+            if render_key is None:
+                return
+            self._rendered_versions['visualization'] = render_key
 
             # Get parking data
-            parking_data = {}
-            if hasattr(self.app, 'parking_manager') and hasattr(self.app.parking_manager, 'parking_data'):
-                parking_data = self.app.parking_manager.parking_data.copy()
-
-            # Update allocated vehicles
-            for vehicle_id, space_id in self.allocated_vehicles.items():
-                if space_id in parking_data:
-                    parking_data[space_id]['occupied'] = True
-                    parking_data[space_id]['vehicle_id'] = vehicle_id
+            parking_data = self._collect_parking_data()
 
             # If no posList or parking data, show message
             if (not hasattr(self.app, 'posList') or not self.app.posList or
                     not parking_data):
-                self.ax.text(0.5, 0.5, "No parking data available",
-                             ha='center', va='center', fontsize=14)
-                self.canvas.draw()
+                self._show_message("No parking data available", fontsize=14)
                 return
 
-            # Calculate statistics
-            individual_spaces = {id: data for id, data in parking_data.items()
-                                 if not data.get('is_group', False)}
-            group_spaces = {id: data for id, data in parking_data.items()
-                            if data.get('is_group', False)}
-
-            free_count = sum(1 for data in individual_spaces.values()
-                             if not data.get('occupied', True))
-            total = len(individual_spaces)
-
-            # Set up grid layout
-            space_w = 80
-            space_h = 50
-            margin = 20
-            cols = max(3, min(8, int(np.sqrt(total * 2))))  # More reasonable column count
-
-            # Calculate rows needed for individual spaces and groups
-            individual_rows = (len(individual_spaces) + cols - 1) // cols
-            group_rows = (len(group_spaces) + (cols // 2) - 1) // (cols // 2) if group_spaces else 0
-
-            # Set plot area - make sure it's large enough
-            plot_width = cols * space_w + 2 * margin
-            plot_height = (individual_rows + group_rows + 3) * space_h + 3 * margin
-
-            self.ax.set_xlim(0, plot_width)
-            self.ax.set_ylim(0, plot_height)
-
-            # Draw section headers
-            current_y = plot_height - margin
-
-            # Draw individual spaces section header
-            self.ax.text(margin, current_y, "INDIVIDUAL SPACES",
-                         fontsize=14, fontweight='bold')
-            current_y -= space_h
-
-            # Draw individual spaces
-            space_i = 0
-            for idx, pos in enumerate(self.app.posList):
-                if not isinstance(pos, tuple) or len(pos) != 4:
-                    continue
-
-                x, y, w, h = pos
-
-                # Create space ID
-                section = "A" if x < getattr(self.app, 'image_width', 1000) / 2 else "B"
-                section += "1" if y < getattr(self.app, 'image_height', 1000) / 2 else "2"
-                space_id = f"S{idx + 1}-{section}"
-
-                # Skip if part of a group
-                is_in_group = False
-                if space_id in individual_spaces:
-                    is_in_group = individual_spaces[space_id].get('in_group', False)
-
-                if is_in_group:
-                    continue
-
-                # Calculate position in grid
-                row = space_i // cols
-                col = space_i % cols
-
-                x_pos = margin + col * space_w
-                y_pos = current_y - (row + 1) * space_h
-
-                # Get occupancy
-                is_occupied = True
-                vehicle_id = None
-                if space_id in parking_data:
-                    is_occupied = parking_data[space_id].get('occupied', True)
-                    vehicle_id = parking_data[space_id].get('vehicle_id')
-
-                # Set color
-                color = 'red' if is_occupied else 'green'
-
-                # Draw rectangle
-                rect = plt.Rectangle((x_pos, y_pos), space_w - 10, space_h - 5,
-                                     linewidth=2, edgecolor='black',
-                                     facecolor=color, alpha=0.6)
-                self.ax.add_patch(rect)
-
-                # Add space ID
-                self.ax.text(x_pos + 5, y_pos + space_h - 15, space_id,
-                             fontsize=8, weight='bold', color='white')
-
-                # Add vehicle ID if occupied
-                if is_occupied and vehicle_id:
-                    self.ax.text(x_pos + 5, y_pos + 10, f"V: {vehicle_id}",
-                                 fontsize=8, color='white')
-
-                space_i += 1
-
-            # Update current y position after individual spaces
-            current_y -= (individual_rows + 1) * space_h
-
-            # Draw separator
-            if group_spaces:
-                self.ax.axhline(y=current_y + space_h / 2, color='gray',
-                                linestyle='-', linewidth=1)
-
-                # Draw group section header
-                current_y -= space_h
-                self.ax.text(margin, current_y, "GROUP SPACES",
-                             fontsize=14, fontweight='bold')
-                current_y -= space_h
-
-                # Draw groups - with larger boxes
-                group_i = 0
-                group_cols = cols // 2  # Fewer columns for groups
-                group_w = space_w * 1.8
-                group_h = space_h * 1.5
-
-                for group_id, group_data in group_spaces.items():
-                    # Calculate position
-                    row = group_i // group_cols
-                    col = group_i % group_cols
-
-                    x_pos = margin + col * group_w * 1.1  # Add extra spacing between groups
-                    y_pos = current_y - (row + 1) * group_h
-
-                    # Get group details
-                    is_occupied = group_data.get('occupied', False)
-                    member_spaces = group_data.get('member_spaces', [])
-
-                    # Count occupied members
-                    occupied_count = 0
-                    for member_idx in member_spaces:
-                        if member_idx < len(self.app.posList):
-                            member_x, member_y, member_w, member_h = self.app.posList[member_idx]
-                            member_section = "A" if member_x < getattr(self.app, 'image_width', 1000) / 2 else "B"
-                            member_section += "1" if member_y < getattr(self.app, 'image_height', 1000) / 2 else "2"
-                            member_id = f"S{member_idx + 1}-{member_section}"
-
-                            if member_id in parking_data and parking_data[member_id].get('occupied', False):
-                                occupied_count += 1
-
-                    # Determine color
-                    if is_occupied or occupied_count == len(member_spaces):
-                        color = 'red'  # Fully occupied
-                    elif occupied_count > 0:
-                        color = 'orange'  # Partially occupied
-                    else:
-                        color = 'green'  # Free
-
-                    # Draw group box
-                    rect = plt.Rectangle((x_pos, y_pos), group_w - 10, group_h - 5,
-                                         linewidth=3, edgecolor='blue',
-                                         facecolor=color, alpha=0.5)
-                    self.ax.add_patch(rect)
-
-                    # Add group title
-                    self.ax.text(x_pos + 5, y_pos + group_h - 20, f"{group_id}",
-                                 fontsize=12, fontweight='bold', color='black')
-
-                    # Add occupancy info
-                    self.ax.text(x_pos + 5, y_pos + group_h - 40,
-                                 f"({occupied_count}/{len(member_spaces)} occupied)",
-                                 fontsize=9, color='black')
-
-                    # Add small indicators for member spaces
-                    mini_w = (group_w - 30) / min(4, max(1, len(member_spaces)))
-                    mini_h = mini_w * 0.6
-
-                    for idx, member_idx in enumerate(member_spaces):
-                        if member_idx < len(self.app.posList):
-                            # Calculate position for mini-space
-                            mini_row = idx // 4
-                            mini_col = idx % 4
-
-                            mini_x = x_pos + 5 + mini_col * mini_w + 2
-                            mini_y = y_pos + 5 + mini_row * mini_h + 2
-
-                            # Check if occupied
-                            member_x, member_y, member_w, member_h = self.app.posList[member_idx]
-                            member_section = "A" if member_x < getattr(self.app, 'image_width', 1000) / 2 else "B"
-                            member_section += "1" if member_y < getattr(self.app, 'image_height', 1000) / 2 else "2"
-                            member_id = f"S{member_idx + 1}-{member_section}"
-
-                            is_mini_occupied = False
-                            if member_id in parking_data:
-                                is_mini_occupied = parking_data[member_id].get('occupied', False)
-
-                            # Draw mini space
-                            mini_color = 'red' if is_mini_occupied else 'green'
-                            mini_rect = plt.Rectangle((mini_x, mini_y),
-                                                      mini_w - 4, mini_h - 4,
-                                                      linewidth=1, edgecolor='black',
-                                                      facecolor=mini_color, alpha=0.8)
-                            self.ax.add_patch(mini_rect)
-
-                            # Number the mini space
-                            self.ax.text(mini_x + 2, mini_y + 2, f"{member_idx + 1}",
-                                         fontsize=6, color='white')
-
-                    group_i += 1
-
-            # Add legend
-            legend_elements = [
-                plt.Rectangle((0, 0), 1, 1, facecolor='green', alpha=0.6),
-                plt.Rectangle((0, 0), 1, 1, facecolor='red', alpha=0.6),
-                plt.Rectangle((0, 0), 1, 1, facecolor='orange', alpha=0.6),
-            ]
-            legend_labels = ['Free', 'Occupied', 'Partially Occupied']
-
-            self.ax.legend(legend_elements, legend_labels, loc='upper right')
-
-            # Add title with stats
-            self.ax.set_title(f"Parking Status: {free_count}/{total} Available, {len(group_spaces)} Groups")
-
-            # Remove axis ticks
-            self.ax.set_xticks([])
-            self.ax.set_yticks([])
-
-            # Add timestamp
-            current_time = datetime.now().strftime('%H:%M:%S')
-            self.ax.text(margin, margin / 2, f"Updated: {current_time}", fontsize=8)
-
-            # Draw the canvas
-            self.canvas.draw()
+            # Artists are only rebuilt when the layout changes (spaces added, removed or regrouped);
+            # occupancy changes just restyle the existing artists
+            layout = self._compute_layout(parking_data)
+            if layout != self._layout:
+                self._build_layout_artists(layout)
+
+            changed = self._apply_space_states(parking_data)
+            self._blit_changes(changed)
 
         except Exception as e:
             print(f"Visualization error: {str(e)}")
+            self._rendered_versions.pop('visualization', None)
             import traceback
             traceback.print_exc()
 
             # Simple error display
             try:
-                self.ax.clear()
-                self.ax.text(0.5, 0.5, f"Visualization Error: {str(e)}",
-                             ha='center', va='center', fontsize=12, color='red')
-                self.canvas.draw()
+                self._show_message(f"Visualization Error: {str(e)}", fontsize=12, color='red')
             except:
                 pass
 
+    def _collect_parking_data(self):
+        """Copy the shared parking data with the simulated allocations applied"""
+        parking_data = {}
+        if hasattr(self.app, 'parking_manager') and hasattr(self.app.parking_manager, 'parking_data'):
+            parking_data = self.app.parking_manager.parking_data.copy()
+
+        # Update allocated vehicles
+        for vehicle_id, space_id in self.allocated_vehicles.items():
+            if space_id in parking_data:
+                parking_data[space_id]['occupied'] = True
+                parking_data[space_id]['vehicle_id'] = vehicle_id
+
+        return parking_data
+
+    def _on_renderer_changed(self, event=None):
+        """Swap the matplotlib canvas and the raster view when the renderer changes"""
+        if self.renderer_choice.get() == "OpenCV":
+            self.canvas.get_tk_widget().grid_remove()
+            self.raster_label.grid(row=0, column=0, sticky="nsew")
+        else:
+            self.raster_label.grid_remove()
+            self.canvas.get_tk_widget().grid()
+        self.update_visualization(force=True)
+
+    def _update_raster_visualization(self, force=False):
+        """Draw the lot map with the OpenCV renderer into the raster view"""
+        try:
+            render_key = self._needs_refresh('raster', force)
+            if render_key is None:
+                return
+            self._rendered_versions['raster'] = render_key
+
+            parking_data = self._collect_parking_data()
+            if not hasattr(self.app, 'posList') or not self.app.posList or not parking_data:
+                self.raster_image = None
+                self.raster_label.config(image="", text="No parking data available")
+                return
+
+            image = self.lot_map_renderer.render(parking_data, self.app.posList,
+                                                 getattr(self.app, 'image_width', 1000),
+                                                 getattr(self.app, 'image_height', 1000))
+
+            # Shrink to the view keeping the aspect ratio (large lots produce tall maps)
+            view_w = max(self.raster_label.winfo_width(), 1)
+            view_h = max(self.raster_label.winfo_height(), 1)
+            fit = min(view_w / image.shape[1], view_h / image.shape[0])
+            if view_w > 1 and view_h > 1 and fit < 1:
+                image = cv2.resize(image, (max(int(image.shape[1] * fit), 1), max(int(image.shape[0] * fit), 1)),
+                                   interpolation=cv2.INTER_AREA)
+
+            img_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+            self.raster_image = ImageTk.PhotoImage(image=Image.fromarray(img_rgb))
+            self.raster_label.config(image=self.raster_image, text="")
+
+        except Exception as e:
+            print(f"Raster visualization error: {str(e)}")
+            self._rendered_versions.pop('raster', None)
+
+    def export_lot_map(self):
+        """Export the lot map drawn by the OpenCV renderer as a PNG file"""
+        parking_data = self._collect_parking_data()
+        if not hasattr(self.app, 'posList') or not self.app.posList or not parking_data:
+            messagebox.showerror("Error", "No parking data available. Setup parking spaces first.")
+            return
+
+        file_path = filedialog.asksaveasfilename(
+            title="Export Lot Map",
+            defaultextension=".png",
+            filetypes=[("PNG images", "*.png")]
+        )
+        if not file_path:
+            return
+
+        # A separate renderer keeps the export independent of the on-screen buffer
+        if LotMapRenderer().export_png(file_path, parking_data, self.app.posList,
+                                       getattr(self.app, 'image_width', 1000),
+                                       getattr(self.app, 'image_height', 1000)):
+            messagebox.showinfo("Export Complete", f"Lot map saved to {file_path}")
+        else:
+            messagebox.showerror("Error", f"Could not save lot map to {file_path}")
+
+    def show_occupancy_heatmap(self):
+        """Open a window with the accumulated occupancy/dwell heatmap over the reference image"""
+        if not hasattr(self.app, 'parking_manager') or not hasattr(self.app.parking_manager, 'occupancy_heatmap'):
+            messagebox.showerror("Error", "No occupancy data available.")
+            return
+
+        window = tk.Toplevel(self.parent)
+        window.title("Occupancy Heatmap")
+
+        controls = ttk.Frame(window)
+        controls.pack(fill="x", padx=5, pady=5)
+        ttk.Label(controls, text="Metric:").pack(side="left")
+        metric = tk.StringVar(value="occupancy")
+        metric_combo = ttk.Combobox(controls, textvariable=metric, state="readonly", width=12,
+                                    values=["occupancy", "dwell", "activity"])
+        metric_combo.pack(side="left", padx=5)
+
+        image_label = ttk.Label(window)
+        image_label.pack(fill="both", expand=True, padx=5, pady=5)
+
+        def refresh(event=None):
+            try:
+                width = getattr(self.app, 'image_width', 1280)
+                height = getattr(self.app, 'image_height', 720)
+
+                # Draw over the reference image, or a blank frame when it is missing
+                base = None
+                if hasattr(self.app, 'current_reference_image'):
+                    base = cv2.imread(get_reference_image_path(self.app.current_reference_image))
+                if base is None:
+                    base = np.zeros((height, width, 3), dtype=np.uint8)
+                elif base.shape[1] != width or base.shape[0] != height:
+                    base = cv2.resize(base, (width, height))
+
+                image = self.app.parking_manager.render_occupancy_heatmap(
+                    base, metric=metric.get(), positions=getattr(self.app, 'posList', []),
+                    reference_image=getattr(self.app, 'current_reference_image', None))
+                img_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+                image_label.image = ImageTk.PhotoImage(image=Image.fromarray(img_rgb))
+                image_label.config(image=image_label.image)
+            except Exception as e:
+                print(f"Heatmap error: {str(e)}")
+
+        metric_combo.bind("<<ComboboxSelected>>", refresh)
+        ttk.Button(controls, text="Refresh", command=refresh).pack(side="left", padx=5)
+        refresh()
+
+    def _create_canvas(self):
+        """Create the matplotlib figure and Tk canvas used for the visualization"""
+        self.fig = plt.Figure(figsize=(10, 6), dpi=100)  # Explicitly set DPI
+        self.ax = self.fig.add_subplot(111)
+        self.canvas = FigureCanvasTkAgg(self.fig, self.canvas_frame)
+        self.canvas.get_tk_widget().grid(row=0, column=0, sticky="nsew")
+
+        # Every full redraw (initial draw, layout rebuild, window resize) refreshes the blit background
+        self.canvas.mpl_connect('draw_event', self._on_canvas_draw)
+        self._reset_artists()
+
+    def _reset_artists(self):
+        """Forget all persistent artists so the next update rebuilds the layout"""
+        self._layout = None
+        self._space_artists = {}  # space_id -> artist entry
+        self._group_artists = {}  # group_id -> artist entry
+        self._animated_artists = []
+        self._background = None
+        self._timestamp_extent = None
+        self._timestamp_text = None
+
+    def _show_message(self, message, **text_kwargs):
+        """Replace the visualization with a centered message"""
+        self._reset_artists()
+        self.ax.clear()
+        self.ax.text(0.5, 0.5, message, ha='center', va='center', **text_kwargs)
+        self.canvas.draw()
+
+    def _space_id(self, idx, pos):
+        """Build the allocation space ID for a position in posList"""
+        return lot_space_id(idx, pos, getattr(self.app, 'image_width', 1000), getattr(self.app, 'image_height', 1000))
+
+    def _compute_layout(self, parking_data):
+        """Compute the schematic layout shared with the OpenCV lot map renderer"""
+        return compute_lot_layout(parking_data, self.app.posList,
+                                  getattr(self.app, 'image_width', 1000), getattr(self.app, 'image_height', 1000))
+
+    def _build_layout_artists(self, layout):
+        """Create every artist for a layout once and index them by space/group ID"""
+        self._reset_artists()
+        self.ax.clear()
+        self._layout = layout
+
+        plot_width, plot_height = layout['size']
+        space_w, space_h, margin = layout['cell']
+        group_w, group_h = layout['group_cell']
+
+        self.ax.set_xlim(0, plot_width)
+        self.ax.set_ylim(0, plot_height)
+
+        # Static artists end up in the cached background
+        for x, y, text in layout['headers']:
+            self.ax.text(x, y, text, fontsize=14, fontweight='bold')
+
+        if layout['separator_y'] is not None:
+            self.ax.axhline(y=layout['separator_y'], color='gray', linestyle='-', linewidth=1)
+
+        # Dynamic artists are animated: they are skipped by full draws and painted by blitting.
+        # Each cell's artists are clipped to the cell so a cell can be restored and redrawn alone
+        # without touching its neighbours.
+        for space_id, x_pos, y_pos in layout['spaces']:
+            w, h = space_w - 10, space_h - 5
+            region = TransformedBbox(Bbox.from_bounds(x_pos, y_pos, w, h), self.ax.transData)
+
+            self.ax.add_patch(plt.Rectangle((x_pos, y_pos), w, h, linewidth=2,
+                                            edgecolor='black', fill=False))
+            face = plt.Rectangle((x_pos, y_pos), w, h, linewidth=0,
+                                 facecolor='red', alpha=0.6, animated=True)
+            self.ax.add_patch(face)
+            label = self.ax.text(x_pos + 5, y_pos + space_h - 15, space_id,
+                                 fontsize=8, weight='bold', color='white', animated=True)
+            vehicle = self.ax.text(x_pos + 5, y_pos + 10, "",
+                                   fontsize=8, color='white', animated=True)
+
+            artists = [face, label, vehicle]
+            for artist in artists:
+                artist.set_clip_box(region)
+                artist.set_clip_on(True)  # Text is not clipped by default
+            self._space_artists[space_id] = {
+                'region': region, 'artists': artists, 'face': face, 'vehicle': vehicle, 'state': None
+            }
+            self._animated_artists.extend(artists)
+
+        for group_id, x_pos, y_pos, member_count, mini_w, mini_h, minis in layout['groups']:
+            w, h = group_w - 10, group_h - 5
+            region = TransformedBbox(Bbox.from_bounds(x_pos, y_pos, w, h), self.ax.transData)
+
+            self.ax.add_patch(plt.Rectangle((x_pos, y_pos), w, h, linewidth=3,
+                                            edgecolor='blue', fill=False))
+            face = plt.Rectangle((x_pos, y_pos), w, h, linewidth=0,
+                                 facecolor='green', alpha=0.5, animated=True)
+            self.ax.add_patch(face)
+            title = self.ax.text(x_pos + 5, y_pos + group_h - 20, f"{group_id}",
+                                 fontsize=12, fontweight='bold', color='black', animated=True)
+            count_text = self.ax.text(x_pos + 5, y_pos + group_h - 40, "",
+                                      fontsize=9, color='black', animated=True)
+            artists = [face, title, count_text]
+
+            mini_faces = []
+            for member_id, member_idx, mini_x, mini_y in minis:
+                mini_rect = plt.Rectangle((mini_x, mini_y), mini_w - 4, mini_h - 4,
+                                          linewidth=1, edgecolor='black',
+                                          facecolor='green', alpha=0.8, animated=True)
+                self.ax.add_patch(mini_rect)
+                mini_label = self.ax.text(mini_x + 2, mini_y + 2, f"{member_idx + 1}",
+                                          fontsize=6, color='white', animated=True)
+                mini_faces.append((member_id, mini_rect))
+                artists.extend([mini_rect, mini_label])
+
+            for artist in artists:
+                artist.set_clip_box(region)
+                artist.set_clip_on(True)  # Text is not clipped by default
+            self._group_artists[group_id] = {
+                'region': region, 'artists': artists, 'face': face, 'count_text': count_text,
+                'member_count': member_count, 'minis': mini_faces, 'state': None
+            }
+            self._animated_artists.extend(artists)
+
+        # Legend sits below the axes so redrawn cells never paint over it
+        legend_elements = [
+            plt.Rectangle((0, 0), 1, 1, facecolor='green', alpha=0.6),
+            plt.Rectangle((0, 0), 1, 1, facecolor='red', alpha=0.6),
+            plt.Rectangle((0, 0), 1, 1, facecolor='orange', alpha=0.6),
+        ]
+        legend_labels = ['Free', 'Occupied', 'Partially Occupied']
+        self.ax.legend(legend_elements, legend_labels, loc='upper right',
+                       bbox_to_anchor=(1.0, 0.0), ncol=3, frameon=False)
+
+        # Title and timestamp change on every update; both sit outside the axes
+        self.ax.set_title(" ")
+        self.ax.title.set_animated(True)
+        self._timestamp_text = self.ax.text(0, -0.01, "", transform=self.ax.transAxes,
+                                            va='top', fontsize=8, animated=True)
+        self._animated_artists.extend([self.ax.title, self._timestamp_text])
+
+        # Remove axis ticks
+        self.ax.set_xticks([])
+        self.ax.set_yticks([])
+
+    def _apply_space_states(self, parking_data):
+        """Restyle the artists of spaces whose occupancy changed; returns the changed entries"""
+        changed = []
+
+        for space_id, entry in self._space_artists.items():
+            is_occupied = True
+            vehicle_id = None
+            if space_id in parking_data:
+                is_occupied = parking_data[space_id].get('occupied', True)
+                vehicle_id = parking_data[space_id].get('vehicle_id')
+
+            state = (is_occupied, vehicle_id if is_occupied else None)
+            if state == entry['state']:
+                continue
+
+            entry['state'] = state
+            entry['face'].set_facecolor('red' if is_occupied else 'green')
+            entry['vehicle'].set_text(f"V: {vehicle_id}" if is_occupied and vehicle_id else "")
+            changed.append(entry)
+
+        for group_id, entry in self._group_artists.items():
+            group_data = parking_data.get(group_id, {})
+            mini_states = tuple(parking_data[member_id].get('occupied', False)
+                                if member_id in parking_data else False
+                                for member_id, _ in entry['minis'])
+            occupied_count = sum(mini_states)
+
+            # Determine color
+            if group_data.get('occupied', False) or occupied_count == entry['member_count']:
+                color = 'red'  # Fully occupied
+            elif occupied_count > 0:
+                color = 'orange'  # Partially occupied
+            else:
+                color = 'green'  # Free
+
+            state = (color, mini_states)
+            if state == entry['state']:
+                continue
+
+            entry['state'] = state
+            entry['face'].set_facecolor(color)
+            entry['count_text'].set_text(f"({occupied_count}/{entry['member_count']} occupied)")
+            for (_, mini_rect), is_mini_occupied in zip(entry['minis'], mini_states):
+                mini_rect.set_facecolor('red' if is_mini_occupied else 'green')
+            changed.append(entry)
+
+        # Title with stats and timestamp
+        individual = [data for data in parking_data.values() if not data.get('is_group', False)]
+        free_count = sum(1 for data in individual if not data.get('occupied', True))
+        group_count = len(parking_data) - len(individual)
+        self.ax.title.set_text(f"Parking Status: {free_count}/{len(individual)} Available, {group_count} Groups")
+        self._timestamp_text.set_text(f"Updated: {datetime.now().strftime('%H:%M:%S')}")
+
+        return changed
+
+    def _on_canvas_draw(self, event):
+        """Cache the static background after a full draw and paint the animated artists on it"""
+        self._background = self.canvas.copy_from_bbox(self.fig.bbox)
+        for artist in self._animated_artists:
+            self.fig.draw_artist(artist)
+        if self._timestamp_text is not None:
+            self._timestamp_extent = self._timestamp_text.get_window_extent(self.canvas.get_renderer())
+
+    def _restore_background(self, bbox):
+        """Restore part of the cached background; bbox is in display coordinates"""
+        height = self.fig.bbox.height
+        x0, y0, x1, y1 = bbox.extents
+        # The Agg buffer is addressed top-down, display coordinates bottom-up; rounding matches
+        # how Agg rounds clip rectangles, so exactly the pixels of a clipped cell are restored
+        self.canvas.restore_region(self._background,
+                                   bbox=(round(x0), round(height - y1), round(x1), round(height - y0)),
+                                   xy=(0, 0))
+
+    def _blit_changes(self, changed):
+        """Redraw the changed cells, the title and the timestamp, and blit only those regions"""
+        if self._background is None:
+            # No background cached yet: a full draw captures it and paints every artist
+            self.canvas.draw()
+            return
+
+        regions = []
+        for entry in changed:
+            region = entry['region']
+            self._restore_background(region)
+            for artist in entry['artists']:
+                self.fig.draw_artist(artist)
+            regions.append(region)
+
+        # Title strip above the axes
+        title_region = Bbox.from_extents(self.fig.bbox.x0, self.ax.bbox.y1, self.fig.bbox.x1, self.fig.bbox.y1)
+        self._restore_background(title_region)
+        self.fig.draw_artist(self.ax.title)
+        regions.append(title_region)
+
+        # Timestamp, covering both the previous and the new text extent
+        new_extent = self._timestamp_text.get_window_extent(self.canvas.get_renderer())
+        timestamp_region = Bbox.union([self._timestamp_extent, new_extent]).padded(2) \
+            if self._timestamp_extent is not None else new_extent.padded(2)
+        self._restore_background(timestamp_region)
+        self.fig.draw_artist(self._timestamp_text)
+        self._timestamp_extent = new_extent
+        regions.append(timestamp_region)
+
+        # Many small blits cost more than one large one
+        if len(regions) > self.MAX_BLIT_REGIONS:
+            self.canvas.blit(self.fig.bbox)
+        else:
+            for region in regions:
+                self.canvas.blit(region)
+
+    def _parking_data_version(self):
+        """Current version of the shared parking data"""
+        if hasattr(self.app, 'parking_manager'):
+            return getattr(self.app.parking_manager, 'data_version', None)
+        return None
+
+    def _mark_data_changed(self):
+        """Tell every view that the shared parking data was modified"""
+        if hasattr(self.app, 'parking_manager') and hasattr(self.app.parking_manager, 'mark_parking_data_changed'):
+            self.app.parking_manager.mark_parking_data_changed()
+
+    def _is_tab_visible(self):
+        """Check whether this tab is the selected notebook page"""
+        notebook = getattr(self.app, 'main_container', None)
+        if notebook is None:
+            return True
+        try:
+            return notebook.select() == str(self.parent)
+        except Exception:
+            return True
+
+    def _needs_refresh(self, view, force=False):
+        """
+        Check whether a view has to be redrawn
+
+        Views on a hidden tab defer until the tab is selected, and a view that already
+        shows the current parking data version is skipped unless forced.
+
+        Returns:
+            The render key to remember once the view is drawn, or None to skip
+        """
+        if not self._is_tab_visible():
+            return None
+
+        render_key = (self._parking_data_version(), len(getattr(self.app, 'posList', None) or []))
+        if not force and self._rendered_versions.get(view) == render_key:
+            return None
+        return render_key
+
     def are_groups_opposite(self, group1, group2):
         """
         Determine if two groups are in opposite alignments
@@ -516,9 +755,14 @@ class ParkingAllocationTab:
 
     # Keep all other existing methods as they were
 
-    def update_statistics(self):
+    def update_statistics(self, force=False):
         """Update the statistics display"""
         try:
+            render_key = self._needs_refresh('statistics', force)
+            if render_key is None:
+                return
+            self._rendered_versions['statistics'] = render_key
+
             # Get current parking data
             parking_data = {}
             if hasattr(self.app, 'parking_manager'):
@@ -559,6 +803,7 @@ class ParkingAllocationTab:
 
         except Exception as e:
             print(f"Error updating statistics: {str(e)}")
+            self._rendered_versions.pop('statistics', None)
             # Log the full stack trace for debugging
             import traceback
             traceback.print_exc()
@@ -613,6 +858,7 @@ class ParkingAllocationTab:
                         if hasattr(self.app, 'parking_manager'):
                             self.app.parking_manager.parking_data[best_space_id]['occupied'] = True
                             self.app.parking_manager.parking_data[best_space_id]['vehicle_id'] = vehicle_id
+                    self._mark_data_changed()
 
                     # Store allocation
                     self.allocated_vehicles[vehicle_id] = best_space_id
@@ -670,6 +916,7 @@ class ParkingAllocationTab:
                 if best_space_id in parking_data:
                     parking_data[best_space_id]['occupied'] = True
                     parking_data[best_space_id]['vehicle_id'] = vehicle_id
+                    self._mark_data_changed()
 
                     # Store allocation safely with mutex if needed
                     self.allocated_vehicles[vehicle_id] = best_space_id
@@ -743,6 +990,7 @@ class ParkingAllocationTab:
 
             # Remove from allocated vehicles
             del self.allocated_vehicles[vehicle_id]
+            self._mark_data_changed()
 
             # Update UI in main thread - fixed queue_function calls
             self.queue_function(self.update_visualization)
@@ -770,6 +1018,7 @@ class ParkingAllocationTab:
         # Clear allocated vehicles
         self.allocated_vehicles = {}
         self.next_vehicle_id = 1
+        self._mark_data_changed()
 
         # Update UI
         self.update_visualization()
@@ -777,30 +1026,34 @@ class ParkingAllocationTab:
 
         messagebox.showinfo("Simulation Reset", "Simulation has been reset.")
 
+    def process_update_queue(self):
+        """Run the queued UI functions on the main thread, polled with after()"""
+        try:
+            while not self.update_queue.empty():
+                try:
+                    func, args = self.update_queue.get_nowait()
+                    self._discard_pending(func, args)
+                    if callable(func):
+                        try:
+                            func(*args)  # This passes the unpacked tuple as arguments
+                        except Exception as e:
+                            print(f"Error executing queued function: {str(e)}")
+                except queue.Empty:
+                    break
+                except Exception as e:
+                    print(f"Error processing queue item: {str(e)}")
+        except Exception as e:
+            print(f"Queue processing error: {str(e)}")
+
+        if self.running:
+            self.parent.after(100, self.process_update_queue)
+
     def update_loop(self):
-        """Background thread for periodic updates with improved error handling"""
+        """Background thread scheduling periodic updates, which run on the main thread"""
         update_interval = 5  # Update visualization every 5 seconds
         visualization_counter = 0
 
         while self.running:
-            # Process any UI update events in queue
-            try:
-                while not self.update_queue.empty():
-                    try:
-                        func, args = self.update_queue.get_nowait()
-                        if callable(func):
-                            try:
-                                func(*args)  # This passes the unpacked tuple as arguments
-                            except Exception as e:
-                                print(f"Error executing queued function: {str(e)}")
-                    except queue.Empty:
-                        break
-                    except Exception as e:
-                        print(f"Error processing queue item: {str(e)}")
-            except Exception as e:
-                print(f"Queue processing error: {str(e)}")
-                pass
-
             try:
                 # Perform auto-allocation if enabled
                 if hasattr(self, 'auto_allocation_enabled') and self.auto_allocation_enabled.get():
@@ -837,12 +1090,30 @@ class ParkingAllocationTab:
                 # If no args provided, use an empty tuple instead
                 if not args:
                     args = ()
+
+                # Coalesce duplicate pending requests, e.g. redraws queued by several sources
+                try:
+                    with self._pending_lock:
+                        if (func, args) in self._pending_functions:
+                            return
+                        self._pending_functions.add((func, args))
+                except TypeError:
+                    pass  # Unhashable arguments are never coalesced
+
                 self.update_queue.put((func, args))
             else:
                 print(f"Warning: Attempted to queue non-callable object: {func}")
         except Exception as e:
             print(f"Error queuing function: {str(e)}")
 
+    def _discard_pending(self, func, args):
+        """Allow a function to be queued again once it has been taken off the queue"""
+        try:
+            with self._pending_lock:
+                self._pending_functions.discard((func, args))
+        except TypeError:
+            pass
+
     def on_tab_selected(self):
         """Called when this tab is selected"""
         print("Parking allocation tab selected")
@@ -871,6 +1142,7 @@ class ParkingAllocationTab:
                         'distance_to_entrance': x + y,
                         'section': section
                     }
+                self._mark_data_changed()
 
     def cleanup(self):
         """Clean up resources before closing"""
@@ -910,4 +1182,4 @@ class ParkingAllocationTab:
                 best_score = score
                 best_group = group_id
 
-        return best_group, best_score
+        return best_group, best_score
\ No newline at end of file
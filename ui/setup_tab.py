@@ -7,15 +7,42 @@ from tkinter import LEFT
 from tkinter import ttk, NSEW, W, E, LEFT, RIGHT, ACTIVE, DISABLED
 from utils.media_paths import get_reference_image_path
 from utils.resource_manager import save_parking_positions
+from utils.spatial_index import SpatialGrid
+from utils.image_cache import ReferenceImageCache
 from ui.parking_allocation_tab import ParkingAllocationTab
 
 # Import statements...
 
 class SetupTab:
+    # Zoom limits and the zoom below which spaces are drawn without labels and with thin outlines
+    MIN_ZOOM = 0.25
+    MAX_ZOOM = 3.0
+    DETAIL_ZOOM = 0.75
+
+    # Zoomed reference images larger than this many pixels are shown as tiles of TILE_SIZE
+    TILE_SIZE = 512
+    TILE_THRESHOLD = 2048 * 2048
+
     def __init__(self, parent, app):
         self.parent = parent
         self.app = app
 
+        # Persistent canvas items, updated as diffs instead of being redrawn
+        self.zoom = 1.0
+        self.image_id = None
+        self.tile_items = {}  # (tile_x, tile_y) -> (image_id, PhotoImage) of visible tiles
+        self._tile_update_pending = False
+
+        # Decoded reference image pyramids, shared across loads and zoom levels
+        self.image_cache = ReferenceImageCache(max_zoom=self.MAX_ZOOM)
+        self.ref_pyramid = None
+        self.space_items = []  # Per posList index: (rect_id, label_id, position) or None
+        self.highlight_items = {}  # Space index -> highlight rect_id
+        self.group_items = {}  # Group ID -> (rect_id, label_id, bounds)
+
+        # Spatial index over the space boxes (keyed by posList index) for hit-testing
+        self.space_index = SpatialGrid()
+
         # Setup UI components
         self.setup_ui()
 
@@ -43,7 +70,8 @@ class SetupTab:
         ttk.Label(self.setup_control_frame, text="Parking Space Setup",
                   font=("Arial", 12, "bold")).grid(row=0, column=0, columnspan=2, sticky=W, padx=5)
 
-        ttk.Label(self.setup_control_frame, text="Left-click and drag to draw spaces. Right-click to delete spaces.",
+        ttk.Label(self.setup_control_frame, text="Left-click and drag to draw spaces. Right-click to delete spaces. "
+                                                 "Ctrl+wheel to zoom.",
                   font=("Arial", 10)).grid(row=0, column=2, columnspan=3, sticky=W, padx=5)
 
         # Drawing mode frame
@@ -125,7 +153,9 @@ class SetupTab:
         self.v_scrollbar = ttk.Scrollbar(self.setup_canvas_frame, orient="vertical", command=self.setup_canvas.yview)
 
         # Configure canvas to use scrollbars
-        self.setup_canvas.configure(xscrollcommand=self.h_scrollbar.set, yscrollcommand=self.v_scrollbar.set)
+        self.setup_canvas.configure(
+            xscrollcommand=lambda first, last: self._on_canvas_scroll(self.h_scrollbar, first, last),
+            yscrollcommand=lambda first, last: self._on_canvas_scroll(self.v_scrollbar, first, last))
 
         # Grid layout for canvas and scrollbars - FIXED ORDER IS CRUCIAL
         self.setup_canvas.grid(row=0, column=0, sticky=NSEW)
@@ -143,6 +173,11 @@ class SetupTab:
         self.setup_canvas.bind("<Button-4>", self.on_mouse_wheel)         # Linux scroll up
         self.setup_canvas.bind("<Button-5>", self.on_mouse_wheel)         # Linux scroll down
 
+        # Ctrl + mouse wheel zooms
+        self.setup_canvas.bind("<Control-MouseWheel>", self.on_zoom)
+        self.setup_canvas.bind("<Control-Button-4>", self.on_zoom)
+        self.setup_canvas.bind("<Control-Button-5>", self.on_zoom)
+
         # Load reference image
         self.load_reference_image()
 
@@ -171,6 +206,170 @@ class SetupTab:
         # Prevent event propagation to parent widgets
         return "break"
 
+    def on_zoom(self, event):
+        """Zoom the canvas around the mouse pointer"""
+        if event.num == 5 or event.delta < 0:
+            new_zoom = max(self.zoom / 1.25, self.MIN_ZOOM)
+        else:
+            new_zoom = min(self.zoom * 1.25, self.MAX_ZOOM)
+        if new_zoom == self.zoom or self.ref_pyramid is None:
+            return "break"
+
+        # Canvas point under the pointer, so it can be kept there after zooming
+        factor = new_zoom / self.zoom
+        pointer_x = self.setup_canvas.canvasx(event.x) * factor
+        pointer_y = self.setup_canvas.canvasy(event.y) * factor
+
+        was_detailed = self.zoom >= self.DETAIL_ZOOM
+        self.zoom = new_zoom
+        self._show_reference_image()
+
+        # One scale call moves every overlay item, no item is recreated
+        self.setup_canvas.scale("overlay", 0, 0, factor, factor)
+        if (self.zoom >= self.DETAIL_ZOOM) != was_detailed:
+            self._apply_detail_level()
+
+        scroll_width, scroll_height = self.ref_pyramid.zoomed_size(self.zoom)
+        scroll_width, scroll_height = scroll_width + 20, scroll_height + 20
+        self.setup_canvas.xview_moveto(max(pointer_x - event.x, 0) / scroll_width)
+        self.setup_canvas.yview_moveto(max(pointer_y - event.y, 0) / scroll_height)
+        return "break"
+
+    def _apply_detail_level(self):
+        """Show labels and thick outlines only when zoomed in enough to read them"""
+        detailed = self.zoom >= self.DETAIL_ZOOM
+        self.setup_canvas.itemconfigure("space_label", state="normal" if detailed else "hidden")
+        self.setup_canvas.itemconfigure("space_rect", width=2 if detailed else 1)
+
+    def _show_reference_image(self):
+        """Display the reference image at the current zoom from the pyramid level closest to it"""
+        width, height = self.ref_pyramid.zoomed_size(self.zoom)
+
+        # Set the scroll region to be slightly larger than the image
+        # to allow better scrolling around the edges
+        self.setup_canvas.config(scrollregion=(0, 0, width + 20, height + 20))
+
+        self._clear_tiles()
+        if width * height > self.TILE_THRESHOLD:
+            # Huge images: only the tiles in view become PhotoImages
+            if self.image_id is not None:
+                self.setup_canvas.delete(self.image_id)
+                self.image_id = None
+                self.ref_img_tk = None
+            self._schedule_tile_update()
+            return
+
+        self.ref_img_tk = ImageTk.PhotoImage(image=Image.fromarray(self.ref_pyramid.image_at(self.zoom)))
+
+        if self.image_id is None:
+            self.image_id = self.setup_canvas.create_image(0, 0, anchor="nw", image=self.ref_img_tk)
+        else:
+            self.setup_canvas.itemconfigure(self.image_id, image=self.ref_img_tk)
+
+        # Keep the image below the spaces drawn on top of it
+        self.setup_canvas.tag_lower(self.image_id)
+
+    def _on_canvas_scroll(self, scrollbar, first, last):
+        """Update a scrollbar and bring newly visible tiles into view"""
+        scrollbar.set(first, last)
+        self._schedule_tile_update()
+
+    def _schedule_tile_update(self):
+        """Update the visible tiles once the pending scroll/zoom events are handled"""
+        if self.ref_pyramid is None or self.image_id is not None or self._tile_update_pending:
+            return
+        self._tile_update_pending = True
+        self.setup_canvas.after_idle(self._update_visible_tiles)
+
+    def _clear_tiles(self):
+        """Remove all reference image tiles from the canvas"""
+        self.setup_canvas.delete("ref_tile")
+        self.tile_items = {}
+
+    def _update_visible_tiles(self):
+        """Create the tiles that came into view and drop the ones that left it"""
+        self._tile_update_pending = False
+        if self.ref_pyramid is None or self.image_id is not None:
+            return
+
+        zoomed_width, zoomed_height = self.ref_pyramid.zoomed_size(self.zoom)
+        size = self.TILE_SIZE
+        left = max(int(self.setup_canvas.canvasx(0)), 0)
+        top = max(int(self.setup_canvas.canvasy(0)), 0)
+        right = min(left + self.setup_canvas.winfo_width(), zoomed_width - 1)
+        bottom = min(top + self.setup_canvas.winfo_height(), zoomed_height - 1)
+
+        visible = set((tx, ty) for tx in range(left // size, right // size + 1)
+                      for ty in range(top // size, bottom // size + 1))
+
+        for key in [key for key in self.tile_items if key not in visible]:
+            self.setup_canvas.delete(self.tile_items.pop(key)[0])
+
+        for tx, ty in visible:
+            if (tx, ty) in self.tile_items:
+                continue
+            tile = self.ref_pyramid.tile(self.zoom, tx * size, ty * size, size, size)
+            if tile is None:
+                continue
+            photo = ImageTk.PhotoImage(image=Image.fromarray(tile))
+            item_id = self.setup_canvas.create_image(tx * size, ty * size, anchor="nw", image=photo,
+                                                     tags=("ref_tile",))
+            self.tile_items[(tx, ty)] = (item_id, photo)
+
+        # Keep the tiles below the spaces drawn on top of them
+        if self.tile_items:
+            self.setup_canvas.tag_lower("ref_tile")
+
+    def _space_box(self, pos):
+        """Canvas coordinates of a space rectangle at the current zoom"""
+        x, y, w, h = pos
+        return x * self.zoom, y * self.zoom, (x + w) * self.zoom, (y + h) * self.zoom
+
+    def _create_space_item(self, i, pos):
+        """Create the rectangle and label of one parking space"""
+        detailed = self.zoom >= self.DETAIL_ZOOM
+        x1, y1, x2, y2 = self._space_box(pos)
+        rect_id = self.setup_canvas.create_rectangle(
+            x1, y1, x2, y2,
+            outline="magenta", width=2 if detailed else 1,
+            tags=("overlay", "parking_space", "space_rect")
+        )
+        label_id = self.setup_canvas.create_text(
+            (x1 + x2) / 2, (y1 + y2) / 2,
+            text=str(i + 1),
+            fill="white", state="normal" if detailed else "hidden",
+            tags=("overlay", "parking_space", "space_label")
+        )
+        return rect_id, label_id, pos
+
+    def _move_space_item(self, item, pos):
+        """Move an existing space rectangle and label to a new position"""
+        rect_id, label_id, _ = item
+        x1, y1, x2, y2 = self._space_box(pos)
+        self.setup_canvas.coords(rect_id, x1, y1, x2, y2)
+        self.setup_canvas.coords(label_id, (x1 + x2) / 2, (y1 + y2) / 2)
+        return rect_id, label_id, pos
+
+    def _remove_space_items(self, indices):
+        """Delete the canvas items of removed spaces and renumber the spaces after them"""
+        removed = set(i for i in indices if i < len(self.space_items))
+        if not removed:
+            return
+
+        for i in removed:
+            if self.space_items[i] is not None:
+                self.setup_canvas.delete(self.space_items[i][0], self.space_items[i][1])
+        self.space_items = [item for i, item in enumerate(self.space_items) if i not in removed]
+
+        # Space numbers are list positions, so only the labels and index keys after the first removal change
+        first = min(removed)
+        for i in range(first, len(self.space_items) + len(removed)):
+            self.space_index.remove(i)
+        for i in range(first, len(self.space_items)):
+            if self.space_items[i] is not None:
+                self.setup_canvas.itemconfigure(self.space_items[i][1], text=str(i + 1))
+                self.space_index.insert(i, self.space_items[i][2])
+
     def load_reference_image(self, image_name=None):
         """Load and display the reference image for parking space setup"""
         try:
@@ -183,35 +382,28 @@ class SetupTab:
             self.ref_image_path = get_reference_image_path(image_name)
 
             if os.path.exists(self.ref_image_path):
-                self.ref_img = cv2.imread(self.ref_image_path)
-                if self.ref_img is None:
+                # Show at the video dimensions if you know them
+                display_size = None
+                if hasattr(self.app, 'image_width') and hasattr(self.app, 'image_height'):
+                    display_size = (self.app.image_width, self.app.image_height)
+
+                # Decoded pyramid, built once per file version and display size
+                self.ref_pyramid = self.image_cache.get(self.ref_image_path, display_size)
+                if self.ref_pyramid is None:
                     raise Exception(f"Could not load image file: {self.ref_image_path}")
 
                 # Get original dimensions
-                orig_height, orig_width = self.ref_img.shape[:2]
+                orig_width, orig_height = self.ref_pyramid.source_size
 
                 # Store original dimensions if not already defined
                 if image_name not in self.app.reference_dimensions:
                     self.app.reference_dimensions[image_name] = (orig_width, orig_height)
 
-                # Resize to match the video dimensions if you know them
-                if hasattr(self.app, 'image_width') and hasattr(self.app, 'image_height'):
-                    self.ref_img = cv2.resize(self.ref_img, (self.app.image_width, self.app.image_height))
-
-                self.ref_img = cv2.cvtColor(self.ref_img, cv2.COLOR_BGR2RGB)
-                self.ref_img_pil = Image.fromarray(self.ref_img)
-                self.ref_img_tk = ImageTk.PhotoImage(image=self.ref_img_pil)
-
-                # IMPORTANT: Configure canvas for scrolling with correct dimensions
-                image_width = self.ref_img.shape[1]  # Width is at index 1
-                image_height = self.ref_img.shape[0]  # Height is at index 0
+                # RGB image at the display size
+                self.ref_img = self.ref_pyramid.image_at(1.0)
 
-                # Set the scroll region to be slightly larger than the image
-                # to allow better scrolling around the edges
-                self.setup_canvas.config(scrollregion=(0, 0, image_width + 20, image_height + 20))
-
-                # Create the image on the canvas
-                self.image_id = self.setup_canvas.create_image(0, 0, anchor="nw", image=self.ref_img_tk)
+                # Show the image at the current zoom (configures the scroll region too)
+                self._show_reference_image()
 
                 # Reset view to the top-left corner
                 self.setup_canvas.xview_moveto(0)
@@ -232,35 +424,42 @@ class SetupTab:
             self.app.log_event(f"Error loading reference image: {str(e)}")
 
     def draw_parking_spaces(self):
-        """Draw the defined parking spaces on the setup canvas with improved error handling"""
+        """Sync the canvas items with posList, touching only the spaces that were added, moved or removed"""
         try:
-            # First clear any existing rectangles
-            self.setup_canvas.delete("parking_space")
-
-            # Draw each parking space - limit processing to visible spaces
             for i, pos in enumerate(self.app.posList):
                 # Check if pos is a valid tuple with 4 values
-                if isinstance(pos, tuple) and len(pos) == 4:
-                    x, y, w, h = pos
-                    self.setup_canvas.create_rectangle(
-                        x, y, x + w, y + h,
-                        outline="magenta", width=2,
-                        tags=("parking_space", f"space_{i}")
-                    )
-
-                    # Add space number (only if we have less than 50 spaces to avoid performance issues)
-                    if len(self.app.posList) < 50:
-                        self.setup_canvas.create_text(
-                            x + w / 2, y + h / 2,
-                            text=str(i + 1),
-                            fill="white",
-                            tags=("parking_space", f"space_text_{i}")
-                        )
-                elif isinstance(pos, dict):
-                    # Skip dictionaries (group metadata)
+                if not (isinstance(pos, tuple) and len(pos) == 4):
+                    # Dictionaries are group metadata, anything else is invalid
+                    if not isinstance(pos, dict):
+                        print(f"Warning: Invalid position format at index {i}: {pos}")
+                    pos = None
+
+                item = self.space_items[i] if i < len(self.space_items) else None
+                if item is not None and item[2] == pos:
+                    continue
+
+                if item is not None and pos is not None:
+                    self.space_items[i] = self._move_space_item(item, pos)
+                    self.space_index.update(i, pos)
                     continue
+
+                if item is not None:
+                    self.setup_canvas.delete(item[0], item[1])
+                    self.space_index.remove(i)
+                new_item = self._create_space_item(i, pos) if pos is not None else None
+                if pos is not None:
+                    self.space_index.insert(i, pos)
+                if i < len(self.space_items):
+                    self.space_items[i] = new_item
                 else:
-                    print(f"Warning: Invalid position format at index {i}: {pos}")
+                    self.space_items.append(new_item)
+
+            # Remove items of spaces beyond the end of the list
+            for i in range(len(self.app.posList), len(self.space_items)):
+                if self.space_items[i] is not None:
+                    self.setup_canvas.delete(self.space_items[i][0], self.space_items[i][1])
+                    self.space_index.remove(i)
+            del self.space_items[len(self.app.posList):]
         except Exception as e:
             self.app.log_event(f"Error drawing parking spaces: {str(e)}")
 
@@ -311,13 +510,13 @@ class SetupTab:
         end_x = self.setup_canvas.canvasx(event.x)
         end_y = self.setup_canvas.canvasy(event.y)
 
-        # Calculate width and height
-        width = abs(end_x - self.start_x)
-        height = abs(end_y - self.start_y)
+        # Calculate width and height (canvas coordinates are scaled by the zoom)
+        width = abs(end_x - self.start_x) / self.zoom
+        height = abs(end_y - self.start_y) / self.zoom
 
         # Ensure we have the top-left coordinates
-        x_pos = min(self.start_x, end_x)
-        y_pos = min(self.start_y, end_y)
+        x_pos = min(self.start_x, end_x) / self.zoom
+        y_pos = min(self.start_y, end_y) / self.zoom
 
         if self.drawing_mode.get() == "draw":
             # Drawing a parking space - only add if rectangle has meaningful size
@@ -357,13 +556,7 @@ class SetupTab:
                     self.app.update_status_info()
 
                     # Draw the newly added parking space immediately
-                    last_idx = len(self.app.posList) - 1
-                    x, y, w, h = self.app.posList[last_idx]
-                    self.setup_canvas.create_rectangle(
-                        x, y, x + w, y + h,
-                        outline="magenta", width=2,
-                        tags=("parking_space", f"space_{last_idx}")
-                    )
+                    self.draw_parking_spaces()
 
                     # Schedule the allocation update for later to prevent UI freeze
                     self.parent.after(100, self.update_allocation_data)
@@ -382,15 +575,9 @@ class SetupTab:
             selection_coords = [x_pos, y_pos, x_pos + width, y_pos + height]
             sx1, sy1, sx2, sy2 = selection_coords
 
-            # Check each parking space
-            for i, (x, y, w, h) in enumerate(self.app.posList):
-                # Calculate parking space corners
-                px1, py1, px2, py2 = x, y, x + w, y + h
-
-                # Check if parking space intersects with selection box
-                # (not requiring full containment makes it easier to select)
-                if not (px2 < sx1 or px1 > sx2 or py2 < sy1 or py1 > sy2):
-                    self.selected_spaces.append(i)
+            # Spaces intersecting the selection box
+            # (not requiring full containment makes it easier to select)
+            self.selected_spaces = sorted(self.space_index.query_rect(sx1, sy1, sx2, sy2))
 
             # Highlight selected spaces
             self.highlight_selected_spaces()
@@ -403,25 +590,28 @@ class SetupTab:
             self.selection_box = None
 
     def highlight_selected_spaces(self):
-        """Highlight the selected parking spaces"""
-        # Remove any existing highlights
-        self.setup_canvas.delete("space_highlight")
+        """Highlight the selected parking spaces, only adding and removing the highlights that changed"""
+        selected = set(i for i in self.selected_spaces if i < len(self.app.posList))
+
+        # Remove highlights of spaces that are no longer selected
+        for i in [i for i in self.highlight_items if i not in selected]:
+            self.setup_canvas.delete(self.highlight_items.pop(i))
 
-        # Highlight each selected space
-        for i in self.selected_spaces:
-            if i < len(self.app.posList):
-                x, y, w, h = self.app.posList[i]
+        # Highlight newly selected spaces
+        for i in selected:
+            if i not in self.highlight_items:
                 # Create highlight with different color and dash pattern
-                self.setup_canvas.create_rectangle(
-                    x, y, x + w, y + h,
+                self.highlight_items[i] = self.setup_canvas.create_rectangle(
+                    *self._space_box(self.app.posList[i]),
                     outline="cyan", width=3, dash=(5, 3),
-                    tags=("space_highlight", f"highlight_{i}")
+                    tags=("overlay", "space_highlight")
                 )
 
     def clear_selection(self):
         """Clear the current selection"""
         self.selected_spaces = []
         self.setup_canvas.delete("space_highlight")
+        self.highlight_items = {}
         self.selection_status.config(text="No spaces selected")
 
     def group_selected_spaces(self):
@@ -460,9 +650,11 @@ class SetupTab:
         self.clear_selection()
 
     def draw_group_boundaries(self):
-        """Draw boundaries around grouped spaces"""
-        # Clear existing group boundaries
-        self.setup_canvas.delete("group_boundary")
+        """Draw boundaries around grouped spaces, only touching groups whose bounds changed"""
+        # Remove boundaries of groups that no longer exist
+        for group_id in [g for g in self.group_items if not self.space_groups.get(g)]:
+            rect_id, label_id, _ = self.group_items.pop(group_id)
+            self.setup_canvas.delete(rect_id, label_id)
 
         # Draw each group
         for group_id, space_indices in self.space_groups.items():
@@ -474,21 +666,35 @@ class SetupTab:
             min_y = min(self.app.posList[i][1] for i in space_indices)
             max_x = max(self.app.posList[i][0] + self.app.posList[i][2] for i in space_indices)
             max_y = max(self.app.posList[i][1] + self.app.posList[i][3] for i in space_indices)
+            bounds = (min_x, min_y, max_x, max_y)
+
+            item = self.group_items.get(group_id)
+            if item is not None and item[2] == bounds:
+                continue
+
+            box = (min_x * self.zoom - 5, min_y * self.zoom - 5, max_x * self.zoom + 5, max_y * self.zoom + 5)
+            label_pos = (min_x * self.zoom + 10, min_y * self.zoom - 10)
+            if item is not None:
+                self.setup_canvas.coords(item[0], *box)
+                self.setup_canvas.coords(item[1], *label_pos)
+                self.group_items[group_id] = (item[0], item[1], bounds)
+                continue
 
             # Draw a bounding box around the group
-            self.setup_canvas.create_rectangle(
-                min_x - 5, min_y - 5, max_x + 5, max_y + 5,
+            rect_id = self.setup_canvas.create_rectangle(
+                *box,
                 outline="yellow", width=2, dash=(10, 5),
-                tags=("group_boundary", f"group_{group_id}")
+                tags=("overlay", "group_boundary")
             )
 
             # Add group label
-            self.setup_canvas.create_text(
-                min_x + 10, min_y - 10,
+            label_id = self.setup_canvas.create_text(
+                *label_pos,
                 text=group_id,
                 fill="yellow",
-                tags=("group_boundary", f"group_label_{group_id}")
+                tags=("overlay", "group_boundary")
             )
+            self.group_items[group_id] = (rect_id, label_id, bounds)
 
     def delete_selected_spaces(self):
         """Delete all currently selected spaces"""
@@ -527,8 +733,8 @@ class SetupTab:
         self.app.occupied_spaces = self.app.total_spaces
         self.app.update_status_info()
 
-        # Redraw all spaces and groups
-        self.draw_parking_spaces()
+        # Remove the deleted spaces' items and update the groups
+        self._remove_space_items(selected)
         self.draw_group_boundaries()
 
         # Update allocation data
@@ -539,24 +745,25 @@ class SetupTab:
 
     def on_right_click(self, event):
         """Handle right-click to delete a parking space"""
-        # Adjust coordinates for canvas scroll position
-        x = self.setup_canvas.canvasx(event.x)
-        y = self.setup_canvas.canvasy(event.y)
+        # Adjust coordinates for canvas scroll position and zoom
+        x = self.setup_canvas.canvasx(event.x) / self.zoom
+        y = self.setup_canvas.canvasy(event.y) / self.zoom
 
-        # Check if click is inside any parking space
-        for i, (x1, y1, w, h) in enumerate(self.app.posList):
-            if x1 <= x <= x1 + w and y1 <= y <= y1 + h:
-                # Remove from the list
-                self.app.posList.pop(i)
+        # Check if click is inside any parking space (the first one in list order wins)
+        hits = self.space_index.query_point(x, y)
+        if hits:
+            i = min(hits)
 
-                # Update total spaces
-                self.app.total_spaces = len(self.app.posList)
-                self.app.occupied_spaces = self.app.total_spaces
-                self.app.update_status_info()
+            # Remove from the list
+            self.app.posList.pop(i)
 
-                # Redraw all spaces
-                self.draw_parking_spaces()
-                break
+            # Update total spaces
+            self.app.total_spaces = len(self.app.posList)
+            self.app.occupied_spaces = self.app.total_spaces
+            self.app.update_status_info()
+
+            # Remove only this space's items
+            self._remove_space_items([i])
 
     def shift_all_spaces(self, dx, dy):
         """Shift all parking spaces by dx, dy"""
@@ -564,8 +771,13 @@ class SetupTab:
             x, y, w, h = self.app.posList[i]
             self.app.posList[i] = (x + dx, y + dy, w, h)
 
-        # Redraw spaces
-        self.draw_parking_spaces()
+        # Move every overlay item with one canvas call and keep the cached positions in sync
+        self.setup_canvas.move("overlay", dx * self.zoom, dy * self.zoom)
+        self.space_items = [(item[0], item[1], self.app.posList[i]) if item is not None else None
+                            for i, item in enumerate(self.space_items)]
+        self.space_index.rebuild((i, item[2]) for i, item in enumerate(self.space_items) if item is not None)
+        for group_id, (rect_id, label_id, (x1, y1, x2, y2)) in list(self.group_items.items()):
+            self.group_items[group_id] = (rect_id, label_id, (x1 + dx, y1 + dy, x2 + dx, y2 + dy))
         self.app.log_event(f"Shifted all spaces by ({dx}, {dy})")
 
     def add_position(self, event):
@@ -753,6 +965,7 @@ class SetupTab:
                 # Also clear any parking data
                 if hasattr(self.app.parking_manager, 'parking_data'):
                     self.app.parking_manager.parking_data = {}
+                    self.app.parking_manager.mark_parking_data_changed()
 
             # Delete all parking position files for the current reference image
             if self.app.current_reference_image:
@@ -798,8 +1011,8 @@ class SetupTab:
 
             # Update any other UI components
             if hasattr(self.app, 'allocation_tab'):
-                self.parent.after(100, lambda: self.app.allocation_tab.update_visualization())
-                self.parent.after(200, lambda: self.app.allocation_tab.update_statistics())
+                self.app.allocation_tab.queue_function(self.app.allocation_tab.update_visualization)
+                self.app.allocation_tab.queue_function(self.app.allocation_tab.update_statistics)
 
             # Log the action
             self.app.log_event("All parking spaces cleared and saved files removed")
@@ -916,10 +1129,12 @@ class SetupTab:
                     'first_processed': False  # Mark as not yet processed by detection
                 }
 
+            self.app.parking_manager.mark_parking_data_changed()
+
             # Update the UI elements if the application has the allocation tab
             if hasattr(self.app, 'allocation_tab'):
-                self.parent.after(100, lambda: self.app.allocation_tab.update_visualization())
-                self.parent.after(200, lambda: self.app.allocation_tab.update_statistics())
+                self.app.allocation_tab.queue_function(self.app.allocation_tab.update_visualization)
+                self.app.allocation_tab.queue_function(self.app.allocation_tab.update_statistics)
 
             self.app.log_event(f"Updated allocation data with {len(self.app.posList)} parking spaces")
         except Exception as e:
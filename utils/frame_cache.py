@@ -0,0 +1,88 @@
+"""
+Per-frame cache of intermediate images shared by the detection engines
+"""
+import threading
+
+import cv2
+
+
+class FrameIntermediates:
+    """
+    Intermediate products of one frame, computed lazily at most once
+
+    Engines running on the same frame (possibly in different threads) ask for the products
+    they need; the first request computes a product and later ones reuse it. Products are
+    marked read-only, since every engine shares the same array. Frame differencing reuses
+    the previous frame's grayscale image; only that array is kept, not the previous
+    intermediates themselves, so chaining frames never keeps more than one frame back alive.
+    """
+
+    _MISSING = object()
+
+    def __init__(self, frame, previous=None):
+        """
+        Args:
+            frame: BGR frame (not modified)
+            previous: Optional FrameIntermediates of the previous frame; its grayscale image
+                      is taken now (computed if needed) and the object is not referenced
+        """
+        self.frame = frame
+        self._previous_gray = previous.gray() if previous is not None else None
+        self._products = {}
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def get(self, key, compute):
+        """
+        Get a product, computing it on first use
+
+        Args:
+            key: Hashable product key
+            compute: Function returning the product
+
+        Returns:
+            The cached product (read-only if it is an array)
+        """
+        value = self._products.get(key, self._MISSING)
+        if value is not self._MISSING:
+            return value
+
+        # One lock per product, so engines computing different products do not wait on each other
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            value = self._products.get(key, self._MISSING)
+            if value is self._MISSING:
+                value = compute()
+                if hasattr(value, 'flags'):
+                    value.flags.writeable = False
+                self._products[key] = value
+        return value
+
+    def gray(self):
+        """Grayscale frame"""
+        return self.get('gray', lambda: cv2.cvtColor(self.frame, cv2.COLOR_BGR2GRAY))
+
+    def blurred(self, ksize=(3, 3), sigma=0):
+        """Gaussian blurred grayscale frame"""
+        return self.get(('blurred', ksize, sigma), lambda: cv2.GaussianBlur(self.gray(), ksize, sigma))
+
+    def downscaled(self, scale):
+        """Grayscale frame resized by a factor"""
+        return self.get(('downscaled', scale),
+                        lambda: cv2.resize(self.gray(), None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA))
+
+    @property
+    def has_previous(self):
+        return self._previous_gray is not None
+
+    def previous_gray(self):
+        """Grayscale previous frame, or None without a previous frame"""
+        return self._previous_gray
+
+    def difference(self):
+        """Absolute grayscale difference to the previous frame, or None without a previous frame"""
+        if self._previous_gray is None:
+            return None
+        return self.get('difference', lambda: cv2.absdiff(self._previous_gray, self.gray()))
\ No newline at end of file
@@ -0,0 +1,193 @@
+"""
+Decoded image pyramids for reference images, cached per file
+"""
+import os
+from collections import OrderedDict
+
+import cv2
+from PIL import Image
+
+
+class ImagePyramid:
+    """
+    Reference image decoded once and kept as a stack of halving resolutions
+
+    Scales are relative to the display size the image is shown at (the video dimensions),
+    so zoom 1.0 is the display size. Each request is served from the smallest level that
+    still has enough pixels, and huge zoomed images can be cut into tiles so only the
+    visible part has to be produced.
+    """
+
+    def __init__(self, levels, display_size, source_size):
+        """
+        Args:
+            levels: List of RGB arrays, largest first, each about half the previous one
+            display_size: (width, height) the image is shown at for zoom 1.0
+            source_size: (width, height) of the image file
+        """
+        self.levels = levels
+        self.display_size = display_size
+        self.source_size = source_size
+        self.scales = [level.shape[1] / display_size[0] for level in levels]
+
+    @property
+    def width(self):
+        return self.display_size[0]
+
+    @property
+    def height(self):
+        return self.display_size[1]
+
+    def nbytes(self):
+        """Memory used by all levels"""
+        return sum(level.nbytes for level in self.levels)
+
+    def level_for(self, zoom):
+        """Index of the smallest level with at least the requested resolution"""
+        for i in range(len(self.levels) - 1, -1, -1):
+            if self.scales[i] >= zoom:
+                return i
+        return 0
+
+    def zoomed_size(self, zoom):
+        """Size of the whole image at a zoom level"""
+        return max(int(round(self.width * zoom)), 1), max(int(round(self.height * zoom)), 1)
+
+    def image_at(self, zoom):
+        """RGB array of the whole image at a zoom level"""
+        i = self.level_for(zoom)
+        size = self.zoomed_size(zoom)
+        level = self.levels[i]
+        if (level.shape[1], level.shape[0]) == size:
+            return level
+        interpolation = cv2.INTER_AREA if self.scales[i] > zoom else cv2.INTER_LINEAR
+        return cv2.resize(level, size, interpolation=interpolation)
+
+    def tile(self, zoom, x, y, w, h):
+        """
+        RGB array of one region of the image at a zoom level
+
+        Args:
+            zoom: Zoom level
+            x, y, w, h: Region in zoomed image coordinates (clipped to the image)
+
+        Returns:
+            The region, or None when it lies outside the image
+        """
+        zoomed_w, zoomed_h = self.zoomed_size(zoom)
+        x2, y2 = min(x + w, zoomed_w), min(y + h, zoomed_h)
+        x, y = max(x, 0), max(y, 0)
+        if x2 <= x or y2 <= y:
+            return None
+
+        # Matching region of the level, resized to the tile size
+        i = self.level_for(zoom)
+        level = self.levels[i]
+        factor = self.scales[i] / zoom
+        lx1, ly1 = int(x * factor), int(y * factor)
+        lx2 = min(max(int(round(x2 * factor)), lx1 + 1), level.shape[1])
+        ly2 = min(max(int(round(y2 * factor)), ly1 + 1), level.shape[0])
+        region = level[ly1:ly2, lx1:lx2]
+        interpolation = cv2.INTER_AREA if factor > 1 else cv2.INTER_LINEAR
+        return cv2.resize(region, (x2 - x, y2 - y), interpolation=interpolation)
+
+
+class ReferenceImageCache:
+    """
+    LRU cache of image pyramids keyed on file path, modification time and display size
+
+    The file is decoded at the lowest resolution that still covers the largest zoom
+    (using OpenCV's reduced decoding for big JPEGs), so an 8K overview shown at 1280x720
+    never holds the full-resolution image in memory.
+    """
+
+    def __init__(self, max_entries=4, max_zoom=3.0, min_level_width=256):
+        """
+        Args:
+            max_entries: Number of pyramids kept in memory
+            max_zoom: Largest zoom that should get full detail
+            min_level_width: Pyramid levels stop below this width
+        """
+        self.max_entries = max_entries
+        self.max_zoom = max_zoom
+        self.min_level_width = min_level_width
+        self._entries = OrderedDict()
+
+    def clear(self):
+        """Drop all cached pyramids"""
+        self._entries.clear()
+
+    def get(self, path, display_size=None):
+        """
+        Get the pyramid of an image file, building it on first use or when the file changed
+
+        Args:
+            path: Image file path
+            display_size: (width, height) the image is shown at, defaults to the file's size
+
+        Returns:
+            ImagePyramid, or None if the file cannot be read
+        """
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+
+        key = (os.path.abspath(path), mtime, tuple(display_size) if display_size else None)
+        pyramid = self._entries.get(key)
+        if pyramid is not None:
+            self._entries.move_to_end(key)
+            return pyramid
+
+        pyramid = self._build(path, display_size)
+        if pyramid is None:
+            return None
+
+        # Older versions of the same file are stale
+        for old_key in [k for k in self._entries if k[0] == key[0]]:
+            del self._entries[old_key]
+
+        self._entries[key] = pyramid
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return pyramid
+
+    def _build(self, path, display_size):
+        """Decode an image file and build its pyramid"""
+        # Read only the header to learn the size before decoding
+        try:
+            with Image.open(path) as header:
+                source_size = header.size
+        except Exception:
+            return None
+
+        display_size = tuple(display_size) if display_size else source_size
+
+        # Resolution needed for the largest zoom, never more than the file has
+        base_scale = max(min(source_size[0] / display_size[0], self.max_zoom), 1.0)
+        base_size = (max(int(display_size[0] * base_scale), 1), max(int(display_size[1] * base_scale), 1))
+
+        # Decode at a reduced size when the file is much larger than needed
+        flags = cv2.IMREAD_COLOR
+        for reduction, flag in ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4),
+                                (2, cv2.IMREAD_REDUCED_COLOR_2)):
+            if source_size[0] // reduction >= base_size[0] and source_size[1] // reduction >= base_size[1]:
+                flags = flag
+                break
+
+        image = cv2.imread(path, flags)
+        if image is None:
+            return None
+
+        if (image.shape[1], image.shape[0]) != base_size:
+            interpolation = cv2.INTER_AREA if image.shape[1] > base_size[0] else cv2.INTER_LINEAR
+            image = cv2.resize(image, base_size, interpolation=interpolation)
+        levels = [cv2.cvtColor(image, cv2.COLOR_BGR2RGB)]
+
+        # Halve until the levels get too small to be useful
+        while levels[-1].shape[1] // 2 >= self.min_level_width and levels[-1].shape[0] // 2 >= 1:
+            previous = levels[-1]
+            levels.append(cv2.resize(previous, (previous.shape[1] // 2, previous.shape[0] // 2),
+                                     interpolation=cv2.INTER_AREA))
+
+        return ImagePyramid(levels, display_size, source_size)
\ No newline at end of file
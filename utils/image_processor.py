@@ -1,6 +1,22 @@
 import cv2
 import numpy as np
 
+from models.centroid_tracker import CentroidTracker
+
+
+def preprocess_parking_frame(img):
+    """Binary edge image of a BGR frame, used to decide whether parking spaces are occupied"""
+    imgGray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    imgBlur = cv2.GaussianBlur(imgGray, (3, 3), 1)
+    imgThreshold = cv2.adaptiveThreshold(imgBlur, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                         cv2.THRESH_BINARY_INV, 25, 16)
+    imgProcessed = cv2.medianBlur(imgThreshold, 5)
+
+    # Apply dilation and erosion to clean up
+    kernel = np.ones((3, 3), np.uint8)
+    imgProcessed = cv2.dilate(imgProcessed, kernel, iterations=1)
+    return cv2.erode(imgProcessed, kernel, iterations=1)
+
 
 def process_parking_spaces(img_pro, img, pos_list, threshold, debug=False, space_groups=None):
     """Process and mark parking spaces in the image - with group support"""
@@ -145,14 +161,142 @@ def process_parking_spaces(img_pro, img, pos_list, threshold, debug=False, space
     return img_display, free_spaces, occupied_spaces, total_spaces
 
 
+class CountingRegion:
+    """
+    Part of the frame that motion detection processes for vehicle counting
+
+    Either a horizontal band centred on the counting line or the bounding box of ROI
+    polygons, with the pixels outside the polygons masked out. Detectors work on cropped
+    views of the region only, so their cost drops with its area; the margin around the
+    line gives the tracker room to pick vehicles up before they reach it.
+
+    The crop extends `context` pixels beyond the region, so a vehicle straddling its edge
+    is seen whole rather than cut; from_crop() then keeps only the boxes whose centroid
+    lies in the region itself.
+    """
+
+    def __init__(self, frame_shape, line_height=None, band_height=None, polygons=None, context=48):
+        """
+        Args:
+            frame_shape: Shape of the frames the region applies to
+            line_height: Y coordinate of the counting line (centre of the band)
+            band_height: Height of the band in pixels
+            polygons: Optional list of ROI polygons as (x, y) points, used instead of the band
+            context: Pixels processed around the region for whole vehicles at its edge
+        """
+        height, width = frame_shape[:2]
+        self.polygons = [np.asarray(p, dtype=np.int32).reshape(-1, 2) for p in polygons] if polygons else []
+
+        if self.polygons:
+            points = np.concatenate(self.polygons)
+            x1 = int(np.clip(points[:, 0].min(), 0, width - 1))
+            y1 = int(np.clip(points[:, 1].min(), 0, height - 1))
+            x2 = int(np.clip(points[:, 0].max() + 1, x1 + 1, width))
+            y2 = int(np.clip(points[:, 1].max() + 1, y1 + 1, height))
+        else:
+            half = band_height // 2
+            x1, x2 = 0, width
+            y1 = int(np.clip(line_height - half, 0, height - 1))
+            y2 = int(np.clip(line_height + half, y1 + 1, height))
+        self.bounds = (x1, y1, x2, y2)  # Detections count when their centroid is in here
+
+        self.context = max(0, int(context))
+        cx1, cy1 = max(0, x1 - self.context), max(0, y1 - self.context)
+        cx2, cy2 = min(width, x2 + self.context), min(height, y2 + self.context)
+        self.crop_bounds = (cx1, cy1, cx2, cy2)  # Pixels that are processed
+
+        # With polygons: the polygons themselves for the centroid test, grown by the context
+        # for the processing mask
+        self.mask = None
+        self._inside = None
+        if self.polygons:
+            self._inside = np.zeros((cy2 - cy1, cx2 - cx1), dtype=np.uint8)
+            cv2.fillPoly(self._inside, [p - (cx1, cy1) for p in self.polygons], 255)
+            self.mask = self._inside
+            if self.context:
+                kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2 * self.context + 1, 2 * self.context + 1))
+                self.mask = cv2.dilate(self._inside, kernel)
+        self._scaled_masks = {}
+
+    def area_fraction(self, frame_shape):
+        """Share of the frame's pixels that are processed"""
+        x1, y1, x2, y2 = self.crop_bounds
+        return (x2 - x1) * (y2 - y1) / float(frame_shape[0] * frame_shape[1])
+
+    def crop(self, image):
+        """View of the region and its context in a full frame (no copy)"""
+        x1, y1, x2, y2 = self.crop_bounds
+        return image[y1:y2, x1:x2]
+
+    def apply_mask(self, mask):
+        """Clear the pixels of a cropped (possibly downscaled) binary mask outside the polygons"""
+        if self.mask is None:
+            return mask
+
+        region_mask = self.mask
+        if mask.shape != region_mask.shape:
+            region_mask = self._scaled_masks.get(mask.shape)
+            if region_mask is None:
+                region_mask = cv2.resize(self.mask, (mask.shape[1], mask.shape[0]), interpolation=cv2.INTER_NEAREST)
+                self._scaled_masks[mask.shape] = region_mask
+        return cv2.bitwise_and(mask, region_mask)
+
+    def to_frame(self, boxes):
+        """Shift (N, 4) boxes from crop to frame coordinates"""
+        x1, y1 = self.crop_bounds[:2]
+        return boxes + np.array([x1, y1, 0, 0], dtype=boxes.dtype)
+
+    def from_crop(self, boxes):
+        """
+        Boxes found in the crop, in frame coordinates, keeping those centred in the region
+
+        Args:
+            boxes: (N, 4) array of (x, y, w, h) boxes in crop coordinates
+
+        Returns:
+            (M, 4) array of the boxes whose centroid (x + w // 2, y + h // 2) lies in the
+            band, or inside the polygons
+        """
+        boxes = self.to_frame(boxes)
+        if not len(boxes):
+            return boxes
+        cx = boxes[:, 0] + boxes[:, 2] // 2
+        cy = boxes[:, 1] + boxes[:, 3] // 2
+        x1, y1, x2, y2 = self.bounds
+        keep = (cx >= x1) & (cx < x2) & (cy >= y1) & (cy < y2)
+        if self._inside is not None:
+            ox, oy = self.crop_bounds[:2]
+            rows = np.clip(cy - oy, 0, self._inside.shape[0] - 1)
+            cols = np.clip(cx - ox, 0, self._inside.shape[1] - 1)
+            keep &= self._inside[rows, cols] > 0
+        return boxes[keep]
+
+    def draw(self, frame, color=(128, 128, 128)):
+        """Outline the processed region"""
+        if self.polygons:
+            cv2.polylines(frame, self.polygons, True, color, 1)
+        else:
+            x1, y1, x2, y2 = self.bounds
+            cv2.rectangle(frame, (x1, y1), (x2 - 1, y2 - 1), color, 1)
+
+
 def detect_vehicles_traditional(current_frame, prev_frame, line_height, min_contour_width, min_contour_height, offset,
-                                matches, vehicles_count):
+                                matches, vehicles_count, region=None, zones=None):
     """
     Detect vehicles using traditional computer vision - optimized version
+
+    `matches` is the CentroidTracker carried between frames (anything else starts a new
+    one) and is returned as new_matches. With a CountingRegion only that part of the
+    frames is processed; with CountingZones they replace the horizontal line.
     """
     # Only create a copy of the frame if we need to draw on it
     display_frame = current_frame.copy()
 
+    if region is not None:
+        current_frame = region.crop(current_frame)
+        prev_frame = region.crop(prev_frame)
+        region.draw(display_frame)
+
     # Calculate absolute difference between frames
     d = cv2.absdiff(prev_frame, current_frame)
     grey = cv2.cvtColor(d, cv2.COLOR_BGR2GRAY)
@@ -166,56 +310,138 @@ def detect_vehicles_traditional(current_frame, prev_frame, line_height, min_cont
     kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2, 2))
     closing = cv2.morphologyEx(cv2.dilate(th, np.ones((3, 3))), cv2.MORPH_CLOSE, kernel)
 
-    # Find contours - use EXTERNAL type for faster processing
-    contours, h = cv2.findContours(closing, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    # Blobs of moving pixels, all of them (no truncation)
+    if region is not None:
+        closing = region.apply_mask(closing)
+    boxes, _ = extract_blobs(closing, min_contour_width, min_contour_height)
+    if region is not None:
+        boxes = region.from_crop(boxes)
 
-    # Make a copy of matches only if needed (if we have contours)
-    if not contours:
-        # Draw detection line
-        cv2.line(display_frame, (0, line_height), (display_frame.shape[1], line_height), (0, 255, 0), 2)
-        cv2.putText(display_frame, f"Total Vehicle Detected: {vehicles_count}",
-                    (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 170, 0), 2)
-        return display_frame, matches, vehicles_count
+    return annotate_vehicle_boxes(display_frame, boxes, line_height, offset, matches, vehicles_count, zones)
 
-    matches_copy = matches.copy()
 
-    # Draw detection line
-    cv2.line(display_frame, (0, line_height), (display_frame.shape[1], line_height), (0, 255, 0), 2)
+def extract_blobs(mask, min_width, min_height):
+    """
+    Bounding boxes and centroids of the blobs in a binary mask
 
-    # Process each contour - reduce the number processed if there are too many
-    max_contours = 50  # Maximum contours to process for performance
-    for (i, c) in enumerate(contours[:max_contours]):
-        (x, y, w, h) = cv2.boundingRect(c)
-        contour_valid = (w >= min_contour_width) and (h >= min_contour_height)
+    Uses connectedComponentsWithStats, so size filtering and centroids are array
+    operations over all blobs at once. Labels are 16-bit (about twice as fast as the
+    default 32-bit labels); masks with more than 65535 blobs fall back to 32-bit.
 
-        if not contour_valid:
-            continue
+    Args:
+        mask: Binary image (non-zero = foreground)
+        min_width, min_height: Minimum blob size
 
-        # Draw rectangle around vehicle
-        cv2.rectangle(display_frame, (x - 10, y - 10), (x + w + 10, y + h + 10), (255, 0, 0), 2)
+    Returns:
+        (boxes, centroids): int arrays of shape (N, 4) as (x, y, w, h) and (N, 2) as
+        the box centres (x + w // 2, y + h // 2)
+    """
+    try:
+        _, _, stats, _ = cv2.connectedComponentsWithStatsWithAlgorithm(mask, 8, cv2.CV_16U, cv2.CCL_SPAGHETTI)
+    except cv2.error:
+        _, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
 
-        # Calculate centroid
-        cx = x + w // 2
-        cy = y + h // 2
-        centroid = (cx, cy)
+    # Row 0 is the background
+    boxes = stats[1:, :4]
+    boxes = boxes[(boxes[:, 2] >= min_width) & (boxes[:, 3] >= min_height)]
+    centroids = boxes[:, :2] + boxes[:, 2:4] // 2
+    return boxes, centroids
 
-        # Add centroid to matches list
-        matches_copy.append(centroid)
 
-        # Draw centroid
-        cv2.circle(display_frame, centroid, 5, (0, 255, 0), -1)
+# Pixel offsets of a filled radius-5 dot, used to draw all centroids in one indexing operation
+_DOT_DY, _DOT_DX = np.nonzero(cv2.circle(np.zeros((11, 11), np.uint8), (5, 5), 5, 1, -1))
+_DOT_DY, _DOT_DX = _DOT_DY - 5, _DOT_DX - 5
 
-    # Count vehicles crossing the line
-    new_vehicles_count = vehicles_count
-    new_matches = []
 
-    for (x, y) in matches_copy:
-        # Check if centroid is near the line
-        if line_height - offset < y < line_height + offset:
-            new_vehicles_count += 1
-        else:
-            # Keep centroids that haven't crossed the line
-            new_matches.append((x, y))
+def draw_blobs(frame, boxes, centroids=None, expand=10, box_color=(255, 0, 0), dot_color=(0, 255, 0)):
+    """
+    Draw expanded blob boxes and centroid dots
+
+    Args:
+        frame: BGR image to draw on (modified in place)
+        boxes: (N, 4) array of (x, y, w, h) boxes
+        centroids: Optional (N, 2) array of centroid points
+        expand: Pixels added around each box
+        box_color, dot_color: BGR colors
+    """
+    boxes = np.asarray(boxes, dtype=np.int32).reshape(-1, 4)
+    if len(boxes):
+        x1 = boxes[:, 0] - expand
+        y1 = boxes[:, 1] - expand
+        x2 = boxes[:, 0] + boxes[:, 2] + expand
+        y2 = boxes[:, 1] + boxes[:, 3] + expand
+        corners = np.stack([x1, y1, x2, y1, x2, y2, x1, y2], axis=1).reshape(-1, 4, 2)
+        cv2.polylines(frame, corners, True, box_color, 2)
+
+    if centroids is not None and len(centroids):
+        centroids = np.asarray(centroids, dtype=np.int64).reshape(-1, 2)
+        ys = (centroids[:, 1:2] + _DOT_DY).ravel()
+        xs = (centroids[:, 0:1] + _DOT_DX).ravel()
+        inside = (ys >= 0) & (ys < frame.shape[0]) & (xs >= 0) & (xs < frame.shape[1])
+        frame[ys[inside], xs[inside]] = dot_color
+
+
+def count_line_crossings(matches, centroids, line_y, offset, labels=None, zones=None):
+    """
+    Track centroids between frames and count each vehicle once when it reaches the line
+
+    Args:
+        matches: CentroidTracker from the previous frame (anything else, e.g. the
+                 legacy list of centroids, starts a new tracker)
+        centroids: (N, 2) array of new centroids
+        line_y: Y coordinate of the counting line
+        offset: Distance from the line within which a centroid counts as crossing
+        labels: Optional class name of each centroid
+        zones: Optional CountingZones, used instead of the horizontal line
+
+    Returns:
+        (tracker, crossed): the updated tracker and the number of vehicles counted
+    """
+    tracker = matches if isinstance(matches, CentroidTracker) else CentroidTracker()
+    if zones:
+        tracker.update(centroids, labels=labels)
+        _, previous, current, classes = tracker.last_moves
+        return tracker, zones.update(previous, current, classes)
+
+    crossed = tracker.update(centroids, line_y, offset, labels)
+    return tracker, crossed
+
+
+def draw_counting_geometry(frame, line_height, zones=None):
+    """Draw the configured counting lines and zones, or the default horizontal line"""
+    if zones:
+        zones.draw(frame)
+    else:
+        cv2.line(frame, (0, line_height), (frame.shape[1], line_height), (0, 255, 0), 2)
+
+
+def annotate_vehicle_boxes(display_frame, boxes, line_height, offset, matches, vehicles_count, zones=None):
+    """
+    Draw detected vehicle boxes, update the line-crossing count and draw the counter
+
+    Args:
+        display_frame: Frame to draw on (modified in place)
+        boxes: Vehicle boxes as an (N, 4) array or list of (x, y, w, h) in display_frame coordinates
+        line_height: Y coordinate of the counting line
+        offset: Distance from the line within which a centroid counts as crossing
+        matches: CentroidTracker carried between frames
+        vehicles_count: Current vehicle count
+        zones: Optional CountingZones, used instead of the horizontal line
+
+    Returns:
+        (display_frame, new_matches, new_vehicles_count)
+    """
+    # Draw detection line
+    draw_counting_geometry(display_frame, line_height, zones)
+
+    # Box centres, then boxes and centroids drawn in one go
+    boxes = np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+    centroids = boxes[:, :2] + boxes[:, 2:4] // 2
+    draw_blobs(display_frame, boxes, centroids)
+
+    # Count vehicles crossing the line, once per track
+    new_matches, crossed = count_line_crossings(matches, centroids, line_height, offset, zones=zones)
+    new_vehicles_count = vehicles_count + crossed
 
     # Display vehicle count
     cv2.putText(display_frame, f"Total Vehicle Detected: {new_vehicles_count}",
@@ -224,15 +450,15 @@ def detect_vehicles_traditional(current_frame, prev_frame, line_height, min_cont
     return display_frame, new_matches, new_vehicles_count
 
 
-def process_ml_detections(frame, detections, line_height, offset, matches, vehicles_count, class_names):
+def process_ml_detections(frame, detections, line_height, offset, matches, vehicles_count, class_names, zones=None):
     """Process detections from ML model - optimized version"""
     display_frame = frame.copy()
 
     # Draw detection line
-    cv2.line(display_frame, (0, line_height), (display_frame.shape[1], line_height), (0, 255, 0), 2)
+    draw_counting_geometry(display_frame, line_height, zones)
 
-    # Make a deep copy of matches list
-    matches_copy = matches.copy() if matches is not None else []
+    centroids = []
+    labels = []
 
     # Handle case where detections might be None
     if detections is None:
@@ -262,26 +488,21 @@ def process_ml_detections(frame, detections, line_height, offset, matches, vehic
         centroid = (cx, cy)
 
         # Only add label if score is high enough (optimization)
+        class_name = class_names[label] if label < len(class_names) else f"Class {label}"
         if score > 0.6:
-            class_name = class_names[label] if label < len(class_names) else f"Class {label}"
             cv2.putText(display_frame, f"{class_name}: {score:.2f}",
                         (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
 
         # Add centroid
-        matches_copy.append(centroid)
+        centroids.append(centroid)
+        labels.append(class_name)
 
         # Draw centroid
         cv2.circle(display_frame, centroid, 5, (0, 0, 255), -1)
 
-    # Count vehicles crossing the line
-    new_vehicles_count = vehicles_count
-    new_matches = []
-
-    for (x, y) in matches_copy:
-        if line_height - offset < y < line_height + offset:
-            new_vehicles_count += 1
-        else:
-            new_matches.append((x, y))
+    # Count vehicles crossing the line, once per track
+    new_matches, crossed = count_line_crossings(matches, centroids, line_height, offset, labels, zones)
+    new_vehicles_count = vehicles_count + crossed
 
     # Display vehicle count
     cv2.putText(display_frame, f"Total Vehicle Detected: {new_vehicles_count}",
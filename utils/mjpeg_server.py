@@ -0,0 +1,275 @@
+"""
+Built-in HTTP server streaming the annotated frames as MJPEG
+"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+
+
+class FrameBroadcaster:
+    """
+    Latest-frame JPEG encoder shared by all viewers
+
+    publish() only stores a reference to the newest frame and wakes the encoder thread,
+    so the processing loop never waits for encoding or for viewers. The encoder turns the
+    newest frame into a JPEG at most once, and only while someone is watching. Viewers
+    always take the newest JPEG, so a slow viewer skips frames instead of queueing them.
+    """
+
+    def __init__(self, quality=80, max_fps=15):
+        """
+        Args:
+            quality: JPEG quality (0-100)
+            max_fps: Upper bound on encoded frames per second
+        """
+        self.quality = quality
+        self.min_interval = 1.0 / max_fps if max_fps else 0.0
+
+        self._frame = None  # Newest published BGR frame
+        self._frame_seq = 0
+        self._jpeg = None  # Newest encoded JPEG bytes
+        self._jpeg_seq = 0  # Frame sequence number the JPEG was made from
+        self._viewers = 0
+        self._snapshot_waiters = 0
+
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._running
+
+    def start(self):
+        """Start the encoder thread"""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._encode_loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the encoder thread and wake all waiting viewers"""
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def publish(self, frame):
+        """
+        Hand over the newest annotated frame (the caller must not modify it afterwards)
+
+        Args:
+            frame: BGR image
+        """
+        with self._condition:
+            self._frame = frame
+            self._frame_seq += 1
+            self._condition.notify_all()
+
+    def add_viewer(self):
+        with self._condition:
+            self._viewers += 1
+            self._condition.notify_all()
+
+    def remove_viewer(self):
+        with self._condition:
+            self._viewers = max(self._viewers - 1, 0)
+
+    def wait_for_jpeg(self, last_seq, timeout=5.0):
+        """
+        Wait for a JPEG newer than the one a viewer already has
+
+        Args:
+            last_seq: Sequence number of the viewer's last frame (0 for none)
+            timeout: Seconds to wait
+
+        Returns:
+            (seq, jpeg_bytes) of the newest JPEG, or None on timeout or shutdown
+        """
+        deadline = time.time() + timeout
+        with self._condition:
+            while self._running and self._jpeg_seq <= last_seq:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None
+                self._condition.wait(remaining)
+            if not self._running:
+                return None
+            return self._jpeg_seq, self._jpeg
+
+    def snapshot(self, timeout=2.0):
+        """JPEG bytes of the newest frame, encoded on demand when nobody is streaming"""
+        with self._condition:
+            if self._frame_seq == 0:
+                return None
+            if self._jpeg_seq == self._frame_seq:
+                return self._jpeg
+
+            # Ask the encoder for the newest frame and wait for it
+            self._snapshot_waiters += 1
+            self._condition.notify_all()
+            try:
+                wanted = self._frame_seq
+                deadline = time.time() + timeout
+                while self._running and self._jpeg_seq < wanted:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                return self._jpeg
+            finally:
+                self._snapshot_waiters -= 1
+
+    def _encode_loop(self):
+        """Encode the newest frame whenever there is demand for it"""
+        last_encode = 0.0
+        while True:
+            with self._condition:
+                while self._running and not (
+                        self._frame_seq > self._jpeg_seq and (self._viewers > 0 or self._snapshot_waiters > 0)):
+                    self._condition.wait()
+                if not self._running:
+                    return
+                frame, seq = self._frame, self._frame_seq
+                snapshot_wanted = self._snapshot_waiters > 0
+
+            # Rate limit for streaming viewers (snapshots are served right away)
+            delay = self.min_interval - (time.time() - last_encode)
+            if delay > 0 and not snapshot_wanted:
+                time.sleep(delay)
+                continue
+
+            # Encode outside the lock so publishers and viewers are never blocked by it
+            success, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+            last_encode = time.time()
+            if not success:
+                continue
+
+            with self._condition:
+                self._jpeg = buffer.tobytes()
+                self._jpeg_seq = seq
+                self._condition.notify_all()
+
+
+INDEX_PAGE = b"""<!DOCTYPE html>
+<html><head><title>Parking Detection Stream</title></head>
+<body style="margin:0;background:#000">
+<img src="/stream.mjpg" style="max-width:100%;display:block;margin:auto">
+</body></html>
+"""
+
+
+class _StreamRequestHandler(BaseHTTPRequestHandler):
+    """Serves the index page, the MJPEG stream and single snapshots"""
+
+    # Set on the per-server subclass created by MJPEGServer
+    broadcaster = None
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path in ("/", "/index.html"):
+            self._send_bytes(INDEX_PAGE, "text/html")
+        elif path == "/stream.mjpg":
+            self._send_stream()
+        elif path == "/snapshot.jpg":
+            jpeg = self.broadcaster.snapshot()
+            if jpeg is None:
+                self.send_error(503, "No frame available yet")
+            else:
+                self._send_bytes(jpeg, "image/jpeg")
+        else:
+            self.send_error(404)
+
+    def _send_bytes(self, data, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "multipart/x-mixed-replace; boundary=frame")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        self.broadcaster.add_viewer()
+        try:
+            last_seq = 0
+            while True:
+                result = self.broadcaster.wait_for_jpeg(last_seq)
+                if result is None:
+                    # No new frame (detection paused) or shutting down
+                    if not self.broadcaster.running:
+                        break
+                    continue
+                last_seq, jpeg = result
+                self.wfile.write(b"--frame\r\nContent-Type: image/jpeg\r\n")
+                self.wfile.write(f"Content-Length: {len(jpeg)}\r\n\r\n".encode("ascii"))
+                self.wfile.write(jpeg)
+                self.wfile.write(b"\r\n")
+        except (BrokenPipeError, ConnectionResetError, ConnectionAbortedError):
+            pass
+        finally:
+            self.broadcaster.remove_viewer()
+
+    def log_message(self, format, *args):
+        # Keep the console quiet, one line per frame request would flood it
+        pass
+
+
+class MJPEGServer:
+    """
+    Optional HTTP server for watching the annotated feed from other machines
+
+    Routes: / (viewer page), /stream.mjpg (MJPEG stream), /snapshot.jpg (single JPEG)
+    """
+
+    def __init__(self, host="0.0.0.0", port=8080, quality=80, max_fps=15):
+        self.host = host
+        self.port = port
+        self.broadcaster = FrameBroadcaster(quality=quality, max_fps=max_fps)
+        self._server = None
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._server is not None
+
+    @property
+    def url(self):
+        host = "localhost" if self.host in ("0.0.0.0", "") else self.host
+        return f"http://{host}:{self.port}/"
+
+    def start(self):
+        """Start serving in background threads (raises OSError if the port is unavailable)"""
+        if self._server is not None:
+            return
+
+        handler = type("StreamRequestHandler", (_StreamRequestHandler,), {"broadcaster": self.broadcaster})
+        self._server = ThreadingHTTPServer((self.host, self.port), handler)
+        self._server.daemon_threads = True
+
+        self.broadcaster.start()
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop serving and disconnect viewers"""
+        if self._server is None:
+            return
+        self.broadcaster.stop()
+        self._server.shutdown()
+        self._server.server_close()
+        self._server = None
+        self._thread = None
+
+    def publish(self, frame):
+        """Hand the newest annotated frame to the server (cheap, never blocks on encoding)"""
+        self.broadcaster.publish(frame)
\ No newline at end of file
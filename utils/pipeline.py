@@ -0,0 +1,272 @@
+"""
+Staged frame pipeline with one worker per stage and bounded queues between them
+"""
+import queue
+import threading
+import time
+from collections import deque
+
+
+END = object()  # Marks the end of the stream, passed down so every stage can finish
+
+DROP_POLICIES = ("block", "drop_oldest", "drop_newest")
+
+
+class Stage:
+    """
+    One step of a pipeline, with its input queue and statistics
+
+    Drop policies decide what happens when the input queue is full: "block" waits for
+    room (nothing is lost, upstream slows down), "drop_oldest" discards the oldest
+    queued item (live sources, latest frame wins) and "drop_newest" discards the item
+    being offered.
+    """
+
+    def __init__(self, name, func, queue_size=2, drop_policy="block"):
+        """
+        Args:
+            name: Name shown in the statistics
+            func: Called with each item (sources: without arguments). Returns the item for
+                  the next stage, None to skip it, or END (sources only) to finish the stream
+            queue_size: Capacity of the input queue
+            drop_policy: "block", "drop_oldest" or "drop_newest"
+        """
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"Unknown drop policy: {drop_policy}")
+
+        self.name = name
+        self.func = func
+        self.drop_policy = drop_policy
+        self.input = queue.Queue(maxsize=max(queue_size, 1))
+
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.busy_time = 0.0
+        self._finished = deque(maxlen=60)  # Completion times for the throughput estimate
+        self._stats_lock = threading.Lock()
+
+    def offer(self, item, stop_event):
+        """
+        Put an item into the input queue according to the drop policy
+
+        Returns:
+            False if the item was dropped or the pipeline is stopping
+        """
+        if item is END:
+            # The end marker is never dropped
+            while not stop_event.is_set():
+                try:
+                    self.input.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    if self.drop_policy != "block":
+                        self._discard_oldest()
+            return False
+
+        if self.drop_policy == "block":
+            while not stop_event.is_set():
+                try:
+                    self.input.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        if self.drop_policy == "drop_newest":
+            try:
+                self.input.put_nowait(item)
+                return True
+            except queue.Full:
+                self._count_drop()
+                return False
+
+        # drop_oldest
+        while True:
+            try:
+                self.input.put_nowait(item)
+                return True
+            except queue.Full:
+                self._discard_oldest()
+
+    def _discard_oldest(self):
+        try:
+            self.input.get_nowait()
+            self._count_drop()
+        except queue.Empty:
+            pass
+
+    def _count_drop(self):
+        with self._stats_lock:
+            self.dropped += 1
+
+    def count_error(self):
+        with self._stats_lock:
+            self.errors += 1
+
+    def record(self, duration):
+        """Account one processed item"""
+        with self._stats_lock:
+            self.processed += 1
+            self.busy_time += duration
+            self._finished.append(time.perf_counter())
+
+    def stats(self):
+        """Throughput, queue depth and counters of this stage"""
+        with self._stats_lock:
+            finished = list(self._finished)
+            processed, dropped, errors, busy = self.processed, self.dropped, self.errors, self.busy_time
+
+        fps = 0.0
+        if len(finished) >= 2 and finished[-1] > finished[0]:
+            fps = (len(finished) - 1) / (finished[-1] - finished[0])
+        return {
+            'name': self.name,
+            'fps': fps,
+            'queue_depth': self.input.qsize(),
+            'queue_size': self.input.maxsize,
+            'processed': processed,
+            'dropped': dropped,
+            'errors': errors,
+            'avg_ms': busy / processed * 1000 if processed else 0.0
+        }
+
+
+class Pipeline:
+    """
+    Chain of stages, each running in its own thread
+
+    A source stage produces items (frames), the following stages transform them and the
+    results of the last stage land in a bounded output queue (or a sink stage consumes
+    them). Because stages overlap, throughput approaches that of the slowest stage instead
+    of the sum of all stages. OpenCV releases the GIL while it works, so image stages
+    really run in parallel.
+    """
+
+    def __init__(self, output_size=1, output_policy="drop_oldest"):
+        """
+        Args:
+            output_size: Capacity of the output queue read with get()
+            output_policy: Drop policy of the output queue
+        """
+        self.stages = []
+        self.output = Stage("output", None, output_size, output_policy)
+        self._stop = threading.Event()
+        self._threads = []
+        self.finished = threading.Event()
+
+    @property
+    def running(self):
+        return any(thread.is_alive() for thread in self._threads)
+
+    def add_source(self, name, read):
+        """
+        Set the source stage
+
+        Args:
+            read: Called repeatedly without arguments, returns the next item, None to
+                  retry later or END when the stream is over
+        """
+        if self.stages:
+            raise ValueError("The source must be the first stage")
+        self.stages.append(Stage(name, read, queue_size=1))
+        return self
+
+    def add_stage(self, name, func, queue_size=2, drop_policy="block"):
+        """Append a processing stage (see Stage for the arguments)"""
+        if not self.stages:
+            raise ValueError("Add a source before processing stages")
+        self.stages.append(Stage(name, func, queue_size, drop_policy))
+        return self
+
+    def start(self):
+        """Start one worker thread per stage"""
+        if self.running:
+            return
+        self._stop.clear()
+        self.finished.clear()
+
+        targets = self.stages[1:] + [self.output]
+        self._threads = [threading.Thread(target=self._run_source, args=(self.stages[0], targets[0]),
+                                          name=f"pipeline-{self.stages[0].name}", daemon=True)]
+        for stage, target in zip(self.stages[1:], targets[1:]):
+            self._threads.append(threading.Thread(target=self._run_stage, args=(stage, target),
+                                                  name=f"pipeline-{stage.name}", daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout=2.0):
+        """Stop all workers, dropping whatever is still queued"""
+        self._stop.set()
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout=timeout)
+        self._threads = []
+        self.finished.set()
+
+    def get(self, timeout=None):
+        """
+        Next result of the last stage
+
+        Returns:
+            The result, None if nothing arrived within the timeout, or END after the stream ended
+        """
+        try:
+            item = self.output.input.get(timeout=timeout) if timeout else self.output.input.get_nowait()
+        except queue.Empty:
+            return None
+        if item is END:
+            self.finished.set()
+        return item
+
+    def stats(self):
+        """Statistics of every stage, source first"""
+        return [stage.stats() for stage in self.stages]
+
+    def describe(self):
+        """One-line summary of throughput and queue depth per stage"""
+        return " | ".join(f"{s['name']} {s['fps']:.1f}/s q{s['queue_depth']}/{s['queue_size']}"
+                          for s in self.stats())
+
+    def _run_source(self, stage, target):
+        while not self._stop.is_set():
+            start = time.perf_counter()
+            try:
+                item = stage.func()
+            except Exception as e:
+                print(f"Error in pipeline stage {stage.name}: {str(e)}")
+                stage.count_error()
+                item = END
+
+            if item is END:
+                target.offer(END, self._stop)
+                return
+            if item is None:
+                time.sleep(0.01)
+                continue
+
+            stage.record(time.perf_counter() - start)
+            target.offer(item, self._stop)
+
+    def _run_stage(self, stage, target):
+        while not self._stop.is_set():
+            try:
+                item = stage.input.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            if item is END:
+                target.offer(END, self._stop)
+                return
+
+            start = time.perf_counter()
+            try:
+                result = stage.func(item)
+            except Exception as e:
+                print(f"Error in pipeline stage {stage.name}: {str(e)}")
+                stage.count_error()
+                continue
+            stage.record(time.perf_counter() - start)
+
+            if result is not None:
+                target.offer(result, self._stop)
\ No newline at end of file
@@ -0,0 +1,141 @@
+"""
+Uniform grid spatial index over axis-aligned boxes
+"""
+import math
+
+
+class SpatialGrid:
+    """
+    Spatial index that buckets boxes into square grid cells
+
+    Boxes are stored under a caller-chosen key (a space index, a canvas item ID, ...) and
+    can be inserted, moved and removed one at a time, so the index can be kept in sync
+    with an editable layout. Point and rectangle queries only look at the cells around
+    the query instead of every box.
+    """
+
+    def __init__(self, cell_size=64):
+        """
+        Args:
+            cell_size: Side of a grid cell in pixels, roughly the size of a parking space
+        """
+        self.cell_size = cell_size
+        self._cells = {}  # (cell_x, cell_y) -> set of keys
+        self._boxes = {}  # key -> (x1, y1, x2, y2)
+
+    def __len__(self):
+        return len(self._boxes)
+
+    def __contains__(self, key):
+        return key in self._boxes
+
+    def _cell_range(self, x1, y1, x2, y2):
+        """Range of cells covered by a box"""
+        size = self.cell_size
+        return (int(math.floor(x1 / size)), int(math.floor(y1 / size)),
+                int(math.floor(x2 / size)), int(math.floor(y2 / size)))
+
+    def insert(self, key, box):
+        """
+        Add a box to the index
+
+        Args:
+            key: Hashable key returned by the queries
+            box: (x, y, w, h) box
+        """
+        if key in self._boxes:
+            self.remove(key)
+
+        x, y, w, h = box
+        bounds = (x, y, x + w, y + h)
+        self._boxes[key] = bounds
+
+        cx1, cy1, cx2, cy2 = self._cell_range(*bounds)
+        for cx in range(cx1, cx2 + 1):
+            for cy in range(cy1, cy2 + 1):
+                self._cells.setdefault((cx, cy), set()).add(key)
+
+    def remove(self, key):
+        """Remove a box from the index (unknown keys are ignored)"""
+        bounds = self._boxes.pop(key, None)
+        if bounds is None:
+            return
+
+        cx1, cy1, cx2, cy2 = self._cell_range(*bounds)
+        for cx in range(cx1, cx2 + 1):
+            for cy in range(cy1, cy2 + 1):
+                cell = self._cells.get((cx, cy))
+                if cell is not None:
+                    cell.discard(key)
+                    if not cell:
+                        del self._cells[(cx, cy)]
+
+    def update(self, key, box):
+        """Move a box, only touching the grid when its position actually changed"""
+        x, y, w, h = box
+        if self._boxes.get(key) != (x, y, x + w, y + h):
+            self.insert(key, box)
+
+    def clear(self):
+        """Remove all boxes"""
+        self._cells = {}
+        self._boxes = {}
+
+    def rebuild(self, items):
+        """
+        Replace the contents of the index
+
+        Args:
+            items: Iterable of (key, (x, y, w, h)) pairs
+        """
+        self.clear()
+        for key, box in items:
+            self.insert(key, box)
+
+    def get_box(self, key):
+        """Stored (x, y, w, h) box of a key, or None"""
+        bounds = self._boxes.get(key)
+        if bounds is None:
+            return None
+        x1, y1, x2, y2 = bounds
+        return x1, y1, x2 - x1, y2 - y1
+
+    def query_point(self, x, y):
+        """Keys of all boxes containing the point (edges included)"""
+        cell = self._cells.get((int(math.floor(x / self.cell_size)), int(math.floor(y / self.cell_size))), ())
+        result = []
+        for key in cell:
+            x1, y1, x2, y2 = self._boxes[key]
+            if x1 <= x <= x2 and y1 <= y <= y2:
+                result.append(key)
+        return result
+
+    def query_rect(self, x1, y1, x2, y2):
+        """Keys of all boxes intersecting the rectangle (touching edges count as intersecting)"""
+        if x1 > x2:
+            x1, x2 = x2, x1
+        if y1 > y2:
+            y1, y2 = y2, y1
+
+        cx1, cy1, cx2, cy2 = self._cell_range(x1, y1, x2, y2)
+
+        # Large rectangles over a sparse grid: walk the occupied cells instead of the range
+        if (cx2 - cx1 + 1) * (cy2 - cy1 + 1) > len(self._cells):
+            candidates = set()
+            for (cx, cy), keys in self._cells.items():
+                if cx1 <= cx <= cx2 and cy1 <= cy <= cy2:
+                    candidates.update(keys)
+        else:
+            candidates = set()
+            for cx in range(cx1, cx2 + 1):
+                for cy in range(cy1, cy2 + 1):
+                    keys = self._cells.get((cx, cy))
+                    if keys:
+                        candidates.update(keys)
+
+        result = []
+        for key in candidates:
+            bx1, by1, bx2, by2 = self._boxes[key]
+            if not (bx2 < x1 or bx1 > x2 or by2 < y1 or by1 > y2):
+                result.append(key)
+        return result
\ No newline at end of file
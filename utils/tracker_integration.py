@@ -7,6 +7,7 @@ import time
 import os
 import numpy as np
 from pathlib import Path
+from models.detections import COCO_CLASSES, vehicle_class_ids, make_detections, empty_detections, filter_detections
 
 
 def download_models():
@@ -51,6 +52,8 @@ def download_models():
 import cv2
 import numpy as np
 
+from utils.image_processor import draw_counting_geometry
+
 
 def initialize_tracker(confidence_threshold=0.5, use_cuda=False):
     """Initialize the DeepSORT tracker with YOLO detector"""
@@ -84,11 +87,8 @@ def initialize_tracker(confidence_threshold=0.5, use_cuda=False):
                         self.model = yolo_model
                         self.tracker = deepsort_tracker
                         self.confidence_threshold = confidence_threshold
-                        self.classes = {
-                            0: 'person', 1: 'bicycle', 2: 'car', 3: 'motorcycle',
-                            4: 'airplane', 5: 'bus', 6: 'train', 7: 'truck', 8: 'boat'
-                        }
-                        self.vehicle_classes = [2, 5, 7]  # car, bus, truck
+                        self.classes = getattr(yolo_model, 'names', None) or COCO_CLASSES
+                        self.vehicle_classes = vehicle_class_ids(self.classes)  # car, motorcycle, bus, truck
                         self.count = 0
 
                     def __call__(self, frame):
@@ -96,30 +96,19 @@ def initialize_tracker(confidence_threshold=0.5, use_cuda=False):
                         # Run YOLO detection
                         results = self.model(frame, verbose=False)
 
-                        # Extract detections for DeepSORT
-                        detections = []
-                        boxes = []
-                        confidence_scores = []
-                        class_ids = []
-
-                        for result in results:
-                            if hasattr(result, 'boxes') and len(result.boxes) > 0:
-                                for box in result.boxes:
-                                    # Get coordinates, confidence and class
-                                    x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                                    confidence = float(box.conf)
-                                    class_id = int(box.cls)
-
-                                    # Filter out non-vehicles and low confidence
-                                    if confidence >= self.confidence_threshold and class_id in self.vehicle_classes:
-                                        boxes.append([int(x1), int(y1), int(x2) - int(x1), int(y2) - int(y1)])
-                                        confidence_scores.append(confidence)
-                                        class_ids.append(class_id)
-
-                                        # Add to detections list for DeepSORT
-                                        detections.append(([int(x1), int(y1), int(x2) - int(x1), int(y2) - int(y1)],
-                                                           confidence,
-                                                           class_id))
+                        # One copy of each result tensor, then shared confidence/class filtering
+                        vehicles = np.concatenate(
+                            [make_detections(result.boxes.xyxy.cpu().numpy(), result.boxes.conf.cpu().numpy(),
+                                             result.boxes.cls.cpu().numpy())
+                             for result in results if hasattr(result, 'boxes')] or [empty_detections()])
+                        vehicles = filter_detections(vehicles, self.confidence_threshold, self.vehicle_classes)
+
+                        # DeepSORT takes ([left, top, width, height], confidence, class) entries
+                        corners = vehicles['box'].astype(np.int64)
+                        boxes = np.concatenate([corners[:, :2], corners[:, 2:] - corners[:, :2]], axis=1).tolist()
+                        confidence_scores = vehicles['score'].tolist()
+                        class_ids = vehicles['class_id'].tolist()
+                        detections = list(zip(boxes, confidence_scores, class_ids))
 
                         # Update tracker
                         tracks = self.tracker.update_tracks(detections, frame=frame)
@@ -151,11 +140,16 @@ def initialize_tracker(confidence_threshold=0.5, use_cuda=False):
         return None
 
 
-def process_ml_detections_with_tracking(frame, tracker, line_height, offset, vehicle_counter, classes):
-    """Process a frame using YOLO+DeepSORT tracking"""
+def process_ml_detections_with_tracking(frame, tracker, line_height, offset, vehicle_counter, classes, zones=None):
+    """
+    Process a frame using YOLO+DeepSORT tracking
+
+    With CountingZones, the movements of all confirmed tracks are counted against the
+    configured lines and zones in one vectorized update instead of the horizontal line.
+    """
     if tracker is None:
         # Draw line if no tracker available
-        cv2.line(frame, (0, line_height), (frame.shape[1], line_height), (0, 255, 0), 2)
+        draw_counting_geometry(frame, line_height, zones)
         return frame, [], vehicle_counter
 
     try:
@@ -172,9 +166,10 @@ def process_ml_detections_with_tracking(frame, tracker, line_height, offset, veh
             tracks = []
 
         # Draw detection line
-        cv2.line(frame, (0, line_height), (frame.shape[1], line_height), (0, 255, 0), 2)
+        draw_counting_geometry(frame, line_height, zones)
 
         vehicle_ids_crossed = []
+        moves_from, moves_to, move_classes = [], [], []
 
         # Process each track
         for track in tracks:
@@ -200,8 +195,16 @@ def process_ml_detections_with_tracking(frame, tracker, line_height, offset, veh
             # Check if the vehicle crosses the line
             if not hasattr(track, 'previous_cy'):
                 track.previous_cy = None
-
-            if track.previous_cy is not None:
+                track.previous_cx = None
+
+            if zones:
+                # Collected here, counted for all tracks at once below
+                if track.previous_cy is not None:
+                    class_id = track.get_det_class() if hasattr(track, 'get_det_class') else None
+                    moves_from.append((track.previous_cx, track.previous_cy))
+                    moves_to.append((cx, cy))
+                    move_classes.append(classes.get(class_id, class_id) if isinstance(classes, dict) else class_id)
+            elif track.previous_cy is not None:
                 # If the center crosses the line from top to bottom
                 if (track.previous_cy < line_height - offset and cy >= line_height - offset and
                         cy <= line_height + offset and track_id not in vehicle_ids_crossed):
@@ -212,8 +215,12 @@ def process_ml_detections_with_tracking(frame, tracker, line_height, offset, veh
                     cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 0, 255), 2)
 
             # Store current position for next iteration
+            track.previous_cx = cx
             track.previous_cy = cy
 
+        if zones and moves_from:
+            vehicle_counter += zones.update(moves_from, moves_to, move_classes)
+
         # Draw counter
         cv2.putText(frame, f"Vehicle Count: {vehicle_counter}", (10, 50), cv2.FONT_HERSHEY_SIMPLEX,
                     1, (0, 0, 255), 2)